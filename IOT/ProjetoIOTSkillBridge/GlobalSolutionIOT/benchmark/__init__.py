@@ -0,0 +1,10 @@
+"""
+Benchmarks do serviço de IA
+Teste de carga contra o app com um Gemini simulado (sem gastar quota) e micro-benchmarks do caminho
+quente; os resultados saem em JSON para comparar execuções
+
+Uso (a partir de GlobalSolutionIOT/):
+    python -m benchmark carga --concorrencia 32 --requisicoes 2000 --saida resultados.jsonl
+    python -m benchmark micro --saida resultados.jsonl
+    python -m benchmark comparar base.jsonl resultados.jsonl
+"""
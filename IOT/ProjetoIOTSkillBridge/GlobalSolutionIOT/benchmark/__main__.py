@@ -0,0 +1,169 @@
+"""
+Linha de comando dos benchmarks: python -m benchmark {carga,micro,comparar}
+Cada execução gera um relatório JSON com metadados (data, commit, versão do Python); com --saida,
+o relatório é acrescentado como uma linha em um arquivo JSONL
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Os módulos do serviço são importados pelo nome, a partir de GlobalSolutionIOT/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Avisos de fallback a cada requisição misturariam o log ao relatório (defina LOG_NIVEL para vê-los)
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+
+from benchmark.cenarios import ler_mix  # noqa: E402
+from benchmark.gemini_simulado import PerfilSimulacao  # noqa: E402
+
+
+def metadados(rotulo: Optional[str]) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "rotulo": rotulo,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+    }
+
+
+def salvar(relatorio: Dict[str, Any], saida: Optional[str]):
+    linha = json.dumps(relatorio, ensure_ascii=False)
+    if saida:
+        with open(saida, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha + "\n")
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+def ler_relatorio(caminho: str, tipo: Optional[str] = None) -> Dict[str, Any]:
+    """Último relatório do arquivo (JSON ou JSONL), opcionalmente do tipo pedido"""
+    with open(caminho, encoding="utf-8") as arquivo:
+        texto = arquivo.read().strip()
+    try:
+        relatorios = [json.loads(texto)]
+    except ValueError:
+        relatorios = [json.loads(linha) for linha in texto.splitlines() if linha.strip()]
+    relatorios = [r for r in relatorios if tipo is None or r.get("tipo") == tipo]
+    if not relatorios:
+        raise SystemExit(f"{caminho}: nenhum relatório{f' do tipo {tipo}' if tipo else ''}")
+    return relatorios[-1]
+
+
+def folhas_numericas(valor: Any, prefixo: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(valor, dict):
+        for chave, item in valor.items():
+            yield from folhas_numericas(item, f"{prefixo}.{chave}" if prefixo else str(chave))
+    elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        yield prefixo, float(valor)
+
+
+def comparar(base: Dict[str, Any], novo: Dict[str, Any], limiar: float) -> int:
+    """Imprime a variação de cada métrica; retorna 1 se alguma latência/tempo piorou além do limiar (%)"""
+    valores_base = dict(folhas_numericas(base.get("resultado", {})))
+    regressoes = 0
+    for nome, valor in folhas_numericas(novo.get("resultado", {})):
+        anterior = valores_base.get(nome)
+        if anterior is None:
+            continue
+        variacao = (valor - anterior) / anterior * 100 if anterior else 0.0
+        # Nas métricas de tempo, subir é piorar; na vazão, cair é piorar
+        tempo = nome.endswith(("_ms", "_us"))
+        pior = variacao > limiar if tempo else (nome.endswith("vazao_rps") and variacao < -limiar)
+        regressoes += pior
+        print(f"{'!' if pior else ' '} {nome:70} {anterior:>14.3f} -> {valor:>14.3f} ({variacao:+.1f}%)")
+    return 1 if regressoes else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    carga = subcomandos.add_parser("carga", help="teste de carga com o Gemini simulado (ou contra --url)")
+    carga.add_argument("--mix", default="plano_estudos=5,recomendacoes=3,resumo_vaga=2",
+                       help="pesos por endpoint: plano_estudos, plano_estudos_stream, recomendacoes, resumo_vaga")
+    carga.add_argument("--concorrencia", type=int, default=32)
+    carga.add_argument("--requisicoes", type=int, default=None, help="total de requisições (padrão 1000)")
+    carga.add_argument("--duracao", type=float, default=None, help="segundos de carga (sem limite de requisições)")
+    carga.add_argument("--repeticao", type=float, default=0.2, help="fração de requisições que repetem um corpo já enviado")
+    carga.add_argument("--semente", type=int, default=42)
+    carga.add_argument("--url", default=None, help="servidor já em execução (as opções do Gemini simulado são ignoradas)")
+    carga.add_argument("--latencia", default="lognormal:0.8,0.4",
+                       help="fixa:S | uniforme:MIN,MAX | normal:MEDIA,DESVIO | lognormal:MEDIANA,SIGMA")
+    carga.add_argument("--taxa-429", type=float, default=0.0)
+    carga.add_argument("--taxa-5xx", type=float, default=0.0)
+    carga.add_argument("--taxa-json-invalido", type=float, default=0.0)
+    carga.add_argument("--taxa-json-truncado", type=float, default=0.0)
+    carga.add_argument("--rpm-por-chave", type=int, default=0,
+                       help="chamadas por minuto aceitas por chave no Gemini simulado (acima disso, 429)")
+    carga.add_argument("--credenciais", type=int, default=1, help="chaves fictícias no pool de credenciais")
+    carga.add_argument("--respeitar-quota", action="store_true", help="mantém os limites de quota configurados")
+    carga.add_argument("--cache-contexto", action="store_true",
+                       help="registra os prefixos dos prompts no cache de contexto do Gemini simulado")
+    carga.add_argument("--rotulo", default=None)
+    carga.add_argument("--saida", default=None, help="arquivo JSONL onde o relatório é acrescentado")
+
+    micro = subcomandos.add_parser("micro", help="micro-benchmarks do caminho quente")
+    micro.add_argument("--repeticoes", type=int, default=7)
+    micro.add_argument("--rotulo", default=None)
+    micro.add_argument("--saida", default=None)
+
+    comparacao = subcomandos.add_parser("comparar", help="compara o último relatório de dois arquivos")
+    comparacao.add_argument("base")
+    comparacao.add_argument("novo")
+    comparacao.add_argument("--tipo", choices=["carga", "micro"], default=None)
+    comparacao.add_argument("--limiar", type=float, default=10.0, help="piora percentual tratada como regressão")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "comparar":
+        return comparar(ler_relatorio(args.base, args.tipo), ler_relatorio(args.novo, args.tipo), args.limiar)
+
+    if args.comando == "micro":
+        from benchmark.micro import executar_micro
+        relatorio = executar_micro(args.repeticoes)
+    else:
+        from benchmark.carga import executar_carga
+        perfil = PerfilSimulacao(
+            latencia=args.latencia,
+            taxa_429=args.taxa_429,
+            taxa_5xx=args.taxa_5xx,
+            taxa_json_invalido=args.taxa_json_invalido,
+            taxa_json_truncado=args.taxa_json_truncado,
+            rpm_por_chave=args.rpm_por_chave,
+            semente=args.semente,
+        )
+        requisicoes = args.requisicoes or (sys.maxsize if args.duracao else 1000)
+        relatorio = asyncio.run(executar_carga(
+            mix=ler_mix(args.mix),
+            concorrencia=args.concorrencia,
+            requisicoes=requisicoes,
+            duracao=args.duracao,
+            repeticao=args.repeticao,
+            semente=args.semente,
+            perfil=perfil,
+            url=args.url,
+            respeitar_quota=args.respeitar_quota,
+            cache_contexto=args.cache_contexto,
+            credenciais=args.credenciais,
+        ))
+        if relatorio["parametros"]["requisicoes"] == sys.maxsize:
+            relatorio["parametros"]["requisicoes"] = None
+
+    salvar({**relatorio, "metadados": metadados(args.rotulo)}, args.saida)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Teste de carga
+Replica o mix de requisições contra o app na concorrência alvo e mede vazão, percentis de latência,
+atraso do event loop e taxa de fallback. Por padrão o app roda no próprio processo com o Gemini
+simulado; com --url, a carga vai para um servidor já em execução
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmark.cenarios import ENDPOINTS, GeradorCarga
+from benchmark.gemini_simulado import ClienteGeminiSimulado, PerfilSimulacao
+from telemetria import percentil
+
+
+# Limites locais de quota usados na carga, para que a quota configurada não vire o gargalo medido
+LIMITES_CARGA = {modelo: {"rpm": 10_000_000, "tpm": 10_000_000_000}
+                 for modelo in ("gemini-2.5-flash", "gemini-2.0-flash-exp", "gemini-2.0-flash")}
+# Camadas de /health que indicam resposta sem o Gemini
+CAMADAS_FALLBACK = ("fallback", "descartado")
+
+
+def _resumo_latencias(latencias: List[float]) -> Dict[str, float]:
+    ordenadas = sorted(latencias)
+    return {
+        "p50_ms": round(percentil(ordenadas, 50) * 1000, 2),
+        "p95_ms": round(percentil(ordenadas, 95) * 1000, 2),
+        "p99_ms": round(percentil(ordenadas, 99) * 1000, 2),
+        "max_ms": round((ordenadas[-1] if ordenadas else 0) * 1000, 2),
+    }
+
+
+def preparar_app(perfil: PerfilSimulacao, respeitar_quota: bool = False, cache_contexto: bool = False,
+                 credenciais: int = 1):
+    """
+    Importa o main.py com o Gemini simulado no lugar do cliente real. O ambiente é ajustado antes
+    da importação: chave fictícia (o .env não sobrescreve variáveis já definidas), sem aquecimento e,
+    salvo respeitar_quota, limites de quota altos. Com cache_contexto, os prefixos dos prompts são
+    registrados no cache de contexto do simulado (que não exige tamanho mínimo). Com mais de uma
+    credencial, o pool recebe chaves fictícias, cada uma com o seu Gemini simulado.
+
+    Retorna o app e os clientes simulados por credencial (preenchidos conforme são criados).
+    """
+    os.environ["GEMINI_API_KEY"] = "simulado"
+    os.environ["GEMINI_AQUECER"] = "false"
+    if not respeitar_quota:
+        os.environ.setdefault("GEMINI_LIMITES", json.dumps(LIMITES_CARGA))
+    if credenciais > 1:
+        os.environ["GEMINI_CREDENCIAIS"] = json.dumps([
+            {"nome": f"simulada{indice}", "api_key": f"simulado-{indice}"} for indice in range(1, credenciais + 1)
+        ])
+
+    import cliente_gemini
+    simulados: Dict[str, ClienteGeminiSimulado] = {}
+
+    def criar_simulado(credencial) -> ClienteGeminiSimulado:
+        simulados[credencial.nome] = ClienteGeminiSimulado(perfil)
+        return simulados[credencial.nome]
+
+    cliente_gemini.cliente_compartilhado.usar_fabrica(criar_simulado)
+    if cache_contexto:
+        from prefixo_prompt import cache_contexto as cache
+        cache.ativo, cache.min_tokens = True, 0
+    import main
+    return main.app, simulados
+
+
+def _somar_simulados(simulados: Dict[str, ClienteGeminiSimulado], campo: str) -> Dict[str, int]:
+    total: Dict[str, int] = {}
+    for simulado in simulados.values():
+        for chave, valor in getattr(simulado.models, campo).items():
+            total[chave] = total.get(chave, 0) + valor
+    return total
+
+
+class MonitorEventLoop:
+    """Mede o atraso do event loop: quanto um sleep de `intervalo` demora além do pedido"""
+
+    def __init__(self, intervalo: float = 0.01):
+        self.intervalo = intervalo
+        self.atrasos: List[float] = []
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def _medir(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            inicio = loop.time()
+            await asyncio.sleep(self.intervalo)
+            self.atrasos.append(max(0.0, loop.time() - inicio - self.intervalo))
+
+    def iniciar(self):
+        self._tarefa = asyncio.ensure_future(self._medir())
+
+    def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+
+    def resumo(self) -> Dict[str, float]:
+        return _resumo_latencias(self.atrasos)
+
+
+def _camadas(saude: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    return {
+        endpoint: {camada: dados["requisicoes"] for camada, dados in camadas.items()}
+        for endpoint, camadas in saude.get("camadas", {}).items()
+    }
+
+
+def _diferenca_camadas(antes: Dict[str, Dict[str, int]], depois: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    return {
+        endpoint: {camada: total - antes.get(endpoint, {}).get(camada, 0) for camada, total in camadas.items()}
+        for endpoint, camadas in depois.items()
+    }
+
+
+async def executar_carga(*, mix: Dict[str, float], concorrencia: int, requisicoes: int,
+                         duracao: Optional[float] = None, repeticao: float = 0.2, semente: int = 42,
+                         perfil: Optional[PerfilSimulacao] = None, url: Optional[str] = None,
+                         respeitar_quota: bool = False, cache_contexto: bool = False, credenciais: int = 1,
+                         timeout: float = 120) -> Dict[str, Any]:
+    """Executa a carga e retorna o relatório (dict serializável em JSON)"""
+    import httpx
+
+    perfil = perfil or PerfilSimulacao(semente=semente)
+    gerador = GeradorCarga(mix, repeticao=repeticao, semente=semente)
+    simulados = None
+    if url is None:
+        app, simulados = preparar_app(perfil, respeitar_quota, cache_contexto, credenciais)
+        transporte = httpx.ASGITransport(app=app)
+        cliente = httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=timeout)
+        contexto_app = app.router.lifespan_context(app)
+        await contexto_app.__aenter__()
+    else:
+        cliente = httpx.AsyncClient(base_url=url, timeout=timeout,
+                                    limits=httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia))
+        contexto_app = None
+
+    latencias: Dict[str, List[float]] = {nome: [] for nome in mix}
+    status: Dict[str, Dict[str, int]] = {nome: {} for nome in mix}
+    degradadas: Dict[str, int] = {nome: 0 for nome in mix}
+    monitor = MonitorEventLoop()
+    enviadas = 0
+
+    async def uma_requisicao(endpoint: str, corpo: Dict[str, Any]):
+        inicio = time.perf_counter()
+        try:
+            resposta = await cliente.post(ENDPOINTS[endpoint], json=corpo)
+            codigo = str(resposta.status_code)
+            conteudo = resposta.content
+        except Exception as e:
+            # Com o app no processo, exceções não tratadas chegam aqui em vez de um 500
+            codigo, conteudo = type(e).__name__, b""
+        latencias[endpoint].append(time.perf_counter() - inicio)
+        status[endpoint][codigo] = status[endpoint].get(codigo, 0) + 1
+        if b'"degradado":true' in conteudo.replace(b" ", b""):
+            degradadas[endpoint] += 1
+
+    async def trabalhador(fim: Optional[float]):
+        nonlocal enviadas
+        while enviadas < requisicoes and (fim is None or time.perf_counter() < fim):
+            enviadas += 1
+            await uma_requisicao(*gerador.proxima())
+
+    try:
+        # Só mede depois da preparação do cliente Gemini (importação do SDK), como o balanceador faria
+        for _ in range(600):
+            if (await cliente.get("/pronto")).status_code == 200:
+                break
+            await asyncio.sleep(0.1)
+        antes = _camadas((await cliente.get("/health")).json())
+        monitor.iniciar()
+        inicio = time.perf_counter()
+        fim = inicio + duracao if duracao else None
+        await asyncio.gather(*(trabalhador(fim) for _ in range(concorrencia)))
+        tempo_total = time.perf_counter() - inicio
+        monitor.parar()
+        camadas = _diferenca_camadas(antes, _camadas((await cliente.get("/health")).json()))
+    finally:
+        await cliente.aclose()
+        if contexto_app is not None:
+            await contexto_app.__aexit__(None, None, None)
+
+    total = sum(len(valores) for valores in latencias.values())
+    por_endpoint = {}
+    for nome in mix:
+        # Nomes das camadas em /health: plano_estudos, plano_estudos_stream, recomendacoes, resumo_vaga
+        camadas_endpoint = camadas.get(nome, {})
+        atendidas = sum(camadas_endpoint.values())
+        sem_gemini = sum(camadas_endpoint.get(camada, 0) for camada in CAMADAS_FALLBACK)
+        por_endpoint[nome] = {
+            "requisicoes": len(latencias[nome]),
+            **_resumo_latencias(latencias[nome]),
+            "status": status[nome],
+            "degradadas": degradadas[nome],
+            "camadas": camadas_endpoint,
+            "taxa_fallback": round(sem_gemini / atendidas, 4) if atendidas else 0.0,
+        }
+
+    todas = [valor for valores in latencias.values() for valor in valores]
+    return {
+        "tipo": "carga",
+        "alvo": url or "processo",
+        "parametros": {
+            "mix": mix,
+            "concorrencia": concorrencia,
+            "requisicoes": requisicoes,
+            "duracao": duracao,
+            "repeticao": repeticao,
+            "semente": semente,
+            "cache_contexto": cache_contexto,
+            "credenciais": credenciais,
+            "gemini_simulado": perfil.como_dict() if url is None else None,
+        },
+        "resultado": {
+            "requisicoes": total,
+            "duracao_s": round(tempo_total, 3),
+            "vazao_rps": round(total / tempo_total, 2) if tempo_total else 0.0,
+            "latencia": _resumo_latencias(todas),
+            # Com --url, mede o loop do próprio driver, não o do servidor
+            "atraso_event_loop": monitor.resumo(),
+            "endpoints": por_endpoint,
+            "chamadas_gemini_simulado": _somar_simulados(simulados, "chamadas") if simulados is not None else None,
+            "tokens_gemini_simulado": _somar_simulados(simulados, "tokens") if simulados is not None else None,
+            "chamadas_por_credencial": (
+                {nome: dict(simulado.models.chamadas) for nome, simulado in simulados.items()}
+                if simulados is not None and credenciais > 1 else None
+            ),
+        },
+    }
@@ -0,0 +1,119 @@
+"""
+Cenários de carga
+Requisições realistas de /gerar-plano-estudos, /recomendacoes e /resumo-vaga geradas a partir de uma
+semente, para que duas execuções enviem exatamente a mesma sequência
+"""
+
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+
+OBJETIVOS = [
+    "Desenvolvedor Backend Java", "Engenheiro de Dados", "Desenvolvedor Frontend React", "Cientista de Dados",
+    "Arquiteto de Microservices", "Analista de Segurança", "Engenheiro DevOps", "Desenvolvedor Mobile",
+]
+NIVEIS = ["Iniciante", "Intermediário", "Avançado"]
+COMPETENCIAS = ["Java", "Python", "SQL", "Git", "Docker", "Spring Boot", "React", "Linux", "AWS", "Kubernetes",
+                "Lógica de programação", "JavaScript", "Pandas", "Redes"]
+AREAS = ["Backend", "Cloud", "Dados", "IA", "Segurança", "Mobile", "Frontend", "Microservices"]
+FORMACOES = ["Ensino médio", "Técnico", "Graduação em andamento", "Graduação completa"]
+TITULOS_VAGA = ["Estágio em Backend", "Desenvolvedor Java Júnior", "Analista de Dados Pleno", "DevOps Júnior",
+                "Desenvolvedor Full Stack"]
+PARAGRAFOS_VAGA = [
+    "Buscamos pessoa desenvolvedora para atuar na construção de APIs REST e integrações com sistemas legados.",
+    "Requisitos: conhecimento em Java ou Python, SQL, Git e noções de testes automatizados.",
+    "Diferenciais: experiência com Docker, Kubernetes, mensageria e provedores de nuvem.",
+    "Benefícios: vale-refeição, plano de saúde, auxílio home office e horário flexível.",
+    "Sobre nós: somos uma empresa de tecnologia com mais de 20 anos de mercado, presente em todo o Brasil, "
+    "comprometida com inovação, diversidade e o desenvolvimento contínuo das pessoas.",
+]
+
+ENDPOINTS = {
+    "plano_estudos": "/gerar-plano-estudos",
+    "plano_estudos_stream": "/gerar-plano-estudos/stream",
+    "recomendacoes": "/recomendacoes",
+    "resumo_vaga": "/resumo-vaga",
+}
+
+
+def plano_estudos(rng: random.Random) -> Dict[str, Any]:
+    """Corpo de PlanoEstudosRequest"""
+    return {
+        "objetivo_carreira": rng.choice(OBJETIVOS),
+        "nivel_atual": rng.choice(NIVEIS),
+        "competencias_atuais": rng.sample(COMPETENCIAS, rng.randint(1, 5)),
+        "tempo_disponivel_semana": rng.choice([5, 8, 10, 15, 20]),
+        "prazo_meses": rng.choice([3, 6, 9, 12]),
+        "areas_interesse": rng.sample(AREAS, rng.randint(0, 3)) or None,
+    }
+
+
+def perfil_usuario(rng: random.Random) -> Dict[str, Any]:
+    """Corpo de PerfilUsuario"""
+    return {
+        "nome": rng.choice(["Ana", "Bruno", "Carla", "Diego", "Elisa", "Felipe"]),
+        "idade": rng.randint(16, 45),
+        "nivel_formacao": rng.choice(FORMACOES),
+        "objetivos": rng.choice(OBJETIVOS),
+        "habilidades": rng.sample(COMPETENCIAS, rng.randint(1, 5)),
+        "interesses": rng.sample(AREAS, rng.randint(1, 3)),
+        "dados_iot": {"horas_estudo_semana": rng.randint(2, 20), "horario_preferido": rng.choice(["manhã", "noite"])},
+    }
+
+
+def vaga(rng: random.Random) -> Dict[str, Any]:
+    """Corpo de Vaga; parte das descrições repete o texto institucional, como nas vagas coladas de portais"""
+    paragrafos = rng.sample(PARAGRAFOS_VAGA, rng.randint(2, len(PARAGRAFOS_VAGA)))
+    paragrafos += [PARAGRAFOS_VAGA[-1]] * rng.choice([0, 0, 2, 10])
+    corpo: Dict[str, Any] = {"titulo": rng.choice(TITULOS_VAGA), "descricao_completa": "\n\n".join(paragrafos)}
+    if rng.random() < 0.5:
+        corpo["perfil_usuario"] = perfil_usuario(rng)
+    return corpo
+
+
+GERADORES = {
+    "plano_estudos": plano_estudos,
+    "plano_estudos_stream": plano_estudos,
+    "recomendacoes": perfil_usuario,
+    "resumo_vaga": vaga,
+}
+
+
+def ler_mix(texto: str) -> Dict[str, float]:
+    """"plano_estudos=5,recomendacoes=3" -> pesos por endpoint"""
+    mix: Dict[str, float] = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in ENDPOINTS:
+            raise ValueError(f"Endpoint desconhecido no mix: {nome} (opções: {', '.join(ENDPOINTS)})")
+        mix[nome] = float(peso or 1)
+    return {nome: peso for nome, peso in mix.items() if peso > 0}
+
+
+class GeradorCarga:
+    """
+    Sequência determinística de (endpoint, corpo). Com repeticao > 0, essa fração das requisições
+    repete um corpo já enviado (usuários pedindo de novo), exercitando cache e coalescência.
+    """
+
+    def __init__(self, mix: Dict[str, float], repeticao: float = 0.2, semente: int = 42):
+        self.rng = random.Random(semente)
+        self.endpoints = list(mix)
+        self.pesos = [mix[nome] for nome in self.endpoints]
+        self.repeticao = repeticao
+        self._enviados: Dict[str, List[Dict[str, Any]]] = {nome: [] for nome in self.endpoints}
+
+    def proxima(self) -> Tuple[str, Dict[str, Any]]:
+        endpoint = self.rng.choices(self.endpoints, self.pesos)[0]
+        anteriores = self._enviados[endpoint]
+        if anteriores and self.rng.random() < self.repeticao:
+            return endpoint, self.rng.choice(anteriores)
+        corpo = GERADORES[endpoint](self.rng)
+        anteriores.append(corpo)
+        return endpoint, corpo
+
+
+def amostra(endpoint: str, semente: Optional[int] = 0) -> Dict[str, Any]:
+    """Um corpo de requisição do endpoint (usado nos micro-benchmarks)"""
+    return GERADORES[endpoint](random.Random(semente))
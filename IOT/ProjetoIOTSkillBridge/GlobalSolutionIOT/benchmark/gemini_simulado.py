@@ -0,0 +1,292 @@
+"""
+Gemini simulado
+Cliente com a mesma interface usada do SDK (models.generate_content, generate_content_stream e get;
+caches.create, get e delete), com latência sorteada de uma distribuição, injeção de erros 429/5xx e
+respostas JSON válidas, truncadas ou com campos inválidos
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ErroGeminiSimulado(Exception):
+    """Erro com code/status como os do SDK, para que o controle de quota o classifique igual"""
+
+    def __init__(self, code: int, status: str):
+        super().__init__(f"{code} {status} (simulado)")
+        self.code = code
+        self.status = status
+
+
+def distribuicao_latencia(especificacao: str):
+    """
+    Converte "tipo:parametros" em uma função que sorteia a latência em segundos:
+    fixa:0.5 | uniforme:0.2,1.5 | normal:0.8,0.2 | lognormal:0.8,0.5 (mediana, sigma)
+    """
+    tipo, _, parametros = especificacao.partition(":")
+    valores = [float(valor) for valor in parametros.split(",") if valor]
+    if tipo == "fixa":
+        return lambda rng: valores[0]
+    if tipo == "uniforme":
+        return lambda rng: rng.uniform(valores[0], valores[1])
+    if tipo == "normal":
+        return lambda rng: max(0.0, rng.gauss(valores[0], valores[1]))
+    if tipo == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(valores[0]), valores[1])
+    raise ValueError(f"Distribuição de latência desconhecida: {especificacao}")
+
+
+class PerfilSimulacao:
+    """
+    Comportamento do Gemini simulado; as taxas são probabilidades por chamada (0 a 1). Com
+    rpm_por_chave, cada cliente (uma chave de API) responde 429 acima dessa quantidade de chamadas
+    em 60 segundos, como a quota real por projeto.
+    """
+
+    def __init__(self, latencia: str = "lognormal:0.8,0.4", taxa_429: float = 0.0, taxa_5xx: float = 0.0,
+                 taxa_json_invalido: float = 0.0, taxa_json_truncado: float = 0.0, trechos_stream: int = 20,
+                 rpm_por_chave: int = 0, semente: Optional[int] = None):
+        self.latencia = latencia
+        self.sortear_latencia = distribuicao_latencia(latencia)
+        self.taxa_429 = taxa_429
+        self.taxa_5xx = taxa_5xx
+        self.taxa_json_invalido = taxa_json_invalido
+        self.taxa_json_truncado = taxa_json_truncado
+        self.trechos_stream = trechos_stream
+        self.rpm_por_chave = rpm_por_chave
+        self.semente = semente
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "latencia": self.latencia,
+            "taxa_429": self.taxa_429,
+            "taxa_5xx": self.taxa_5xx,
+            "taxa_json_invalido": self.taxa_json_invalido,
+            "taxa_json_truncado": self.taxa_json_truncado,
+            "trechos_stream": self.trechos_stream,
+            "rpm_por_chave": self.rpm_por_chave,
+        }
+
+
+TITULOS = ["Fundamentos", "Estruturas de dados", "APIs REST", "Banco de dados", "Testes automatizados",
+           "Arquitetura de sistemas", "Nuvem e deploy", "Projeto final"]
+RECURSOS = ["Curso online introdutório", "Documentação oficial", "Livro de referência", "Projeto prático guiado",
+            "Comunidade de desenvolvedores", "Certificação profissional"]
+FRASE = "Pratique com exercícios curtos, revise os conceitos e aplique em um projeto pequeno publicado no portfólio. "
+
+
+def plano_simulado(rng: random.Random) -> Dict[str, Any]:
+    """Plano no formato de PlanoEstudosResponse, com tamanho parecido com o de uma resposta real"""
+    quantidade = rng.randint(3, 6)
+    return {
+        "objetivo_carreira": "Desenvolvedor",
+        "nivel_atual": "Iniciante",
+        "prazo_total_meses": 6,
+        "horas_totais_estimadas": rng.randint(80, 400),
+        "etapas": [
+            {
+                "ordem": ordem,
+                "titulo": TITULOS[(ordem - 1) % len(TITULOS)],
+                "descricao": FRASE * rng.randint(2, 5),
+                "duracao_semanas": rng.randint(2, 8),
+                "recursos_sugeridos": rng.sample(RECURSOS, 3),
+                "competencias_desenvolvidas": rng.sample(["Java", "SQL", "Git", "Docker", "Python", "Spring"], 2),
+            }
+            for ordem in range(1, quantidade + 1)
+        ],
+        "recursos_adicionais": rng.sample(RECURSOS, 3),
+        "metricas_sucesso": ["Projetos concluídos", "Portfólio publicado"],
+        "motivacao": "Continue firme, cada etapa concluída aproxima você do seu objetivo!",
+    }
+
+
+def digest_simulado(rng: random.Random) -> Dict[str, Any]:
+    """Digest no formato de DigestVaga"""
+    return {
+        "resumo": FRASE * rng.randint(1, 3),
+        "requisitos": rng.sample(["Java", "Python", "SQL", "Git", "Docker", "Testes automatizados", "Inglês intermediário"],
+                                 rng.randint(3, 5)),
+        "beneficios": rng.sample(["Vale-refeição", "Plano de saúde", "Home office", "Horário flexível"], rng.randint(0, 3)),
+        "pontos_atencao": ["Salário não informado"],
+    }
+
+
+def texto_simulado(rng: random.Random) -> str:
+    """Texto corrido para recomendações e resumos de vaga"""
+    return "\n".join(f"{i}. {FRASE.strip()}" for i in range(1, rng.randint(5, 10) + 1))
+
+
+class CachesSimulados:
+    """
+    Equivalente a client.caches, com as regras do cache de contexto do Gemini: o cache pertence a um
+    modelo, expira após o ttl e não pode ser usado junto com system_instruction na chamada.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._caches: Dict[str, SimpleNamespace] = {}
+        self._sequencia = 0
+        self.criados = 0
+
+    def create(self, *, model: str, config=None):
+        ttl = float(str(getattr(config, "ttl", None) or "3600s").rstrip("s"))
+        with self._trava:
+            self._sequencia += 1
+            self.criados += 1
+            cache = SimpleNamespace(
+                name=f"cachedContents/simulado-{self._sequencia}",
+                model=model,
+                display_name=getattr(config, "display_name", None),
+                system_instruction=getattr(config, "system_instruction", None),
+                expira_em=time.time() + ttl,
+            )
+            self._caches[cache.name] = cache
+        return cache
+
+    def get(self, *, name: str):
+        with self._trava:
+            cache = self._caches.get(name)
+        if cache is None or cache.expira_em <= time.time():
+            raise ErroGeminiSimulado(404, "NOT_FOUND")
+        return cache
+
+    def delete(self, *, name: str):
+        with self._trava:
+            if self._caches.pop(name, None) is None:
+                raise ErroGeminiSimulado(404, "NOT_FOUND")
+
+    def resolver(self, model: str, config) -> Optional[str]:
+        """Instrução de sistema guardada no cache referenciado pela chamada (erros como os da API)"""
+        nome = getattr(config, "cached_content", None)
+        if nome is None:
+            return None
+        if getattr(config, "system_instruction", None):
+            raise ErroGeminiSimulado(400, "INVALID_ARGUMENT")
+        cache = self.get(name=nome)
+        if cache.model != model:
+            raise ErroGeminiSimulado(400, "INVALID_ARGUMENT")
+        return cache.system_instruction
+
+
+class ModelosSimulados:
+    """Equivalente a client.models; chamado nas threads do pool do cliente_gemini"""
+
+    def __init__(self, perfil: PerfilSimulacao, caches: Optional[CachesSimulados] = None):
+        self.perfil = perfil
+        self.caches = caches or CachesSimulados()
+        self._rng = random.Random(perfil.semente)
+        self._trava = threading.Lock()
+        self.chamadas: Dict[str, int] = {"sucesso": 0, "429": 0, "5xx": 0, "json_invalido": 0, "json_truncado": 0}
+        # Tokens de prompt recebidos e, deles, os atendidos por cache de contexto
+        self.tokens: Dict[str, int] = {"prompt": 0, "cache": 0}
+        self._recentes: deque = deque()
+
+    def _sortear(self, config) -> tuple:
+        """(latência, erro ou None, texto da resposta), sorteados sob trava para serem reproduzíveis"""
+        with self._trava:
+            rng = self._rng
+            latencia = self.perfil.sortear_latencia(rng)
+            sorteio = rng.random()
+            if self._acima_rpm() or sorteio < self.perfil.taxa_429:
+                self.chamadas["429"] += 1
+                return latencia, ErroGeminiSimulado(429, "RESOURCE_EXHAUSTED"), ""
+            if sorteio < self.perfil.taxa_429 + self.perfil.taxa_5xx:
+                self.chamadas["5xx"] += 1
+                return latencia, ErroGeminiSimulado(503, "UNAVAILABLE"), ""
+            if getattr(config, "response_mime_type", None) != "application/json":
+                self.chamadas["sucesso"] += 1
+                return latencia, None, texto_simulado(rng)
+
+            # O schema enviado indica o formato esperado: digest da vaga ou plano de estudos
+            propriedades = (getattr(config, "response_schema", None) or {}).get("properties", {})
+            if "requisitos" in propriedades:
+                texto = json.dumps(digest_simulado(rng), ensure_ascii=False)
+                if rng.random() < self.perfil.taxa_json_truncado:
+                    self.chamadas["json_truncado"] += 1
+                    return latencia, None, texto[:int(len(texto) * rng.uniform(0.3, 0.9))]
+                self.chamadas["sucesso"] += 1
+                return latencia, None, texto
+
+            plano = plano_simulado(rng)
+            sorteio = rng.random()
+            if sorteio < self.perfil.taxa_json_invalido:
+                self.chamadas["json_invalido"] += 1
+                plano["etapas"][0]["duracao_semanas"] = "quatro"
+                plano["horas_totais_estimadas"] = None
+                return latencia, None, json.dumps(plano, ensure_ascii=False)
+            texto = json.dumps(plano, ensure_ascii=False)
+            if sorteio < self.perfil.taxa_json_invalido + self.perfil.taxa_json_truncado:
+                self.chamadas["json_truncado"] += 1
+                return latencia, None, texto[:int(len(texto) * rng.uniform(0.3, 0.9))]
+            self.chamadas["sucesso"] += 1
+            return latencia, None, texto
+
+    def _acima_rpm(self) -> bool:
+        """Janela deslizante de 60 s das chamadas aceitas por esta chave (chamado sob a trava)"""
+        if not self.perfil.rpm_por_chave:
+            return False
+        agora = time.monotonic()
+        while self._recentes and self._recentes[0] <= agora - 60:
+            self._recentes.popleft()
+        if len(self._recentes) >= self.perfil.rpm_por_chave:
+            return True
+        self._recentes.append(agora)
+        return False
+
+    def _uso(self, contents, config, texto: str, instrucao_cache: Optional[str]) -> SimpleNamespace:
+        """Tokens como os do Gemini: o prompt inclui a instrução de sistema, inline ou vinda do cache"""
+        instrucao = getattr(config, "system_instruction", None) or ""
+        tokens_cache = len(instrucao_cache) // 4 + 1 if instrucao_cache else None
+        tokens_prompt = (len(str(contents)) + len(str(instrucao))) // 4 + 1 + (tokens_cache or 0)
+        tokens_resposta = len(texto) // 4 + 1
+        with self._trava:
+            self.tokens["prompt"] += tokens_prompt
+            self.tokens["cache"] += tokens_cache or 0
+        return SimpleNamespace(prompt_token_count=tokens_prompt, candidates_token_count=tokens_resposta,
+                               cached_content_token_count=tokens_cache,
+                               total_token_count=tokens_prompt + tokens_resposta)
+
+    def generate_content(self, *, model: str, contents, config=None):
+        instrucao_cache = self.caches.resolver(model, config)
+        latencia, erro, texto = self._sortear(config)
+        time.sleep(latencia)
+        if erro is not None:
+            raise erro
+        return SimpleNamespace(text=texto, usage_metadata=self._uso(contents, config, texto, instrucao_cache))
+
+    def generate_content_stream(self, *, model: str, contents, config=None) -> Iterator[SimpleNamespace]:
+        instrucao_cache = self.caches.resolver(model, config)
+        latencia, erro, texto = self._sortear(config)
+        # Primeiro trecho após ~1/4 da latência; o restante distribuído até o fim
+        time.sleep(latencia / 4)
+        if erro is not None:
+            raise erro
+        quantidade = max(1, self.perfil.trechos_stream)
+        tamanho = max(1, math.ceil(len(texto) / quantidade))
+        trechos: List[str] = [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+        for indice, trecho in enumerate(trechos):
+            if indice:
+                time.sleep(latencia * 3 / 4 / len(trechos))
+            ultimo = indice == len(trechos) - 1
+            yield SimpleNamespace(text=trecho,
+                                  usage_metadata=self._uso(contents, config, texto, instrucao_cache) if ultimo else None)
+
+    def get(self, *, model: str):
+        return SimpleNamespace(name=model)
+
+
+class ClienteGeminiSimulado:
+    """
+    Substitui o genai.Client de uma credencial:
+    cliente_gemini.cliente_compartilhado.usar_fabrica(lambda credencial: ClienteGeminiSimulado(perfil))
+    """
+
+    def __init__(self, perfil: Optional[PerfilSimulacao] = None):
+        self.caches = CachesSimulados()
+        self.models = ModelosSimulados(perfil or PerfilSimulacao(), self.caches)
@@ -0,0 +1,76 @@
+"""
+Micro-benchmarks do caminho quente
+Tempo por chamada (mínimo e mediana de várias rodadas, em microssegundos) das funções executadas em
+toda requisição de plano de estudos, sem rede
+"""
+
+import json
+import os
+import random
+import statistics
+import timeit
+from typing import Any, Callable, Dict
+
+from benchmark.cenarios import amostra
+from benchmark.gemini_simulado import plano_simulado
+
+
+def medir(funcao: Callable[[], Any], repeticoes: int = 7, alvo_segundos: float = 0.2) -> Dict[str, float]:
+    """Calibra o número de chamadas por rodada para ~alvo_segundos e mede `repeticoes` rodadas"""
+    cronometro = timeit.Timer(funcao)
+    chamadas, tempo = cronometro.autorange()
+    chamadas = max(1, int(chamadas * alvo_segundos / max(tempo, 1e-9)))
+    rodadas = [tempo / chamadas * 1e6 for tempo in cronometro.repeat(repeat=repeticoes, number=chamadas)]
+    return {
+        "min_us": round(min(rodadas), 3),
+        "mediana_us": round(statistics.median(rodadas), 3),
+        "chamadas_por_rodada": chamadas,
+    }
+
+
+def executar_micro(repeticoes: int = 7) -> Dict[str, Any]:
+    """Executa os micro-benchmarks e retorna o relatório (dict serializável em JSON)"""
+    os.environ.setdefault("GEMINI_AQUECER", "false")
+    import gerar_plano_estudos as plano
+
+    request = plano.PlanoEstudosRequest(**amostra("plano_estudos"))
+    requests_variados = [plano.PlanoEstudosRequest(**amostra("plano_estudos", semente)) for semente in range(256)]
+    rng = random.Random(0)
+    valido = json.dumps(plano_simulado(rng), ensure_ascii=False)
+    dados_invalidos = plano_simulado(rng)
+    dados_invalidos["etapas"][0]["duracao_semanas"] = "quatro"
+    invalido = json.dumps(dados_invalidos, ensure_ascii=False)
+    truncado = valido[:len(valido) * 2 // 3]
+    proximo = iter(range(1 << 62))
+    from digest_vaga import DigestVaga, avaliar_perfil_local, chave_digest, formatar_analise
+    from benchmark.gemini_simulado import digest_simulado
+    digest = DigestVaga(**digest_simulado(rng))
+    vaga = amostra("resumo_vaga")
+    habilidades = amostra("recomendacoes")["habilidades"]
+    from indice_catalogo import obter_indice
+    from ranking_vagas import obter_lexico, ranquear_vagas
+    vagas_ranking = [(v["titulo"], v["descricao_completa"]) for v in (amostra("resumo_vaga", s) for s in range(50))]
+    interesses = amostra("recomendacoes")["interesses"]
+
+    casos: Dict[str, Callable[[], Any]] = {
+        "construir_prompt_plano_estudos": lambda: plano.construir_prompt_plano_estudos(request),
+        "criar_plano_fallback": lambda: plano.criar_plano_fallback(request, ""),
+        # Perfis diferentes a cada chamada: mede a montagem, não a memorização
+        "criar_plano_fallback_variado": lambda: plano.criar_plano_fallback(requests_variados[next(proximo) % 256], ""),
+        "plano_fallback_memorizado": lambda: plano.plano_fallback(request),
+        "processar_resposta_gemini_valida": lambda: plano.processar_resposta_gemini(valido, request),
+        "processar_resposta_gemini_campo_invalido": lambda: plano.processar_resposta_gemini(invalido, request),
+        "processar_resposta_gemini_truncada": lambda: plano.processar_resposta_gemini(truncado, request),
+        "chave_cache_plano": lambda: plano.chave_cache("plano_estudos", request),
+        # Custo por visualização de /resumo-vaga com o digest em cache
+        "chave_digest_vaga": lambda: chave_digest(vaga["titulo"], vaga["descricao_completa"]),
+        "avaliar_perfil_vaga_local": lambda: avaliar_perfil_local(digest, habilidades),
+        "formatar_analise_vaga": lambda: formatar_analise(digest, "Avaliação do perfil: adequado."),
+        # /vagas/ranking sem resumos: 50 vagas contra um perfil em uma passada
+        "ranquear_50_vagas": lambda: ranquear_vagas(vagas_ranking, habilidades, interesses, obter_lexico(obter_indice())),
+    }
+    return {
+        "tipo": "micro",
+        "parametros": {"repeticoes": repeticoes, "tamanho_resposta_caracteres": len(valido)},
+        "resultado": {nome: medir(funcao, repeticoes) for nome, funcao in casos.items()},
+    }
@@ -0,0 +1,185 @@
+"""
+Cache aquecido
+Planos e recomendações gerados fora do horário de pico para os perfis mais comuns (python -m pregeracao)
+e gravados em um arquivo compacto. Na inicialização, o serviço mapeia o arquivo em memória (mmap) e
+indexa só os termos de cada entrada; a resposta é lida do arquivo e descompactada quando há acerto
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from cache_semantico import CACHE_SEMANTICO_LIMIAR, CacheSemantico, termos_campos
+from log_estruturado import obter_logger
+
+
+# Arquivo gerado por python -m pregeracao; vazio desativa o cache aquecido
+CACHE_AQUECIDO_PATH = os.getenv("CACHE_AQUECIDO_PATH", str(Path(__file__).resolve().parent / "cache_aquecido.bin"))
+# Similaridade mínima entre os termos da requisição e os do perfil pré-gerado
+CACHE_AQUECIDO_LIMIAR = float(os.getenv("CACHE_AQUECIDO_LIMIAR", str(CACHE_SEMANTICO_LIMIAR)))
+
+# Formato: MAGICO, tamanho do índice (uint64), índice JSON e, em seguida, as respostas (JSON + zlib)
+MAGICO = b"SBAQ\x01"
+_CABECALHO = struct.Struct("<Q")
+# Nome do perfil canônico das recomendações, trocado pelo nome do usuário na resposta
+NOME_CANONICO = "Estudante"
+
+log = obter_logger("cache_aquecido")
+
+
+def termos_aquecidos(objetivo: Optional[str], competencias: Iterable[str]) -> Set[str]:
+    """
+    Termos comparados no cache aquecido: só objetivo e competências, os campos que a exportação de
+    usuários traz (interesses, formação e dados IoT ficam de fora da comparação)
+    """
+    return termos_campos(objetivo=objetivo or "", competencias=list(competencias))
+
+
+def gravar_armazem(caminho: str, entradas: List[Dict[str, Any]], metadados: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Grava o arquivo do cache aquecido de uma vez (arquivo temporário + rename, então o serviço nunca
+    lê um arquivo pela metade). Cada entrada tem namespace, particao, termos, valor e meta.
+    Retorna o tamanho do arquivo em bytes.
+    """
+    blocos: List[bytes] = []
+    indice = []
+    posicao = 0
+    for entrada in entradas:
+        bloco = zlib.compress(json.dumps(entrada["valor"], ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+        indice.append({
+            "namespace": entrada["namespace"],
+            "particao": entrada["particao"],
+            "termos": sorted(entrada["termos"]),
+            "meta": entrada.get("meta"),
+            "posicao": posicao,
+            "tamanho": len(bloco),
+        })
+        blocos.append(bloco)
+        posicao += len(bloco)
+    cabecalho = json.dumps({"gerado_em": time.time(), "metadados": metadados or {}, "entradas": indice},
+                           ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(MAGICO)
+        arquivo.write(_CABECALHO.pack(len(cabecalho)))
+        arquivo.write(cabecalho)
+        for bloco in blocos:
+            arquivo.write(bloco)
+    os.replace(temporario, caminho)
+    return os.path.getsize(caminho)
+
+
+def _ler_cabecalho(mapa) -> Tuple[Dict[str, Any], int]:
+    """Índice do arquivo e posição em que começam as respostas"""
+    if mapa[:len(MAGICO)] != MAGICO:
+        raise ValueError("formato desconhecido")
+    (tamanho,) = _CABECALHO.unpack_from(mapa, len(MAGICO))
+    inicio_indice = len(MAGICO) + _CABECALHO.size
+    return json.loads(mapa[inicio_indice:inicio_indice + tamanho]), inicio_indice + tamanho
+
+
+def ler_armazem(caminho: str) -> List[Dict[str, Any]]:
+    """
+    Entradas de um arquivo do cache aquecido, no formato de gravar_armazem (para a pré-geração
+    mesclar com o que gerou); arquivo ausente retorna lista vazia
+    """
+    if not caminho or not os.path.exists(caminho):
+        return []
+    with open(caminho, "rb") as arquivo:
+        conteudo = arquivo.read()
+    cabecalho, inicio_dados = _ler_cabecalho(conteudo)
+    return [
+        {
+            "namespace": entrada["namespace"],
+            "particao": entrada["particao"],
+            "termos": entrada["termos"],
+            "meta": entrada.get("meta"),
+            "valor": json.loads(zlib.decompress(
+                conteudo[inicio_dados + entrada["posicao"]:inicio_dados + entrada["posicao"] + entrada["tamanho"]]
+            )),
+        }
+        for entrada in cabecalho["entradas"]
+    ]
+
+
+class ArmazemAquecido:
+    """
+    Índice em memória do arquivo do cache aquecido. Os termos de cada entrada vão para um
+    CacheSemantico por namespace (sem TTL), guardando só a posição da resposta no arquivo mapeado;
+    workers diferentes compartilham as mesmas páginas do arquivo no cache do sistema operacional.
+    """
+
+    def __init__(self, caminho: str = CACHE_AQUECIDO_PATH, limiar: float = CACHE_AQUECIDO_LIMIAR):
+        self.caminho = caminho
+        self.limiar = limiar
+        self._mapa: Optional[mmap.mmap] = None
+        self._inicio_dados = 0
+        self._indices: Dict[str, CacheSemantico] = {}
+        self.gerado_em: Optional[float] = None
+        self.bytes = 0
+
+    def carregar(self) -> "ArmazemAquecido":
+        """Mapeia o arquivo e indexa as entradas; arquivo ausente ou inválido deixa o cache vazio"""
+        if not self.caminho or not os.path.exists(self.caminho):
+            return self
+        try:
+            with open(self.caminho, "rb") as arquivo:
+                mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            cabecalho, inicio_dados = _ler_cabecalho(mapa)
+        except (OSError, ValueError, struct.error) as e:
+            log.warning("Cache aquecido não carregado", extra={"caminho": self.caminho, "detalhe": str(e)})
+            return self
+
+        entradas = cabecalho["entradas"]
+        por_namespace: Dict[str, int] = {}
+        for entrada in entradas:
+            por_namespace[entrada["namespace"]] = por_namespace.get(entrada["namespace"], 0) + 1
+        for namespace, quantidade in por_namespace.items():
+            self._indices[namespace] = CacheSemantico(f"aquecido:{namespace}", limiar=self.limiar,
+                                                      max_itens=quantidade, ttl_segundos=float("inf"))
+        for entrada in entradas:
+            self._indices[entrada["namespace"]].gravar(
+                entrada["particao"], set(entrada["termos"]), (entrada["posicao"], entrada["tamanho"]), entrada.get("meta")
+            )
+        self._mapa = mapa
+        self._inicio_dados = inicio_dados
+        self.gerado_em = cabecalho.get("gerado_em")
+        self.bytes = len(mapa)
+        log.info("Cache aquecido carregado", extra={"caminho": self.caminho, "entradas": len(entradas), "bytes": self.bytes})
+        return self
+
+    def obter(self, namespace: str, particao: str, termos: Set[str]) -> Optional[Tuple[Any, Any, float]]:
+        """(valor, meta, similaridade) do perfil pré-gerado mais parecido acima do limiar, ou None"""
+        indice = self._indices.get(namespace)
+        if indice is None:
+            return None
+        encontrado = indice.obter(particao, termos)
+        if encontrado is None:
+            return None
+        (posicao, tamanho), meta, similaridade = encontrado
+        inicio = self._inicio_dados + posicao
+        valor = json.loads(zlib.decompress(self._mapa[inicio:inicio + tamanho]))
+        return valor, meta, similaridade
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            namespace: {**indice.estatisticas(), "bytes_arquivo": self.bytes, "gerado_em": self.gerado_em or 0}
+            for namespace, indice in self._indices.items()
+        }
+
+
+_armazem: Optional[ArmazemAquecido] = None
+
+
+def obter_armazem() -> ArmazemAquecido:
+    """Cache aquecido do processo, carregado na primeira chamada"""
+    global _armazem
+    if _armazem is None:
+        _armazem = ArmazemAquecido().carregar()
+    return _armazem
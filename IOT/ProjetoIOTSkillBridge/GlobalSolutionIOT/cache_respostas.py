@@ -0,0 +1,271 @@
+"""
+Cache de respostas da IA Generativa
+Evita chamar o Gemini novamente para requisições equivalentes (mesmo perfil normalizado)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from estado_compartilhado import ESTADO_BACKEND
+from log_estruturado import obter_logger
+
+
+# Backend do cache: "memoria" (por processo) ou "sqlite" (compartilhado entre workers, padrão com vários workers)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", ESTADO_BACKEND).lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", str(Path(__file__).resolve().parent / "cache_respostas.db"))
+CACHE_TTL_SEGUNDOS = float(os.getenv("CACHE_TTL_SEGUNDOS", str(6 * 60 * 60)))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "1000"))
+# Acessos ao SQLite acumulados antes de atualizar acessado_em (a ordem LRU do disco) numa única transação
+CACHE_ACESSOS_LOTE = int(os.getenv("CACHE_ACESSOS_LOTE", "256"))
+
+log = obter_logger("cache")
+
+
+def normalizar(valor: Any) -> Any:
+    """Normaliza valores para comparação: minúsculas, espaços colapsados, listas ordenadas"""
+    if isinstance(valor, BaseModel):
+        valor = valor.model_dump()
+    if isinstance(valor, str):
+        return " ".join(valor.split()).casefold()
+    if isinstance(valor, dict):
+        return {str(k): normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple, set)):
+        itens = [normalizar(v) for v in valor]
+        return sorted(itens, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False))
+    return valor
+
+
+def chave_cache(*partes: Any) -> str:
+    """Gera hash canônico (SHA-256) a partir das partes normalizadas da requisição"""
+    canonico = json.dumps([normalizar(p) for p in partes], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class BackendMemoria:
+    """Armazenamento LRU em memória do processo; guarda os objetos já validados"""
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.remocoes = 0
+
+    def obter(self, namespace: str, chave: str):
+        with self._lock:
+            item = self._itens.get((namespace, chave))
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.time():
+                del self._itens[(namespace, chave)]
+                return None
+            self._itens.move_to_end((namespace, chave))
+            return valor
+
+    def gravar(self, namespace: str, chave: str, valor: Any, expira_em: float):
+        with self._lock:
+            self._itens[(namespace, chave)] = (expira_em, valor)
+            self._itens.move_to_end((namespace, chave))
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.remocoes += 1
+
+    def tamanho(self) -> int:
+        return len(self._itens)
+
+
+class BackendSQLite:
+    """
+    Armazenamento LRU em arquivo SQLite (modo WAL), compartilhado entre processos. A leitura não
+    escreve: os horários de acesso ficam acumulados e são gravados juntos na próxima gravação (antes
+    da remoção LRU) ou a cada CACHE_ACESSOS_LOTE acessos. Itens expirados são ignorados na leitura e
+    substituídos quando a resposta é gerada de novo, ou removidos pelo LRU.
+
+    obter e gravar são síncronos; código async usa executar()/submeter(), que rodam na thread do arquivo.
+    """
+
+    def __init__(self, caminho: str, max_itens: int, acessos_lote: int = CACHE_ACESSOS_LOTE):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.acessos_lote = acessos_lote
+        self.remocoes = 0
+        self._lock = threading.Lock()
+        self._acessos: Dict[tuple, float] = {}
+        # Uma única thread: as operações já são serializadas pelo lock da conexão
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache")
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_respostas (
+                namespace TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                expira_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                PRIMARY KEY (namespace, chave)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_acesso ON cache_respostas (namespace, acessado_em)")
+
+    def obter(self, namespace: str, chave: str) -> Optional[str]:
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT valor, expira_em FROM cache_respostas WHERE namespace = ? AND chave = ?",
+                (namespace, chave),
+            ).fetchone()
+            if linha is None:
+                return None
+            valor, expira_em = linha
+            if expira_em < agora:
+                return None
+            self._acessos[(namespace, chave)] = agora
+            if len(self._acessos) >= self.acessos_lote:
+                self._gravar_acessos()
+            return valor
+
+    def _gravar_acessos(self):
+        """Grava os acessos acumulados numa transação (chamado com o lock)"""
+        if not self._acessos:
+            return
+        acessos = [(agora, namespace, chave) for (namespace, chave), agora in self._acessos.items()]
+        self._acessos.clear()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "UPDATE cache_respostas SET acessado_em = MAX(acessado_em, ?) WHERE namespace = ? AND chave = ?",
+                acessos,
+            )
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def gravar(self, namespace: str, chave: str, valor: str, expira_em: float):
+        with self._lock:
+            self._gravar_acessos()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_respostas (namespace, chave, valor, expira_em, acessado_em) VALUES (?, ?, ?, ?, ?)",
+                (namespace, chave, valor, expira_em, time.time()),
+            )
+            cursor = self._conn.execute(
+                """
+                DELETE FROM cache_respostas WHERE namespace = ? AND chave IN (
+                    SELECT chave FROM cache_respostas WHERE namespace = ?
+                    ORDER BY acessado_em DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (namespace, namespace, self.max_itens),
+            )
+            self.remocoes += max(cursor.rowcount, 0)
+
+    def tamanho(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_respostas").fetchone()[0]
+
+    async def executar(self, funcao: Callable[..., Any], *args) -> Any:
+        """Executa funcao na thread do arquivo e aguarda o resultado, sem bloquear o event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+
+    def submeter(self, funcao: Callable[..., Any], *args) -> Future:
+        """Como executar, sem aguardar; erros são registrados no log"""
+        futuro = self._executor.submit(funcao, *args)
+        futuro.add_done_callback(
+            lambda concluido: concluido.cancelled() or concluido.exception() is None
+            or log.error("Erro ao gravar no cache em disco", exc_info=concluido.exception())
+        )
+        return futuro
+
+
+class CacheRespostas:
+    """
+    Cache com TTL e remoção LRU para um tipo de resposta (namespace).
+
+    Sempre mantém os objetos já validados em memória; com backend SQLite, também
+    persiste o JSON em disco para que outros workers reaproveitem a resposta. O disco é lido e
+    gravado na thread do arquivo: a leitura é aguardada e a gravação segue em segundo plano.
+    """
+
+    def __init__(self, namespace: str, tipo: Optional[Type[BaseModel]] = None,
+                 ttl_segundos: float = CACHE_TTL_SEGUNDOS, max_itens: int = CACHE_MAX_ITENS,
+                 disco: Optional[BackendSQLite] = None):
+        self.namespace = namespace
+        self.tipo = tipo
+        self.ttl_segundos = ttl_segundos
+        self.memoria = BackendMemoria(max_itens)
+        self.disco = disco
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+    async def obter(self, chave: str) -> Optional[Any]:
+        """Retorna a resposta em cache (objeto validado) ou None"""
+        valor = self.memoria.obter(self.namespace, chave)
+        if valor is not None:
+            self.hits += 1
+            return valor
+
+        if self.disco is not None:
+            serializado = await self.disco.executar(self.disco.obter, self.namespace, chave)
+            if serializado is not None:
+                valor = self.tipo.model_validate_json(serializado) if self.tipo else json.loads(serializado)
+                self.memoria.gravar(self.namespace, chave, valor, time.time() + self.ttl_segundos)
+                self.hits += 1
+                self.hits_disco += 1
+                return valor
+
+        self.misses += 1
+        return None
+
+    def gravar(self, chave: str, valor: Any):
+        """Armazena a resposta em memória e, se configurado, no disco"""
+        expira_em = time.time() + self.ttl_segundos
+        self.memoria.gravar(self.namespace, chave, valor, expira_em)
+        if self.disco is not None:
+            serializado = valor.model_dump_json() if isinstance(valor, BaseModel) else json.dumps(valor, ensure_ascii=False)
+            self.disco.submeter(self.disco.gravar, self.namespace, chave, serializado, expira_em)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "sqlite" if self.disco is not None else "memoria",
+            "itens_memoria": self.memoria.tamanho(),
+            "hits": self.hits,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+            "remocoes": self.memoria.remocoes + (self.disco.remocoes if self.disco is not None else 0),
+        }
+
+
+_backend_disco: Optional[BackendSQLite] = None
+_caches: Dict[str, CacheRespostas] = {}
+
+
+def obter_cache(namespace: str, tipo: Optional[Type[BaseModel]] = None) -> CacheRespostas:
+    """Retorna o cache do namespace, criando-o com o backend configurado"""
+    global _backend_disco
+    if namespace not in _caches:
+        if CACHE_BACKEND == "sqlite" and _backend_disco is None:
+            _backend_disco = BackendSQLite(CACHE_SQLITE_PATH, CACHE_MAX_ITENS)
+        _caches[namespace] = CacheRespostas(namespace, tipo, disco=_backend_disco)
+    return _caches[namespace]
+
+
+def estatisticas_caches() -> Dict[str, Dict[str, Any]]:
+    """Estatísticas de todos os caches criados"""
+    return {namespace: cache.estatisticas() for namespace, cache in _caches.items()}
@@ -0,0 +1,185 @@
+"""
+Cache semântico de respostas da IA Generativa
+Reaproveita respostas de perfis quase idênticos (MinHash + LSH sobre os termos da requisição), sem embeddings remotos
+"""
+
+import os
+import random
+import re
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from cache_respostas import CACHE_MAX_ITENS, CACHE_TTL_SEGUNDOS
+from indice_catalogo import tokenizar
+from telemetria import percentil
+
+
+# Ativa o cache semântico (além do cache exato de cache_respostas)
+CACHE_SEMANTICO = os.getenv("CACHE_SEMANTICO", "true").lower() in ("1", "true", "sim")
+# Similaridade de Jaccard mínima entre os termos das requisições para reaproveitar a resposta
+CACHE_SEMANTICO_LIMIAR = float(os.getenv("CACHE_SEMANTICO_LIMIAR", "0.8"))
+CACHE_SEMANTICO_MAX_ITENS = int(os.getenv("CACHE_SEMANTICO_MAX_ITENS", str(CACHE_MAX_ITENS)))
+# Assinatura MinHash dividida em BANDAS x LINHAS_POR_BANDA para o índice LSH
+BANDAS = 16
+LINHAS_POR_BANDA = 4
+
+_PRIMO = (1 << 61) - 1
+_gerador = random.Random(20251111)
+_PERMUTACOES = [(_gerador.randrange(1, _PRIMO), _gerador.randrange(0, _PRIMO)) for _ in range(BANDAS * LINHAS_POR_BANDA)]
+
+
+def termos_campos(**campos: Any) -> Set[str]:
+    """Conjunto de termos da requisição, prefixados pelo campo (ex.: "competencias:java")"""
+    termos: Set[str] = set()
+    for campo, valor in campos.items():
+        textos = valor if isinstance(valor, (list, tuple, set)) else [valor]
+        for texto in textos:
+            termos.update(f"{campo}:{termo}" for termo in tokenizar(texto))
+    return termos
+
+
+def assinatura_minhash(termos: Iterable[str]) -> Tuple[int, ...]:
+    """Assinatura MinHash: o menor hash de cada permutação sobre os termos"""
+    hashes = [zlib.crc32(termo.encode("utf-8")) for termo in termos] or [0]
+    return tuple(min((a * h + b) % _PRIMO for h in hashes) for a, b in _PERMUTACOES)
+
+
+def trocar_nome(texto: str, nome_original: Optional[str], nome: str) -> str:
+    """
+    Texto reaproveitado de outro perfil com o nome dele trocado pelo do perfil atual. Só troca o nome
+    como palavra inteira: "Ana" não altera "Banana" nem "Anagrama".
+    """
+    if not nome_original or nome_original == nome:
+        return texto
+    return re.sub(rf"(?<!\w){re.escape(nome_original)}(?!\w)", lambda _: nome, texto)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class _Entrada:
+    def __init__(self, termos: Set[str], bandas: List[tuple], valor: Any, meta: Any, expira_em: float):
+        self.termos = termos
+        self.bandas = bandas
+        self.valor = valor
+        self.meta = meta
+        self.expira_em = expira_em
+
+
+class CacheSemantico:
+    """
+    Cache por similaridade para um tipo de resposta (namespace).
+
+    Entradas só são comparadas dentro da mesma partição (campos que precisam ser iguais, como
+    o nível do usuário). Os candidatos vêm do índice LSH e são confirmados pela similaridade
+    de Jaccard exata. Memória limitada a max_itens, com remoção LRU e TTL.
+    """
+
+    def __init__(self, namespace: str, limiar: float = CACHE_SEMANTICO_LIMIAR,
+                 max_itens: int = CACHE_SEMANTICO_MAX_ITENS, ttl_segundos: float = CACHE_TTL_SEGUNDOS):
+        self.namespace = namespace
+        self.limiar = limiar
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._entradas: "OrderedDict[int, _Entrada]" = OrderedDict()
+        self._baldes: Dict[tuple, Set[int]] = {}
+        self._proximo_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.remocoes = 0
+        self._similaridades: Deque[float] = deque(maxlen=1000)
+
+    def obter(self, particao: str, termos: Set[str]) -> Optional[Tuple[Any, Any, float]]:
+        """Retorna (valor, meta, similaridade) da entrada mais parecida acima do limiar, ou None"""
+        agora = time.time()
+        melhor: Optional[Tuple[int, float]] = None
+        for identificador in self._candidatos(particao, termos):
+            entrada = self._entradas[identificador]
+            if entrada.expira_em < agora:
+                self._remover(identificador)
+                continue
+            similaridade = jaccard(termos, entrada.termos)
+            if similaridade >= self.limiar and (melhor is None or similaridade > melhor[1]):
+                melhor = (identificador, similaridade)
+
+        if melhor is None:
+            self.misses += 1
+            return None
+        identificador, similaridade = melhor
+        self._entradas.move_to_end(identificador)
+        self.hits += 1
+        self._similaridades.append(similaridade)
+        entrada = self._entradas[identificador]
+        return entrada.valor, entrada.meta, similaridade
+
+    def gravar(self, particao: str, termos: Set[str], valor: Any, meta: Any = None):
+        """Armazena a resposta; meta guarda o que for preciso para ajustá-la a outro perfil"""
+        assinatura = assinatura_minhash(termos)
+        bandas = [
+            (particao, i, assinatura[i * LINHAS_POR_BANDA:(i + 1) * LINHAS_POR_BANDA])
+            for i in range(BANDAS)
+        ]
+        identificador = self._proximo_id
+        self._proximo_id += 1
+        self._entradas[identificador] = _Entrada(termos, bandas, valor, meta, time.time() + self.ttl_segundos)
+        for banda in bandas:
+            self._baldes.setdefault(banda, set()).add(identificador)
+        while len(self._entradas) > self.max_itens:
+            self._remover(next(iter(self._entradas)))
+
+    def _candidatos(self, particao: str, termos: Set[str]) -> Set[int]:
+        if not self._entradas:
+            return set()
+        assinatura = assinatura_minhash(termos)
+        candidatos: Set[int] = set()
+        for i in range(BANDAS):
+            banda = (particao, i, assinatura[i * LINHAS_POR_BANDA:(i + 1) * LINHAS_POR_BANDA])
+            candidatos |= self._baldes.get(banda, set())
+        return candidatos
+
+    def _remover(self, identificador: int):
+        entrada = self._entradas.pop(identificador)
+        for banda in entrada.bandas:
+            balde = self._baldes.get(banda)
+            if balde is not None:
+                balde.discard(identificador)
+                if not balde:
+                    del self._baldes[banda]
+        self.remocoes += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        similaridades = sorted(self._similaridades)
+        return {
+            "itens": len(self._entradas),
+            "limiar": self.limiar,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+            "remocoes": self.remocoes,
+            # Qualidade dos acertos: quanto as requisições atendidas se parecem com as originais
+            "similaridade_media": round(sum(similaridades) / len(similaridades), 4) if similaridades else None,
+            "similaridade_p5": round(percentil(similaridades, 5), 4) if similaridades else None,
+        }
+
+
+_caches: Dict[str, CacheSemantico] = {}
+
+
+def obter_cache_semantico(namespace: str) -> Optional[CacheSemantico]:
+    """Retorna o cache semântico do namespace, ou None se o cache semântico estiver desativado"""
+    if not CACHE_SEMANTICO:
+        return None
+    if namespace not in _caches:
+        _caches[namespace] = CacheSemantico(namespace)
+    return _caches[namespace]
+
+
+def estatisticas_caches_semanticos() -> Dict[str, Dict[str, Any]]:
+    """Estatísticas de todos os caches semânticos criados"""
+    return {namespace: cache.estatisticas() for namespace, cache in _caches.items()}
@@ -0,0 +1,612 @@
+"""
+Cliente assíncrono para a Gemini API
+Executa as chamadas síncronas do SDK em um pool de threads limitado, sem bloquear o event loop,
+com um cliente por credencial do pool criado sob demanda
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple, Type
+
+from fastapi import Request
+from pydantic import BaseModel
+
+from controle_quota import TOKENS_SAIDA_ESTIMADOS, QuotaExceededException, classificar_erro, estimar_tokens
+from credenciais_gemini import Credencial, obter_pool
+from estado_compartilhado import em_segundo_plano, fora_do_loop
+from log_estruturado import obter_logger
+from metricas import BALDES_CARACTERES, BALDES_TOKENS, registro_metricas
+from prefixo_prompt import CODIGOS_CACHE_INVALIDO, PrefixoPrompt, cache_contexto
+from telemetria import tempos_inicializacao
+
+
+# Quantidade máxima de chamadas simultâneas ao Gemini (as demais aguardam na fila do pool)
+GEMINI_MAX_WORKERS = int(os.getenv("GEMINI_MAX_WORKERS", "8"))
+# Tempo máximo de espera por chamada, em segundos
+GEMINI_TIMEOUT_SEGUNDOS = float(os.getenv("GEMINI_TIMEOUT_SEGUNDOS", "30"))
+# Intervalo entre verificações de desconexão do cliente HTTP, em segundos
+INTERVALO_VERIFICACAO_DESCONEXAO = 0.5
+# Orçamento de latência padrão por requisição (pode ser informado pelo header X-Orcamento-Latencia-Ms)
+ORCAMENTO_LATENCIA_SEGUNDOS = float(os.getenv("ORCAMENTO_LATENCIA_SEGUNDOS", str(GEMINI_TIMEOUT_SEGUNDOS)))
+# Tempo de espera pelo modelo primário antes de disparar a requisição no modelo alternativo
+HEDGE_APOS_SEGUNDOS = float(os.getenv("HEDGE_APOS_SEGUNDOS", "8"))
+# Modelo alternativo (hedge) de cada modelo primário
+MODELOS_HEDGE = json.loads(os.getenv("GEMINI_MODELOS_HEDGE", json.dumps({
+    "gemini-2.5-flash": "gemini-2.0-flash",
+    "gemini-2.0-flash-exp": "gemini-2.0-flash",
+})))
+
+# Conexões HTTP mantidas abertas com a API (primário e hedge podem estar em andamento ao mesmo tempo)
+GEMINI_POOL_CONEXOES = int(os.getenv("GEMINI_POOL_CONEXOES", str(GEMINI_MAX_WORKERS * 2)))
+# Na inicialização, faz uma chamada leve (metadados do modelo) para abrir a conexão TLS antes do tráfego
+GEMINI_AQUECER = os.getenv("GEMINI_AQUECER", "true").lower() in ("1", "true", "sim")
+GEMINI_MODELO_AQUECIMENTO = os.getenv("GEMINI_MODELO_AQUECIMENTO", "gemini-2.5-flash")
+# Versão do SDK para a qual _reutilizar_conexoes foi escrito (a mesma fixada no requirements.txt)
+VERSAO_SDK_SESSAO = "0.5.0"
+
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix="gemini")
+
+log = obter_logger("gemini")
+
+duracao_chamadas = registro_metricas.histograma(
+    "gemini_duracao_segundos", "Duração das chamadas ao Gemini por modelo e resultado", ("modelo", "resultado")
+)
+tokens_chamadas = registro_metricas.histograma(
+    "gemini_tokens", "Tokens por chamada ao Gemini (prompt e resposta)", ("modelo", "tipo"), BALDES_TOKENS
+)
+caracteres_chamadas = registro_metricas.histograma(
+    "gemini_caracteres", "Tamanho em caracteres do prompt e da resposta", ("modelo", "tipo"), BALDES_CARACTERES
+)
+hedges = registro_metricas.contador("gemini_hedges_total", "Requisições hedge disparadas por modelo alternativo", ("modelo",))
+
+
+def tipos_gemini():
+    """Módulo google.genai.types; o SDK só é importado quando usado (ou na preparação em segundo plano)"""
+    from google.genai import types
+    return types
+
+
+class ClienteGeminiCompartilhado:
+    """
+    Clientes do Gemini do processo, um por credencial do pool (ver credenciais_gemini.py).
+
+    O SDK é importado e os clientes criados na primeira vez em que são usados (normalmente
+    na preparação iniciada pelo lifespan, fora do event loop). Todos os clientes usam a mesma
+    sessão HTTP com keep-alive. models/caches sem credencial usam a primeira credencial com chave.
+    """
+
+    def __init__(self):
+        self._clientes: Dict[str, Any] = {}
+        self._sessao = None
+        self._fabrica: Optional[Callable[[Credencial], Any]] = None
+        self._trava = threading.Lock()
+        self.pronto = False
+
+    @property
+    def configurado(self) -> bool:
+        return self._fabrica is not None or any(credencial.chave() for credencial in obter_pool().credenciais)
+
+    @property
+    def models(self):
+        return self.obter().models
+
+    @property
+    def caches(self):
+        return self.obter().caches
+
+    def usar_fabrica(self, fabrica: Callable[[Credencial], Any]):
+        """Substitui a criação dos clientes do SDK (ex.: Gemini simulado no benchmark)"""
+        with self._trava:
+            self._fabrica = fabrica
+            self._clientes.clear()
+
+    def _credencial_padrao(self) -> Credencial:
+        credenciais = obter_pool().credenciais
+        return next((credencial for credencial in credenciais if credencial.chave()), credenciais[0])
+
+    def obter(self, credencial: Optional[Credencial] = None):
+        """Cliente da credencial, criado na primeira chamada; lança ValueError se ela não tiver chave"""
+        credencial = credencial or self._credencial_padrao()
+        cliente = self._clientes.get(credencial.nome)
+        if cliente is None:
+            with self._trava:
+                cliente = self._clientes.get(credencial.nome)
+                if cliente is None:
+                    cliente = self._criar(credencial)
+                    self._clientes[credencial.nome] = cliente
+        return cliente
+
+    def _criar(self, credencial: Credencial):
+        if self._fabrica is not None:
+            return self._fabrica(credencial)
+        inicio = time.perf_counter()
+        from google import genai
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        cliente = genai.Client(api_key=credencial.chave())
+        if self._sessao is None:
+            sessao = requests.Session()
+            sessao.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=GEMINI_POOL_CONEXOES))
+            self._sessao = sessao
+        _reutilizar_conexoes(cliente, self._sessao)
+        tempos_inicializacao.registrar("sdk_gemini", time.perf_counter() - inicio)
+        return cliente
+
+    def criar_clientes(self):
+        """Cria os clientes de todas as credenciais com chave"""
+        for credencial in obter_pool().credenciais:
+            if credencial.chave() or self._fabrica is not None:
+                self.obter(credencial)
+
+    def aquecer(self, modelo: str = GEMINI_MODELO_AQUECIMENTO):
+        """Resolve DNS e abre a conexão TLS com uma chamada sem custo de tokens"""
+        inicio = time.perf_counter()
+        self.models.get(model=modelo)
+        tempos_inicializacao.registrar("aquecimento", time.perf_counter() - inicio)
+
+    def fechar(self):
+        if self._sessao is not None:
+            self._sessao.close()
+
+
+def _cliente_sdk(client, credencial: Credencial):
+    """Cliente do SDK da credencial; clientes passados diretamente (sem pool) são usados como estão"""
+    return client.obter(credencial) if isinstance(client, ClienteGeminiCompartilhado) else client
+
+
+def _reutilizar_conexoes(cliente, sessao):
+    """
+    O SDK (google-genai 0.5.0) abre uma requests.Session nova a cada chamada, pagando DNS e TLS
+    toda vez, e o http_options público dessa versão não aceita uma sessão; aqui as chamadas com
+    API key passam a usar a sessão compartilhada. A troca depende de um método privado do SDK, então
+    só é feita na versão VERSAO_SDK_SESSAO e com a assinatura esperada; em qualquer outra o SDK fica
+    como está (uma conexão por chamada) e um aviso vai para o log.
+    """
+    from google import genai
+
+    versao = getattr(genai, "__version__", None)
+    api_client = getattr(cliente, "_api_client", None)
+    original = getattr(api_client, "_request_unauthorized", None)
+    if versao != VERSAO_SDK_SESSAO or original is None or not _assinatura_compativel(original):
+        log.warning(
+            "SDK do Gemini incompatível com a sessão compartilhada; cada chamada abrirá uma nova conexão",
+            extra={"versao_sdk": versao, "versao_esperada": VERSAO_SDK_SESSAO},
+        )
+        return
+    from google.genai import errors
+    from google.genai._api_client import HttpResponse, RequestJsonEncoder
+
+    def requisitar(http_request, stream: bool = False):
+        dados = http_request.data
+        if dados and not isinstance(dados, bytes):
+            dados = json.dumps(dados, cls=RequestJsonEncoder)
+        response = sessao.request(
+            method=http_request.method,
+            url=http_request.url,
+            headers=http_request.headers,
+            data=dados or None,
+            timeout=http_request.timeout,
+            stream=stream,
+        )
+        errors.APIError.raise_for_response(response)
+        return HttpResponse(response.headers, response if stream else [response.text])
+
+    api_client._request_unauthorized = requisitar
+
+
+def _assinatura_compativel(metodo) -> bool:
+    try:
+        parametros = list(inspect.signature(metodo).parameters)
+    except (TypeError, ValueError):
+        return False
+    return parametros == ["http_request", "stream"]
+
+
+cliente_compartilhado = ClienteGeminiCompartilhado()
+
+
+async def preparar_gemini(aquecer: bool = GEMINI_AQUECER):
+    """
+    Preparação em segundo plano iniciada no lifespan: importa o SDK, cria o cliente e, opcionalmente,
+    aquece a conexão. O serviço já aceita requisições enquanto isso; /pronto só responde 200 ao final.
+    """
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    try:
+        await loop.run_in_executor(_executor, tipos_gemini)
+        tempos_inicializacao.registrar("importacao_sdk", time.perf_counter() - inicio)
+        if cliente_compartilhado.configurado:
+            await loop.run_in_executor(_executor, cliente_compartilhado.criar_clientes)
+            if aquecer:
+                await loop.run_in_executor(_executor, cliente_compartilhado.aquecer)
+    except Exception as e:
+        log.warning("Falha ao preparar o cliente Gemini", extra={"detalhe": str(e)})
+    finally:
+        tempos_inicializacao.registrar("preparacao_gemini", time.perf_counter() - inicio)
+        cliente_compartilhado.pronto = True
+        log.info("Inicialização concluída", extra={"tempos": tempos_inicializacao.estatisticas()})
+
+
+class GeminiTimeoutException(TimeoutError):
+    """Exceção para chamadas ao Gemini que excederam o tempo limite"""
+    pass
+
+
+async def gerar_conteudo(
+    client,
+    *,
+    model: str,
+    contents,
+    config=None,
+    timeout: Optional[float] = None,
+    http_request: Optional[Request] = None,
+    prefixo: Optional[PrefixoPrompt] = None,
+) -> str:
+    """
+    Executa client.models.generate_content no pool dedicado e retorna o texto da resposta.
+
+    - timeout: limite por chamada (padrão GEMINI_TIMEOUT_SEGUNDOS)
+    - http_request: se informado, a chamada é cancelada quando o cliente desconecta
+    - prefixo: parte fixa do prompt, referenciada no cache de contexto ou enviada como instrução de sistema
+
+    A chamada vai para uma credencial do pool com orçamento; se o Gemini responder 429, ela é
+    refeita em outra credencial ainda não tentada (dentro do mesmo timeout). Lança
+    QuotaExceededException sem chamar a API se nenhuma credencial tem orçamento local (ou todas
+    estão com o disjuntor aberto), e também quando o 429 não tem para onde ser redirecionado.
+    """
+    pool = obter_pool()
+    tokens_estimados = _estimar_tokens_chamada(contents, config, prefixo)
+    loop = asyncio.get_running_loop()
+    limite = GEMINI_TIMEOUT_SEGUNDOS if timeout is None else timeout
+    prazo = loop.time() + limite
+    tentadas = set()
+
+    while True:
+        credencial, controle, reservados = await fora_do_loop(pool.reservar, model, tokens_estimados, excluir=tentadas,
+                                                              desfazer=_desfazer_reserva(pool, model))
+        tentadas.add(credencial.nome)
+        inicio = time.perf_counter()
+        # O cliente da credencial é resolvido na thread: a criação (se ainda não houver) não bloqueia o event loop
+        chamada = loop.run_in_executor(
+            _executor,
+            functools.partial(_gerar_conteudo_sdk, client, credencial, model=model, contents=contents, config=config,
+                              prefixo=prefixo),
+        )
+        try:
+            response = await aguardar_conectado(chamada, http_request, max(prazo - loop.time(), 0.001))
+        except asyncio.CancelledError:
+            duracao_chamadas.observar(time.perf_counter() - inicio, model, "cancelada")
+            em_segundo_plano(controle.disjuntor.liberar_teste)
+            pool.concluir(credencial, model, cancelada=True)
+            raise
+        except Exception as e:
+            duracao_chamadas.observar(time.perf_counter() - inicio, model, classificar_erro(e) or "erro")
+            pool.concluir(credencial, model, erro=e)
+            redirecionar = (classificar_erro(e) == "quota" and not isinstance(e, QuotaExceededException)
+                            and prazo > loop.time() and pool.possui_alternativa(model, tentadas))
+            if redirecionar:
+                await fora_do_loop(controle.registrar_falha, e, reservados)
+                log.info("429 do Gemini; refazendo a chamada com outra credencial",
+                         extra={"modelo": model, "credencial": credencial.nome})
+                continue
+            raise await _falha_registrada(controle, e, reservados)
+        break
+
+    duracao = time.perf_counter() - inicio
+    tokens_usados = _tokens_usados(response)
+    await fora_do_loop(controle.registrar_sucesso, reservados, tokens_usados)
+    pool.concluir(credencial, model, tokens_usados=tokens_usados)
+    tempos_inicializacao.registrar("primeira_chamada_gemini", duracao)
+    _registrar_tamanhos(model, contents, config, response, prefixo=prefixo)
+    duracao_chamadas.observar(duracao, model, "sucesso")
+    return response.text
+
+
+def _gerar_conteudo_sdk(client, credencial: Credencial, *, model: str, contents, config,
+                        prefixo: Optional[PrefixoPrompt]):
+    sdk = _cliente_sdk(client, credencial)
+    config_prefixo = cache_contexto.aplicar(sdk, model, config, prefixo, escopo=credencial.nome)
+    try:
+        return sdk.models.generate_content(model=model, contents=contents, config=config_prefixo)
+    except Exception as e:
+        if not _cache_recusado(e, config_prefixo):
+            raise
+        # Cache expirado ou removido no Gemini: a chamada é refeita com o prefixo inline
+        cache_contexto.invalidar(prefixo, model, escopo=credencial.nome)
+        config_inline = cache_contexto.aplicar(sdk, model, config, prefixo, usar_cache=False)
+        return sdk.models.generate_content(model=model, contents=contents, config=config_inline)
+
+
+def _cache_recusado(erro: Exception, config) -> bool:
+    return getattr(config, "cached_content", None) is not None and getattr(erro, "code", None) in CODIGOS_CACHE_INVALIDO
+
+
+async def gerar_conteudo_com_hedge(
+    client,
+    *,
+    model: str,
+    contents,
+    config=None,
+    orcamento: Optional[float] = None,
+    validar: Optional[Callable[[str], bool]] = None,
+    prefixo: Optional[PrefixoPrompt] = None,
+) -> Tuple[str, str]:
+    """
+    Chama o modelo primário e, se ele não responder em HEDGE_APOS_SEGUNDOS (ou falhar),
+    dispara a mesma requisição no modelo alternativo. A primeira resposta válida vence
+    e a outra chamada é cancelada.
+
+    Retorna (texto, camada), com camada "primario" ou "hedge". Lança GeminiTimeoutException
+    se o orçamento de latência terminar sem resposta válida.
+    """
+    loop = asyncio.get_running_loop()
+    orcamento = ORCAMENTO_LATENCIA_SEGUNDOS if orcamento is None else orcamento
+    inicio = loop.time()
+    prazo = inicio + orcamento
+    limiar_hedge = inicio + min(HEDGE_APOS_SEGUNDOS, orcamento)
+    alternativo = MODELOS_HEDGE.get(model)
+    validar = validar or (lambda texto: bool(texto and texto.strip()))
+
+    def disparar(modelo: str) -> asyncio.Task:
+        return asyncio.ensure_future(gerar_conteudo(
+            client, model=modelo, contents=contents, config=config, timeout=max(prazo - loop.time(), 0.001),
+            prefixo=prefixo,
+        ))
+
+    tarefas = {disparar(model): "primario"}
+    hedge_disparado = alternativo is None
+    ultimo_erro: Optional[BaseException] = None
+
+    try:
+        while True:
+            agora = loop.time()
+            if agora >= prazo:
+                raise GeminiTimeoutException(f"Orçamento de latência de {orcamento:.1f}s esgotado")
+            if tarefas:
+                espera = (limiar_hedge if not hedge_disparado else prazo) - agora
+                concluidas, _ = await asyncio.wait(tarefas, timeout=max(espera, 0), return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in concluidas:
+                    camada = tarefas.pop(tarefa)
+                    if tarefa.exception() is None and validar(tarefa.result()):
+                        return tarefa.result(), camada
+                    ultimo_erro = tarefa.exception() or ValueError(f"Resposta inválida do modelo ({camada})")
+
+            # Hedge ao atingir o limiar ou quando o primário já falhou
+            agora = loop.time()
+            if not hedge_disparado and agora < prazo and (agora >= limiar_hedge or not tarefas):
+                hedge_disparado = True
+                log.info("Disparando requisição hedge", extra={"modelo": alternativo})
+                hedges.incrementar(alternativo)
+                tarefas[disparar(alternativo)] = "hedge"
+            elif not tarefas:
+                raise ultimo_erro
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+
+def orcamento_latencia(http_request: Optional[Request]) -> float:
+    """Orçamento de latência da requisição: header X-Orcamento-Latencia-Ms ou o padrão configurado"""
+    if http_request is not None:
+        valor = http_request.headers.get("x-orcamento-latencia-ms")
+        if valor:
+            try:
+                return max(int(valor), 1) / 1000
+            except ValueError:
+                pass
+    return ORCAMENTO_LATENCIA_SEGUNDOS
+
+
+async def gerar_conteudo_stream(
+    client,
+    *,
+    model: str,
+    contents,
+    config=None,
+    timeout: Optional[float] = None,
+    prefixo: Optional[PrefixoPrompt] = None,
+) -> AsyncIterator[str]:
+    """
+    Executa client.models.generate_content_stream no pool dedicado e entrega cada trecho de texto
+    assim que chega. O timeout vale para a geração completa. A credencial é escolhida pelo pool como
+    em gerar_conteudo, mas um 429 não é refeito em outra (o stream já pode ter entregue trechos).
+    """
+    pool = obter_pool()
+    credencial, controle, reservados = await fora_do_loop(
+        pool.reservar, model, _estimar_tokens_chamada(contents, config, prefixo), desfazer=_desfazer_reserva(pool, model)
+    )
+    # Resultado informado ao pool no fim; sem outro registro, o consumidor desistiu do stream
+    conclusao: Dict[str, Any] = {"cancelada": True}
+
+    loop = asyncio.get_running_loop()
+    fila: asyncio.Queue = asyncio.Queue()
+    parar = threading.Event()
+    fim = object()
+
+    ultima_parte = None
+
+    def transmitir(sdk, config_prefixo):
+        nonlocal ultima_parte
+        for parte in sdk.models.generate_content_stream(model=model, contents=contents, config=config_prefixo):
+            if parar.is_set():
+                break
+            ultima_parte = parte
+            loop.call_soon_threadsafe(fila.put_nowait, (parte.text or "", None))
+
+    def produzir():
+        try:
+            sdk = _cliente_sdk(client, credencial)
+            config_prefixo = cache_contexto.aplicar(sdk, model, config, prefixo, escopo=credencial.nome)
+            try:
+                transmitir(sdk, config_prefixo)
+            except Exception as e:
+                # Cache recusado antes do primeiro trecho: refaz com o prefixo inline
+                if ultima_parte is not None or not _cache_recusado(e, config_prefixo):
+                    raise
+                cache_contexto.invalidar(prefixo, model, escopo=credencial.nome)
+                transmitir(sdk, cache_contexto.aplicar(sdk, model, config, prefixo, usar_cache=False))
+        except Exception as e:
+            loop.call_soon_threadsafe(fila.put_nowait, (None, e))
+        finally:
+            loop.call_soon_threadsafe(fila.put_nowait, (fim, None))
+
+    chamada = loop.run_in_executor(_executor, produzir)
+    limite = GEMINI_TIMEOUT_SEGUNDOS if timeout is None else timeout
+    inicio = loop.time()
+    prazo = inicio + limite
+    caracteres_resposta = 0
+
+    try:
+        while True:
+            try:
+                try:
+                    texto, erro = await asyncio.wait_for(fila.get(), max(prazo - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    raise GeminiTimeoutException(f"Gemini não concluiu o streaming em {limite:.1f}s")
+                if erro is not None:
+                    raise erro
+            except Exception as e:
+                duracao_chamadas.observar(loop.time() - inicio, model, classificar_erro(e) or "erro")
+                conclusao = {"erro": e}
+                raise await _falha_registrada(controle, e, reservados)
+            if texto is fim:
+                conclusao = {"tokens_usados": _tokens_usados(ultima_parte)}
+                await fora_do_loop(controle.registrar_sucesso, reservados, conclusao["tokens_usados"])
+                _registrar_tamanhos(model, contents, config, ultima_parte, caracteres_resposta, prefixo)
+                duracao_chamadas.observar(loop.time() - inicio, model, "sucesso")
+                return
+            if texto:
+                caracteres_resposta += len(texto)
+                yield texto
+    except (asyncio.CancelledError, GeneratorExit):
+        em_segundo_plano(controle.disjuntor.liberar_teste)
+        raise
+    finally:
+        # Interrompe a leitura do stream na thread se o consumidor desistir
+        parar.set()
+        if not chamada.done():
+            chamada.cancel()
+        pool.concluir(credencial, model, **conclusao)
+
+
+def schema_resposta(modelo: Type[BaseModel], excluir: Iterable[str] = ()) -> dict:
+    """
+    JSON schema do modelo no formato aceito em response_schema: referências ($defs) expandidas,
+    sem títulos e com tipos em maiúsculas (o SDK não expande modelos aninhados sozinho).
+    Os campos mantêm a ordem de declaração do modelo (propertyOrdering), da qual o streaming depende.
+    excluir: campos de primeiro nível preenchidos pelo serviço, e não pelo Gemini
+    """
+    schema = modelo.model_json_schema()
+    for campo in excluir:
+        schema["properties"].pop(campo, None)
+        if campo in schema.get("required", []):
+            schema["required"].remove(campo)
+    definicoes = schema.pop("$defs", {})
+
+    def converter(valor: Any) -> Any:
+        if isinstance(valor, list):
+            return [converter(item) for item in valor]
+        if not isinstance(valor, dict):
+            return valor
+        if "$ref" in valor:
+            return converter(definicoes[valor["$ref"].rsplit("/", 1)[-1]])
+        convertido = {
+            chave: item.upper() if chave == "type" else converter(item)
+            for chave, item in valor.items() if chave != "title"
+        }
+        if "properties" in valor:
+            convertido["propertyOrdering"] = list(valor["properties"])
+        return convertido
+
+    return converter(schema)
+
+
+def _estimar_tokens_chamada(contents, config, prefixo: Optional[PrefixoPrompt] = None) -> int:
+    """Tokens estimados do prompt (incluindo instrução de sistema e prefixo) mais a reserva de saída"""
+    instrucao = getattr(config, "system_instruction", None) if config is not None else None
+    tokens_prefixo = prefixo.tokens if prefixo is not None else 0
+    return estimar_tokens(contents, instrucao) + tokens_prefixo + TOKENS_SAIDA_ESTIMADOS
+
+
+def _tokens_usados(response) -> Optional[int]:
+    """Total de tokens informado pelo Gemini, se disponível"""
+    uso = getattr(response, "usage_metadata", None)
+    return getattr(uso, "total_token_count", None) if uso is not None else None
+
+
+def _registrar_tamanhos(modelo: str, contents, config, response, caracteres_resposta: Optional[int] = None,
+                        prefixo: Optional[PrefixoPrompt] = None):
+    """
+    Tamanho do prompt e da resposta em caracteres e tokens (os do Gemini, ou a estimativa local).
+    O prompt inclui o prefixo; a parte atendida pelo cache de contexto é registrada como "cache".
+    """
+    instrucao = getattr(config, "system_instruction", None) if config is not None else None
+    if prefixo is not None:
+        instrucao = prefixo.texto
+    caracteres_prompt = len(str(contents)) + (len(str(instrucao)) if instrucao else 0)
+    if caracteres_resposta is None:
+        caracteres_resposta = len(getattr(response, "text", None) or "")
+    uso = getattr(response, "usage_metadata", None)
+    tokens_prompt = getattr(uso, "prompt_token_count", None) or estimar_tokens(contents, instrucao)
+    tokens_resposta = getattr(uso, "candidates_token_count", None) or caracteres_resposta // 4 + 1
+    caracteres_chamadas.observar(caracteres_prompt, modelo, "prompt")
+    caracteres_chamadas.observar(caracteres_resposta, modelo, "resposta")
+    tokens_chamadas.observar(tokens_prompt, modelo, "prompt")
+    tokens_chamadas.observar(tokens_resposta, modelo, "resposta")
+    tokens_cache = getattr(uso, "cached_content_token_count", None)
+    if tokens_cache:
+        tokens_chamadas.observar(tokens_cache, modelo, "cache")
+        cache_contexto.registrar_uso(prefixo, tokens_cache)
+
+
+def _desfazer_reserva(pool, model: str) -> Callable[[Tuple[Credencial, Any, int]], None]:
+    """Libera uma reserva concluída na thread do estado depois que a requisição foi cancelada"""
+    def desfazer(reserva):
+        credencial, controle, _ = reserva
+        em_segundo_plano(controle.disjuntor.liberar_teste)
+        pool.concluir(credencial, model, cancelada=True)
+    return desfazer
+
+
+async def _falha_registrada(controle, erro: Exception, reservados: int) -> Exception:
+    """Registra a falha no controle de quota e devolve a exceção a lançar; erros 429 viram QuotaExceededException"""
+    if await fora_do_loop(controle.registrar_falha, erro, reservados) == "quota" and not isinstance(erro, QuotaExceededException):
+        excecao = QuotaExceededException(f"Quota do Gemini excedida para {controle.modelo}")
+        excecao.__cause__ = erro
+        return excecao
+    return erro
+
+
+async def aguardar_conectado(aguardavel: Awaitable, http_request: Optional[Request], timeout: Optional[float] = None):
+    """
+    Aguarda o resultado, cancelando a espera se o cliente HTTP desconectar.
+    Com timeout, lança GeminiTimeoutException quando o prazo termina.
+    """
+    tarefa = asyncio.ensure_future(aguardavel)
+    loop = asyncio.get_running_loop()
+    prazo = loop.time() + timeout if timeout is not None else None
+    try:
+        while True:
+            espera = INTERVALO_VERIFICACAO_DESCONEXAO if http_request is not None else None
+            if prazo is not None:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    raise GeminiTimeoutException(f"Gemini não respondeu em {timeout:.1f}s")
+                espera = restante if espera is None else min(espera, restante)
+
+            concluidas, _ = await asyncio.wait({tarefa}, timeout=espera)
+            if concluidas:
+                return tarefa.result()
+            if http_request is not None and await http_request.is_disconnected():
+                raise asyncio.CancelledError("Cliente desconectou antes da resposta do Gemini")
+    finally:
+        # Chamadas ainda na fila do pool são descartadas; as já em execução terminam em segundo plano
+        if not tarefa.done():
+            tarefa.cancel()
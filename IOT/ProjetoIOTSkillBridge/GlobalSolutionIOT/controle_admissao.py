@@ -0,0 +1,153 @@
+"""
+Controle de admissão das chamadas ao Gemini
+Limite de concorrência adaptativo (AIMD pela latência observada) com fila de espera curta;
+o excedente é descartado na hora para que o endpoint responda com o conteúdo de fallback
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+from controle_quota import QuotaLocalException
+from telemetria import percentil
+
+
+# Limite inicial, mínimo e máximo de gerações simultâneas por endpoint
+ADMISSAO_LIMITE_INICIAL = int(os.getenv("ADMISSAO_LIMITE_INICIAL", "8"))
+ADMISSAO_LIMITE_MINIMO = int(os.getenv("ADMISSAO_LIMITE_MINIMO", "1"))
+ADMISSAO_LIMITE_MAXIMO = int(os.getenv("ADMISSAO_LIMITE_MAXIMO", "64"))
+# Requisições que podem aguardar uma vaga e por quanto tempo, antes de serem descartadas
+ADMISSAO_FILA = int(os.getenv("ADMISSAO_FILA", "16"))
+ADMISSAO_ESPERA_SEGUNDOS = float(os.getenv("ADMISSAO_ESPERA_SEGUNDOS", "1"))
+# Latência acima da qual (ou erro) o limite é reduzido multiplicativamente
+ADMISSAO_LATENCIA_ALVO_SEGUNDOS = float(os.getenv("ADMISSAO_LATENCIA_ALVO_SEGUNDOS", "8"))
+ADMISSAO_FATOR_REDUCAO = float(os.getenv("ADMISSAO_FATOR_REDUCAO", "0.7"))
+
+
+class SobrecargaException(Exception):
+    """Exceção para requisição descartada pelo controle de admissão"""
+    pass
+
+
+class LimitadorAdaptativo:
+    """
+    Semáforo com limite ajustado por AIMD.
+
+    Cada geração concluída abaixo da latência alvo soma 1/limite ao limite (cresce ~1 a cada
+    "rodada" de chamadas); latência acima do alvo ou erro multiplica o limite por
+    ADMISSAO_FATOR_REDUCAO, no máximo uma vez por intervalo de latência alvo.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.limite = float(ADMISSAO_LIMITE_INICIAL)
+        self.em_execucao = 0
+        self._aguardando: Deque[asyncio.Future] = deque()
+        self._ultima_reducao = 0.0
+        self._latencias: Deque[float] = deque(maxlen=1000)
+        self.admitidas = 0
+        self.descartadas_fila_cheia = 0
+        self.descartadas_espera = 0
+        self.reducoes = 0
+
+    @asynccontextmanager
+    async def admitir(self) -> AsyncIterator[None]:
+        """Ocupa uma vaga durante o bloco; lança SobrecargaException se não houver vaga a tempo"""
+        await self._entrar()
+        inicio = time.monotonic()
+        try:
+            yield
+        except (asyncio.CancelledError, QuotaLocalException):
+            # Cliente desistiu, ou a chamada foi recusada pela quota local sem chegar ao Gemini:
+            # nenhum dos dois diz algo sobre a latência do Gemini
+            self._liberar()
+            raise
+        except Exception:
+            self._ajustar(time.monotonic() - inicio, sucesso=False)
+            self._liberar()
+            raise
+        else:
+            self._ajustar(time.monotonic() - inicio, sucesso=True)
+            self._liberar()
+
+    async def _entrar(self):
+        if self.em_execucao < int(self.limite) and not self._aguardando:
+            self.em_execucao += 1
+            self.admitidas += 1
+            return
+        if len(self._aguardando) >= ADMISSAO_FILA:
+            self.descartadas_fila_cheia += 1
+            raise SobrecargaException(f"{self.nome}: {self.em_execucao} gerações em andamento e fila cheia")
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._aguardando.append(futuro)
+        try:
+            # A vaga é transferida por _despachar ao resolver o futuro
+            await asyncio.wait_for(futuro, ADMISSAO_ESPERA_SEGUNDOS)
+        except asyncio.TimeoutError:
+            self.descartadas_espera += 1
+            raise SobrecargaException(f"{self.nome}: sem vaga em {ADMISSAO_ESPERA_SEGUNDOS:.1f}s")
+        except asyncio.CancelledError:
+            if futuro.done() and not futuro.cancelled():
+                self._liberar()
+            raise
+        finally:
+            if futuro in self._aguardando:
+                self._aguardando.remove(futuro)
+        self.admitidas += 1
+
+    def _liberar(self):
+        self.em_execucao -= 1
+        self._despachar()
+
+    def _despachar(self):
+        """Entrega vagas livres às requisições na fila, na ordem de chegada"""
+        while self._aguardando and self.em_execucao < int(self.limite):
+            futuro = self._aguardando.popleft()
+            if not futuro.done():
+                self.em_execucao += 1
+                futuro.set_result(None)
+
+    def _ajustar(self, latencia: float, sucesso: bool):
+        self._latencias.append(latencia)
+        if sucesso and latencia <= ADMISSAO_LATENCIA_ALVO_SEGUNDOS:
+            self.limite = min(float(ADMISSAO_LIMITE_MAXIMO), self.limite + 1 / self.limite)
+            self._despachar()
+            return
+        agora = time.monotonic()
+        if agora - self._ultima_reducao >= ADMISSAO_LATENCIA_ALVO_SEGUNDOS:
+            self._ultima_reducao = agora
+            self.limite = max(float(ADMISSAO_LIMITE_MINIMO), self.limite * ADMISSAO_FATOR_REDUCAO)
+            self.reducoes += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        latencias = sorted(self._latencias)
+        return {
+            "limite": int(self.limite),
+            "em_execucao": self.em_execucao,
+            "fila": len(self._aguardando),
+            "admitidas": self.admitidas,
+            "descartadas": self.descartadas_fila_cheia + self.descartadas_espera,
+            "descartadas_fila_cheia": self.descartadas_fila_cheia,
+            "descartadas_espera": self.descartadas_espera,
+            "reducoes": self.reducoes,
+            "latencia_p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        }
+
+
+_limitadores: Dict[str, LimitadorAdaptativo] = {}
+
+
+def obter_limitador(nome: str) -> LimitadorAdaptativo:
+    """Retorna o limitador do endpoint, criando-o na primeira chamada"""
+    if nome not in _limitadores:
+        _limitadores[nome] = LimitadorAdaptativo(nome)
+    return _limitadores[nome]
+
+
+def estatisticas_admissao() -> Dict[str, Dict[str, Any]]:
+    """Estatísticas de todos os limitadores criados"""
+    return {nome: limitador.estatisticas() for nome, limitador in _limitadores.items()}
@@ -0,0 +1,388 @@
+"""
+Controle de quota do Gemini
+Limitador por token bucket (requisições e tokens por minuto) e disjuntor (circuit breaker) por modelo.
+Com vários workers, baldes e disjuntores ficam no estado compartilhado e o limite vale para o total.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+from estado_compartilhado import EstadoCompartilhado, obter_estado
+
+
+class QuotaExceededException(Exception):
+    """Exceção customizada para quota excedida"""
+    pass
+
+
+class QuotaLocalException(QuotaExceededException):
+    """Chamada recusada pelo orçamento local ou pelo disjuntor, sem chegar ao Gemini"""
+    pass
+
+
+# Limites por modelo: requisições por minuto (rpm) e tokens por minuto (tpm)
+LIMITES_PADRAO = {
+    "gemini-2.5-flash": {"rpm": 10, "tpm": 250_000},
+    "gemini-2.0-flash-exp": {"rpm": 10, "tpm": 250_000},
+    "gemini-2.0-flash": {"rpm": 15, "tpm": 1_000_000},
+}
+LIMITES_MODELOS = {**LIMITES_PADRAO, **json.loads(os.getenv("GEMINI_LIMITES", "{}"))}
+# Falhas consecutivas (quota, 5xx ou timeout) que abrem o disjuntor
+DISJUNTOR_FALHAS = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+# Tempo com o disjuntor aberto antes de permitir uma chamada de teste
+DISJUNTOR_ABERTO_SEGUNDOS = float(os.getenv("DISJUNTOR_ABERTO_SEGUNDOS", "30"))
+# Reserva de tokens de saída somada à estimativa do prompt
+TOKENS_SAIDA_ESTIMADOS = int(os.getenv("TOKENS_SAIDA_ESTIMADOS", "1500"))
+
+
+def estimar_tokens(*textos: Any) -> int:
+    """Estimativa local de tokens (~4 caracteres por token), sem chamar a API"""
+    return sum(len(str(texto)) for texto in textos if texto) // 4 + 1
+
+
+def classificar_erro(erro: BaseException) -> Optional[str]:
+    """Classifica o erro do SDK pelo código HTTP: "quota", "servidor", "timeout" ou None"""
+    if isinstance(erro, QuotaExceededException):
+        return "quota"
+    if isinstance(erro, TimeoutError):
+        return "timeout"
+    codigo = getattr(erro, "code", None)
+    status = getattr(erro, "status", None)
+    if codigo == 429 or status == "RESOURCE_EXHAUSTED":
+        return "quota"
+    if isinstance(codigo, int) and codigo >= 500:
+        return "servidor"
+    return None
+
+
+class BaldeTokens:
+    """Token bucket: até `capacidade` unidades por minuto, repostas continuamente"""
+
+    def __init__(self, capacidade: float):
+        self.capacidade = capacidade
+        self.disponivel = capacidade
+        self._atualizado_em = time.monotonic()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self._atualizado_em) * self.capacidade / 60)
+        self._atualizado_em = agora
+
+    def pode_consumir(self, quantidade: float) -> bool:
+        self._repor()
+        return self.disponivel >= min(quantidade, self.capacidade)
+
+    def consumir(self, quantidade: float):
+        self._repor()
+        self.disponivel -= min(quantidade, self.capacidade)
+
+    def saldo(self) -> int:
+        self._repor()
+        return int(self.disponivel)
+
+    def devolver(self, quantidade: float):
+        self.disponivel = min(self.capacidade, self.disponivel + quantidade)
+
+
+class Disjuntor:
+    """
+    Circuit breaker: abre após falhas consecutivas e, passado o tempo de espera,
+    fica meio-aberto permitindo uma única chamada de teste.
+    """
+
+    def __init__(self, limite_falhas: int = DISJUNTOR_FALHAS, aberto_segundos: float = DISJUNTOR_ABERTO_SEGUNDOS):
+        self.limite_falhas = limite_falhas
+        self.aberto_segundos = aberto_segundos
+        self.falhas_consecutivas = 0
+        self.aberto_ate = 0.0
+        self.teste_em_andamento = False
+        self.aberturas = 0
+
+    @property
+    def estado(self) -> str:
+        if self.falhas_consecutivas < self.limite_falhas:
+            return "fechado"
+        if time.monotonic() < self.aberto_ate:
+            return "aberto"
+        return "meio_aberto"
+
+    def permitir(self) -> bool:
+        estado = self.estado
+        if estado == "fechado":
+            return True
+        if estado == "meio_aberto" and not self.teste_em_andamento:
+            self.teste_em_andamento = True
+            return True
+        return False
+
+    def registrar_sucesso(self):
+        self.falhas_consecutivas = 0
+        self.teste_em_andamento = False
+
+    def registrar_falha(self):
+        self.falhas_consecutivas += 1
+        if self.teste_em_andamento or self.falhas_consecutivas == self.limite_falhas:
+            self.aberto_ate = time.monotonic() + self.aberto_segundos
+            self.aberturas += 1
+        self.teste_em_andamento = False
+
+    def liberar_teste(self):
+        """Libera a chamada de teste sem contar sucesso nem falha (ex.: cancelamento)"""
+        self.teste_em_andamento = False
+
+
+class ControleQuota:
+    """Orçamento de requisições/tokens e disjuntor de um modelo"""
+
+    def __init__(self, modelo: str, rpm: int, tpm: int):
+        self.modelo = modelo
+        self.requisicoes = BaldeTokens(rpm)
+        self.tokens = BaldeTokens(tpm)
+        self.disjuntor = Disjuntor()
+        self.rejeitadas_limite = 0
+        self.rejeitadas_disjuntor = 0
+
+    def reservar(self, tokens_estimados: int) -> int:
+        """
+        Reserva orçamento para uma chamada. Lança QuotaExceededException imediatamente
+        se o disjuntor estiver aberto ou o orçamento do minuto tiver acabado.
+        """
+        if not (self.requisicoes.pode_consumir(1) and self.tokens.pode_consumir(tokens_estimados)):
+            self.rejeitadas_limite += 1
+            raise QuotaLocalException(f"Limite local de quota atingido para {self.modelo}")
+        if not self.disjuntor.permitir():
+            self.rejeitadas_disjuntor += 1
+            raise QuotaLocalException(f"Disjuntor aberto para {self.modelo}")
+        self.requisicoes.consumir(1)
+        self.tokens.consumir(tokens_estimados)
+        return tokens_estimados
+
+    def registrar_sucesso(self, tokens_reservados: int, tokens_usados: Optional[int] = None):
+        self.disjuntor.registrar_sucesso()
+        if tokens_usados is not None:
+            self.tokens.devolver(tokens_reservados - tokens_usados)
+
+    def registrar_falha(self, erro: BaseException, tokens_reservados: int = 0) -> Optional[str]:
+        """Registra o erro da chamada, devolve os tokens reservados e retorna a classificação do erro"""
+        self.tokens.devolver(tokens_reservados)
+        tipo = classificar_erro(erro)
+        if tipo is not None:
+            self.disjuntor.registrar_falha()
+        else:
+            self.disjuntor.liberar_teste()
+        return tipo
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "disjuntor": self.disjuntor.estado,
+            "falhas_consecutivas": self.disjuntor.falhas_consecutivas,
+            "aberturas_disjuntor": self.disjuntor.aberturas,
+            "requisicoes_disponiveis": self.requisicoes.saldo(),
+            "tokens_disponiveis": self.tokens.saldo(),
+            "rejeitadas_limite": self.rejeitadas_limite,
+            "rejeitadas_disjuntor": self.rejeitadas_disjuntor,
+        }
+
+
+class BaldeCompartilhado:
+    """
+    Token bucket guardado no estado compartilhado (relógio de parede, comum a todos os processos).
+    ler/gravar operam dentro de uma transação aberta; os demais métodos abrem a própria.
+    """
+
+    def __init__(self, estado: EstadoCompartilhado, chave: str, capacidade: float):
+        self.estado = estado
+        self.chave = chave
+        self.capacidade = capacidade
+
+    def ler(self, conn: sqlite3.Connection, agora: float) -> float:
+        linha = conn.execute("SELECT disponivel, atualizado_em FROM quota_baldes WHERE chave = ?", (self.chave,)).fetchone()
+        if linha is None:
+            return self.capacidade
+        disponivel, atualizado_em = linha
+        return min(self.capacidade, disponivel + max(agora - atualizado_em, 0) * self.capacidade / 60)
+
+    def gravar(self, conn: sqlite3.Connection, disponivel: float, agora: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO quota_baldes (chave, disponivel, atualizado_em) VALUES (?, ?, ?)",
+            (self.chave, disponivel, agora),
+        )
+
+    def saldo(self) -> int:
+        with self.estado.transacao() as conn:
+            return int(self.ler(conn, time.time()))
+
+    def devolver(self, quantidade: float):
+        if not quantidade:
+            return
+        agora = time.time()
+        with self.estado.transacao() as conn:
+            self.gravar(conn, min(self.capacidade, self.ler(conn, agora) + quantidade), agora)
+
+
+class DisjuntorCompartilhado:
+    """
+    Disjuntor com o estado no arquivo compartilhado: falhas em qualquer worker abrem o disjuntor
+    para todos. A chamada de teste do estado meio-aberto é um arrendamento que expira após
+    `aberto_segundos`, para não ficar presa se o worker que a fazia for encerrado.
+    """
+
+    def __init__(self, estado: EstadoCompartilhado, modelo: str, limite_falhas: int = DISJUNTOR_FALHAS,
+                 aberto_segundos: float = DISJUNTOR_ABERTO_SEGUNDOS):
+        self.estado_compartilhado = estado
+        self.modelo = modelo
+        self.limite_falhas = limite_falhas
+        self.aberto_segundos = aberto_segundos
+
+    def _ler(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        linha = conn.execute(
+            "SELECT falhas_consecutivas, aberto_ate, teste_ate, aberturas FROM quota_disjuntores WHERE modelo = ?",
+            (self.modelo,),
+        ).fetchone() or (0, 0.0, 0.0, 0)
+        return dict(zip(("falhas_consecutivas", "aberto_ate", "teste_ate", "aberturas"), linha))
+
+    def _gravar(self, conn: sqlite3.Connection, dados: Dict[str, Any]):
+        conn.execute(
+            "INSERT OR REPLACE INTO quota_disjuntores (modelo, falhas_consecutivas, aberto_ate, teste_ate, aberturas) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.modelo, dados["falhas_consecutivas"], dados["aberto_ate"], dados["teste_ate"], dados["aberturas"]),
+        )
+
+    def _estado(self, dados: Dict[str, Any], agora: float) -> str:
+        if dados["falhas_consecutivas"] < self.limite_falhas:
+            return "fechado"
+        if agora < dados["aberto_ate"]:
+            return "aberto"
+        return "meio_aberto"
+
+    def _consultar(self) -> Dict[str, Any]:
+        with self.estado_compartilhado.transacao() as conn:
+            return self._ler(conn)
+
+    @property
+    def estado(self) -> str:
+        return self._estado(self._consultar(), time.time())
+
+    @property
+    def falhas_consecutivas(self) -> int:
+        return self._consultar()["falhas_consecutivas"]
+
+    @property
+    def aberturas(self) -> int:
+        return self._consultar()["aberturas"]
+
+    def permitir_em(self, conn: sqlite3.Connection, agora: float) -> bool:
+        """permitir() dentro de uma transação aberta (usado na reserva de quota)"""
+        dados = self._ler(conn)
+        estado = self._estado(dados, agora)
+        if estado == "fechado":
+            return True
+        if estado == "meio_aberto" and dados["teste_ate"] <= agora:
+            dados["teste_ate"] = agora + self.aberto_segundos
+            self._gravar(conn, dados)
+            return True
+        return False
+
+    def permitir(self) -> bool:
+        with self.estado_compartilhado.transacao() as conn:
+            return self.permitir_em(conn, time.time())
+
+    def registrar_sucesso(self):
+        with self.estado_compartilhado.transacao() as conn:
+            dados = self._ler(conn)
+            if dados["falhas_consecutivas"] or dados["teste_ate"]:
+                self._gravar(conn, {**dados, "falhas_consecutivas": 0, "teste_ate": 0.0})
+
+    def registrar_falha(self):
+        agora = time.time()
+        with self.estado_compartilhado.transacao() as conn:
+            dados = self._ler(conn)
+            dados["falhas_consecutivas"] += 1
+            if dados["teste_ate"] > agora or dados["falhas_consecutivas"] == self.limite_falhas:
+                dados["aberto_ate"] = agora + self.aberto_segundos
+                dados["aberturas"] += 1
+            dados["teste_ate"] = 0.0
+            self._gravar(conn, dados)
+
+    def liberar_teste(self):
+        """Libera a chamada de teste sem contar sucesso nem falha (ex.: cancelamento)"""
+        with self.estado_compartilhado.transacao() as conn:
+            dados = self._ler(conn)
+            if dados["teste_ate"]:
+                self._gravar(conn, {**dados, "teste_ate": 0.0})
+
+
+class ControleQuotaCompartilhado(ControleQuota):
+    """
+    ControleQuota com baldes e disjuntor no estado compartilhado: a verificação dos dois baldes,
+    a permissão do disjuntor e o consumo acontecem na mesma transação, e o limite configurado
+    vale para a soma dos workers. Os contadores de rejeição continuam por processo.
+    """
+
+    def __init__(self, modelo: str, rpm: int, tpm: int, estado: EstadoCompartilhado):
+        super().__init__(modelo, rpm, tpm)
+        self.estado_compartilhado = estado
+        self.requisicoes = BaldeCompartilhado(estado, f"{modelo}:requisicoes", rpm)
+        self.tokens = BaldeCompartilhado(estado, f"{modelo}:tokens", tpm)
+        self.disjuntor = DisjuntorCompartilhado(estado, modelo)
+
+    def reservar(self, tokens_estimados: int) -> int:
+        agora = time.time()
+        with self.estado_compartilhado.transacao() as conn:
+            requisicoes = self.requisicoes.ler(conn, agora)
+            tokens = self.tokens.ler(conn, agora)
+            consumo_tokens = min(tokens_estimados, self.tokens.capacidade)
+            if requisicoes < min(1, self.requisicoes.capacidade) or tokens < consumo_tokens:
+                self.rejeitadas_limite += 1
+                raise QuotaLocalException(f"Limite de quota (todos os workers) atingido para {self.modelo}")
+            if not self.disjuntor.permitir_em(conn, agora):
+                self.rejeitadas_disjuntor += 1
+                raise QuotaLocalException(f"Disjuntor aberto para {self.modelo}")
+            self.requisicoes.gravar(conn, requisicoes - 1, agora)
+            self.tokens.gravar(conn, tokens - consumo_tokens, agora)
+        return tokens_estimados
+
+
+_TABELAS_COMPARTILHADAS = """
+CREATE TABLE IF NOT EXISTS quota_baldes (
+    chave TEXT PRIMARY KEY,
+    disponivel REAL NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_disjuntores (
+    modelo TEXT PRIMARY KEY,
+    falhas_consecutivas INTEGER NOT NULL,
+    aberto_ate REAL NOT NULL,
+    teste_ate REAL NOT NULL,
+    aberturas INTEGER NOT NULL
+);
+"""
+
+_controles: Dict[str, ControleQuota] = {}
+
+
+def obter_controle(modelo: str, projeto: Optional[str] = None,
+                   limites: Optional[Dict[str, int]] = None) -> ControleQuota:
+    """
+    Retorna o controle de quota do modelo (modelos sem limite configurado usam o do gemini-2.5-flash).
+    Com projeto, o orçamento é o do projeto no modelo ("projeto/modelo"), dividido pelas credenciais
+    do projeto; os limites informados valem na criação do controle.
+    """
+    chave = modelo if projeto is None else f"{projeto}/{modelo}"
+    if chave not in _controles:
+        limites = limites or LIMITES_MODELOS.get(modelo, LIMITES_PADRAO["gemini-2.5-flash"])
+        estado = obter_estado()
+        if estado is None:
+            _controles[chave] = ControleQuota(chave, limites["rpm"], limites["tpm"])
+        else:
+            estado.criar_tabela(_TABELAS_COMPARTILHADAS)
+            _controles[chave] = ControleQuotaCompartilhado(chave, limites["rpm"], limites["tpm"], estado)
+    return _controles[chave]
+
+
+def estado_quota() -> Dict[str, Dict[str, Any]]:
+    """Estado do disjuntor e orçamento restante de cada modelo (ou projeto/modelo)"""
+    return {modelo: controle.estado() for modelo, controle in _controles.items()}
@@ -0,0 +1,256 @@
+"""
+Pool de credenciais do Gemini
+Várias chaves de API, de um ou mais projetos, cada uma com seus modelos permitidos e o orçamento de quota
+do seu projeto. Cada chamada vai para a credencial menos carregada (ou sorteada pelo peso) que ainda tenha
+orçamento; uma chave que recebe 429 sai do rodízio daquele modelo por um tempo e volta sozinha. Com o
+estado compartilhado (ESTADO_BACKEND=sqlite), as ejeções valem para todos os workers
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from controle_quota import (
+    LIMITES_MODELOS,
+    ControleQuota,
+    QuotaExceededException,
+    QuotaLocalException,
+    classificar_erro,
+    obter_controle,
+)
+from estado_compartilhado import EstadoCompartilhado, em_segundo_plano, obter_estado
+from log_estruturado import obter_logger
+from metricas import registro_metricas
+
+
+# Lista JSON de credenciais: [{"nome", "api_key" ou "api_key_env", "projeto", "modelos", "peso", "limites"}].
+# Sem ela, o pool tem uma única credencial com GEMINI_API_KEY e os limites de GEMINI_LIMITES
+GEMINI_CREDENCIAIS = os.getenv("GEMINI_CREDENCIAIS", "")
+# "menos_carregada" (menos chamadas em andamento por unidade de peso) ou "ponderada" (sorteio pelo peso)
+GEMINI_ROTEAMENTO = os.getenv("GEMINI_ROTEAMENTO", "menos_carregada").lower()
+# Tempo fora do rodízio depois de um 429 (a quota do Gemini é por minuto)
+CREDENCIAL_EJECAO_SEGUNDOS = float(os.getenv("CREDENCIAL_EJECAO_SEGUNDOS", "60"))
+
+log = obter_logger("credenciais")
+
+chamadas_credenciais = registro_metricas.contador(
+    "gemini_credencial_chamadas_total", "Chamadas ao Gemini por credencial e resultado", ("credencial", "resultado")
+)
+tokens_credenciais = registro_metricas.contador(
+    "gemini_credencial_tokens_total", "Tokens informados pelo Gemini por credencial", ("credencial",)
+)
+
+
+class Credencial:
+    """
+    Uma chave de API. Chaves do mesmo projeto dividem o orçamento de quota (é o projeto que o
+    Gemini limita); sem projeto, a credencial é o próprio projeto. modelos=None permite todos.
+    """
+
+    def __init__(self, nome: str, api_key: Optional[str] = None, api_key_env: str = "GEMINI_API_KEY",
+                 projeto: Optional[str] = None, modelos: Optional[Iterable[str]] = None, peso: float = 1.0,
+                 limites: Optional[Dict[str, Dict[str, int]]] = None):
+        self.nome = nome
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.projeto = projeto
+        self.modelos = set(modelos) if modelos else None
+        self.peso = max(float(peso), 0.001)
+        self.limites = limites or {}
+        self.em_andamento = 0
+        # modelo -> instante (monotônico) em que a credencial volta ao rodízio
+        self.ejetada_ate: Dict[str, float] = {}
+        self.contagens = {"chamadas": 0, "sucessos": 0, "erros_quota": 0, "erros": 0, "canceladas": 0,
+                          "ejecoes": 0, "tokens": 0}
+
+    def chave(self) -> Optional[str]:
+        """Chave da API (lida do ambiente na hora, se não foi informada na configuração)"""
+        return self.api_key or os.getenv(self.api_key_env)
+
+    def permite(self, modelo: str) -> bool:
+        return self.modelos is None or modelo in self.modelos
+
+    def ejetada(self, modelo: str, agora: float) -> bool:
+        return self.ejetada_ate.get(modelo, 0.0) > agora
+
+    def controle(self, modelo: str) -> ControleQuota:
+        """Orçamento do projeto da credencial para o modelo"""
+        return obter_controle(modelo, self.projeto, self.limites.get(modelo) or LIMITES_MODELOS.get(modelo))
+
+
+class PoolCredenciais:
+    """
+    Escolha da credencial de cada chamada. A ordem de tentativa é a do roteamento; a primeira
+    credencial cujo orçamento local aceita a reserva é usada, então o excedente de uma chave passa
+    para a próxima. Credenciais ejetadas só são tentadas quando todas as do modelo estão ejetadas
+    (com uma única chave, o comportamento é o de antes: o disjuntor decide).
+
+    Com estado compartilhado, cada ejeção também é gravada no arquivo (fora do event loop) e cada
+    reserva, que já roda na thread do estado, traz as ejeções feitas pelos outros workers; as
+    consultas no event loop (possui_alternativa) usam essa cópia local.
+    """
+
+    def __init__(self, credenciais: List[Credencial], roteamento: str = GEMINI_ROTEAMENTO,
+                 ejecao_segundos: float = CREDENCIAL_EJECAO_SEGUNDOS, semente: Optional[int] = None,
+                 estado: Optional[EstadoCompartilhado] = None):
+        self.credenciais = credenciais
+        self.roteamento = roteamento
+        self.ejecao_segundos = ejecao_segundos
+        self._rng = random.Random(semente)
+        self._trava = threading.Lock()
+        self._estado = estado
+        if estado is not None:
+            estado.criar_tabela(_TABELA_EJECOES)
+
+    def candidatas(self, modelo: str, excluir: Iterable[str] = ()) -> List[Credencial]:
+        """Credenciais que permitem o modelo, na ordem em que devem ser tentadas"""
+        excluidas = set(excluir)
+        permitidas = [c for c in self.credenciais if c.permite(modelo) and c.nome not in excluidas]
+        agora = time.monotonic()
+        ativas = [c for c in permitidas if not c.ejetada(modelo, agora)]
+        ejetadas = sorted((c for c in permitidas if c.ejetada(modelo, agora)), key=lambda c: c.ejetada_ate[modelo])
+        if self.roteamento == "ponderada":
+            # Sorteio sem reposição proporcional ao peso (chave aleatória u^(1/peso))
+            with self._trava:
+                sorteio = {c.nome: self._rng.random() ** (1 / c.peso) for c in ativas}
+            ativas.sort(key=lambda c: -sorteio[c.nome])
+        else:
+            ativas.sort(key=lambda c: c.em_andamento / c.peso)
+        return ativas or ejetadas
+
+    def possui_alternativa(self, modelo: str, excluir: Iterable[str]) -> bool:
+        """Se há outra credencial fora do rodízio excluído e não ejetada para o modelo"""
+        agora = time.monotonic()
+        excluidas = set(excluir)
+        return any(c.permite(modelo) and c.nome not in excluidas and not c.ejetada(modelo, agora)
+                   for c in self.credenciais)
+
+    def reservar(self, modelo: str, tokens_estimados: int,
+                 excluir: Iterable[str] = ()) -> Tuple[Credencial, ControleQuota, int]:
+        """
+        Credencial e reserva de orçamento para uma chamada. Lança QuotaExceededException se nenhuma
+        credencial permite o modelo ou se todas estão sem orçamento (ou com o disjuntor aberto).
+        """
+        ultimo_erro: Optional[QuotaExceededException] = None
+        self._sincronizar_ejecoes()
+        for credencial in self.candidatas(modelo, excluir):
+            controle = credencial.controle(modelo)
+            try:
+                reservados = controle.reservar(tokens_estimados)
+            except QuotaExceededException as e:
+                ultimo_erro = e
+                continue
+            with self._trava:
+                credencial.em_andamento += 1
+                credencial.contagens["chamadas"] += 1
+            return credencial, controle, reservados
+        raise ultimo_erro or QuotaLocalException(f"Nenhuma credencial do Gemini permite o modelo {modelo}")
+
+    def concluir(self, credencial: Credencial, modelo: str, erro: Optional[BaseException] = None,
+                 tokens_usados: Optional[int] = None, cancelada: bool = False):
+        """Registra o resultado da chamada; um 429 do Gemini tira a credencial do rodízio do modelo"""
+        if cancelada:
+            resultado = "cancelada"
+        elif erro is None:
+            resultado = "sucesso"
+        elif classificar_erro(erro) == "quota" and not isinstance(erro, QuotaExceededException):
+            resultado = "quota"
+        else:
+            resultado = "erro"
+        with self._trava:
+            credencial.em_andamento -= 1
+            campo = {"sucesso": "sucessos", "quota": "erros_quota", "erro": "erros", "cancelada": "canceladas"}[resultado]
+            credencial.contagens[campo] += 1
+            if tokens_usados:
+                credencial.contagens["tokens"] += tokens_usados
+            ejetar = resultado == "quota" and self.ejecao_segundos > 0
+            if ejetar:
+                credencial.ejetada_ate[modelo] = time.monotonic() + self.ejecao_segundos
+                credencial.contagens["ejecoes"] += 1
+        if ejetar and self._estado is not None:
+            em_segundo_plano(self._gravar_ejecao, credencial.nome, modelo, time.time() + self.ejecao_segundos)
+        chamadas_credenciais.incrementar(credencial.nome, resultado)
+        if tokens_usados:
+            tokens_credenciais.incrementar(credencial.nome, quantidade=tokens_usados)
+        if ejetar:
+            log.warning("Credencial fora do rodízio após 429",
+                        extra={"credencial": credencial.nome, "modelo": modelo, "segundos": self.ejecao_segundos})
+
+    def _gravar_ejecao(self, nome: str, modelo: str, ate: float):
+        with self._estado.transacao() as conn:
+            conn.execute(
+                "INSERT INTO credenciais_ejecoes (credencial, modelo, ate) VALUES (?, ?, ?) "
+                "ON CONFLICT (credencial, modelo) DO UPDATE SET ate = MAX(ate, excluded.ate)",
+                (nome, modelo, ate),
+            )
+
+    def _sincronizar_ejecoes(self):
+        """Traz para as credenciais as ejeções ainda em vigor gravadas por qualquer worker"""
+        if self._estado is None:
+            return
+        agora = time.time()
+        linhas = self._estado.consultar("SELECT credencial, modelo, ate FROM credenciais_ejecoes WHERE ate > ?", (agora,))
+        por_nome = {credencial.nome: credencial for credencial in self.credenciais}
+        # O arquivo guarda o relógio de parede (comum aos processos); a credencial, o monotônico
+        deslocamento = time.monotonic() - agora
+        with self._trava:
+            for nome, modelo, ate in linhas:
+                credencial = por_nome.get(nome)
+                if credencial is not None:
+                    credencial.ejetada_ate[modelo] = max(credencial.ejetada_ate.get(modelo, 0.0), ate + deslocamento)
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        agora = time.monotonic()
+        return {
+            credencial.nome: {
+                "projeto": credencial.projeto or credencial.nome,
+                "peso": credencial.peso,
+                "em_andamento": credencial.em_andamento,
+                "modelos_ejetados": sum(1 for ate in credencial.ejetada_ate.values() if ate > agora),
+                **credencial.contagens,
+            }
+            for credencial in self.credenciais
+        }
+
+
+_TABELA_EJECOES = """
+CREATE TABLE IF NOT EXISTS credenciais_ejecoes (
+    credencial TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    ate REAL NOT NULL,
+    PRIMARY KEY (credencial, modelo)
+);
+"""
+
+
+def ler_credenciais(configuracao: str = GEMINI_CREDENCIAIS) -> List[Credencial]:
+    """Credenciais de GEMINI_CREDENCIAIS; sem configuração, a credencial única de GEMINI_API_KEY"""
+    if not configuracao.strip():
+        return [Credencial("padrao")]
+    credenciais = []
+    for indice, item in enumerate(json.loads(configuracao)):
+        nome = item.get("nome") or f"credencial{indice + 1}"
+        credenciais.append(Credencial(
+            nome,
+            api_key=item.get("api_key"),
+            api_key_env=item.get("api_key_env", "GEMINI_API_KEY"),
+            projeto=item.get("projeto") or nome,
+            modelos=item.get("modelos"),
+            peso=item.get("peso", 1.0),
+            limites=item.get("limites"),
+        ))
+    return credenciais
+
+
+_pool: Optional[PoolCredenciais] = None
+
+
+def obter_pool() -> PoolCredenciais:
+    """Pool de credenciais do processo, criado na primeira chamada"""
+    global _pool
+    if _pool is None:
+        _pool = PoolCredenciais(ler_credenciais(), estado=obter_estado())
+    return _pool
@@ -0,0 +1,156 @@
+"""
+Digest de vagas
+Resumo, requisitos, benefícios e pontos de atenção não dependem de quem vê a vaga: o digest é gerado
+uma vez por conteúdo de vaga e guardado em cache. A adequação ao perfil é calculada a cada requisição
+a partir dos requisitos do digest, localmente ou com um prompt curto
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from cache_respostas import chave_cache
+from cliente_gemini import schema_resposta, tipos_gemini
+from indice_catalogo import tokenizar
+from metricas import rastrear
+from orcamento_prompt import deduplicar_paragrafos
+from prefixo_prompt import prefixo_prompt
+
+
+# Avaliação do perfil: "local" (requisitos do digest x habilidades) ou "gemini" (prompt curto, com a local de reserva)
+RESUMO_VAGA_AVALIACAO = os.getenv("RESUMO_VAGA_AVALIACAO", "local").lower()
+# Fração dos requisitos atendidos a partir da qual a vaga é adequada / parcialmente adequada ao perfil
+LIMIAR_ADEQUADO = 0.7
+LIMIAR_PARCIAL = 0.4
+
+SISTEMA_RESUMO_VAGA = (
+    "Você é um assistente de carreira que resume vagas de emprego. "
+    "Sempre responda em português, em tópicos, de forma simples."
+)
+
+# Instruções fixas do digest e da avaliação, montadas uma vez; as mensagens levam só a vaga e o perfil
+PREFIXO_DIGEST_VAGA = prefixo_prompt("digest_vaga", f"""
+{SISTEMA_RESUMO_VAGA}
+
+Para a vaga informada na mensagem (título e descrição completa):
+1) Faça um RESUMO da vaga em no máximo 5 linhas.
+2) Liste os principais REQUISITOS, um por item, curtos (ex.: "Java", "SQL", "Inglês intermediário").
+3) Liste BENEFÍCIOS se houver; deixe a lista vazia se não estiverem claros.
+4) Aponte PONTOS DE ATENÇÃO (ex.: jornada, salário não informado, experiência exigida).
+""")
+PREFIXO_AVALIACAO_VAGA = prefixo_prompt("avaliacao_vaga", f"""
+{SISTEMA_RESUMO_VAGA}
+
+A mensagem traz os requisitos de uma vaga e o perfil de um usuário. Em até 3 linhas, diga se essa vaga é
+adequada ao perfil e o que ele ainda precisa estudar ou melhorar.
+""")
+
+
+class DigestVaga(BaseModel):
+    resumo: str
+    requisitos: List[str]
+    beneficios: List[str]
+    pontos_atencao: List[str]
+
+
+SCHEMA_DIGEST = schema_resposta(DigestVaga)
+
+
+def chave_digest(titulo: str, descricao: str) -> str:
+    """Hash do conteúdo normalizado da vaga (parágrafos repetidos não mudam a chave)"""
+    return chave_cache("digest_vaga", titulo, deduplicar_paragrafos(descricao))
+
+
+def montar_prompt_digest(titulo: str, descricao: str) -> str:
+    """Mensagem do digest (as tarefas vão em PREFIXO_DIGEST_VAGA)"""
+    return f"""Título da vaga: {titulo}
+
+Descrição completa da vaga:
+'''{descricao}'''
+"""
+
+
+def config_digest():
+    """Configuração do digest: saída JSON no schema de DigestVaga (instruções em PREFIXO_DIGEST_VAGA)"""
+    return tipos_gemini().GenerateContentConfig(
+        temperature=0.5,
+        response_mime_type="application/json",
+        response_schema=SCHEMA_DIGEST,
+    )
+
+
+def texto_perfil(perfil: Any) -> str:
+    return f"""
+Perfil do usuário:
+- Idade: {perfil.idade}
+- Formação: {perfil.nivel_formacao}
+- Objetivos: {perfil.objetivos}
+- Habilidades: {", ".join(perfil.habilidades)}
+- Interesses: {", ".join(perfil.interesses)}
+- Dados IoT/IoB: {perfil.dados_iot}
+"""
+
+
+def montar_prompt_avaliacao(titulo: str, digest: DigestVaga, perfil: Any) -> str:
+    """Prompt curto da adequação: só os requisitos do digest e o perfil, sem a descrição da vaga"""
+    requisitos = "\n".join(f"- {requisito}" for requisito in digest.requisitos) or "- Não informados"
+    return f"""Vaga: {titulo}
+Requisitos:
+{requisitos}
+{texto_perfil(perfil)}"""
+
+
+def config_avaliacao():
+    return tipos_gemini().GenerateContentConfig(
+        temperature=0.3,
+        max_output_tokens=256,
+    )
+
+
+@rastrear("avaliar_perfil")
+def avaliar_perfil_local(digest: DigestVaga, habilidades: List[str]) -> Dict[str, Any]:
+    """
+    Adequação do perfil calculada sem o Gemini: um requisito é atendido quando todos os termos de
+    alguma habilidade aparecem nele (ex.: "Spring Boot" atende "Experiência com Spring Boot e Java").
+    """
+    termos_habilidades = [set(tokenizar(habilidade)) for habilidade in habilidades]
+    termos_habilidades = [termos for termos in termos_habilidades if termos]
+    atendidos, a_desenvolver = [], []
+    for requisito in digest.requisitos:
+        termos = set(tokenizar(requisito))
+        (atendidos if any(habilidade <= termos for habilidade in termos_habilidades) else a_desenvolver).append(requisito)
+
+    if not digest.requisitos:
+        return {"adequacao": "nao_avaliada", "cobertura": None, "requisitos_atendidos": [], "a_desenvolver": [],
+                "texto": "Avaliação do perfil: a vaga não informa requisitos claros para comparar com o perfil."}
+    cobertura = len(atendidos) / len(digest.requisitos)
+    adequacao = "adequado" if cobertura >= LIMIAR_ADEQUADO else "parcial" if cobertura >= LIMIAR_PARCIAL else "inadequado"
+    rotulos = {"adequado": "adequado", "parcial": "parcialmente adequado", "inadequado": "ainda não adequado"}
+    texto = f"Avaliação do perfil: {rotulos[adequacao]} — atende {len(atendidos)} de {len(digest.requisitos)} requisitos"
+    if a_desenvolver:
+        texto += f"; precisa estudar ou melhorar: {', '.join(a_desenvolver)}."
+    else:
+        texto += "."
+    return {
+        "adequacao": adequacao,
+        "cobertura": round(cobertura, 2),
+        "requisitos_atendidos": atendidos,
+        "a_desenvolver": a_desenvolver,
+        "texto": texto,
+    }
+
+
+def formatar_analise(digest: DigestVaga, avaliacao: Optional[str] = None) -> str:
+    """Texto de analise_vaga no formato de tópicos das respostas anteriores"""
+    def topicos(itens: List[str]) -> str:
+        return "\n".join(f"- {item}" for item in itens)
+
+    partes = [f"Resumo: {digest.resumo.strip()}"]
+    partes.append(f"Requisitos:\n{topicos(digest.requisitos)}" if digest.requisitos else "Requisitos: não informados.")
+    partes.append(f"Benefícios:\n{topicos(digest.beneficios)}" if digest.beneficios else "Benefícios: não estão claros.")
+    if digest.pontos_atencao:
+        partes.append(f"Pontos de atenção:\n{topicos(digest.pontos_atencao)}")
+    if avaliacao:
+        partes.append(avaliacao)
+    return "\n\n".join(partes)
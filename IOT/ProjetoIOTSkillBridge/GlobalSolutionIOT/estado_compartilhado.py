@@ -0,0 +1,126 @@
+"""
+Estado compartilhado entre workers
+Arquivo SQLite em modo WAL usado pelos baldes de quota, disjuntores e fila de jobs quando o serviço
+roda com vários processos; cada atualização é uma transação BEGIN IMMEDIATE, atômica entre eles.
+Com o arquivo travado por outro worker, a transação espera até 5 s: código async usa fora_do_loop()
+(ou EstadoCompartilhado.executar(), para arquivos próprios) para que essa espera aconteça na thread do
+arquivo, e não no event loop
+"""
+
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+
+# Processos do servidor (o uvicorn também lê WEB_CONCURRENCY como padrão de --workers)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# "sqlite" (compartilhado entre workers) ou "memoria" (por processo); padrão sqlite com mais de um worker
+ESTADO_BACKEND = os.getenv("ESTADO_BACKEND", "sqlite" if WEB_CONCURRENCY > 1 else "memoria").lower()
+# Diretório padrão dos arquivos SQLite do serviço (estado compartilhado e planos por usuário)
+ESTADO_DIR = os.getenv("ESTADO_DIR", str(Path(__file__).resolve().parent))
+ESTADO_SQLITE_PATH = os.getenv("ESTADO_SQLITE_PATH", os.path.join(ESTADO_DIR, "estado_compartilhado.db"))
+
+
+class EstadoCompartilhado:
+    """
+    Conexão com o arquivo de estado. Cada módulo cria as próprias tabelas; leituras usam
+    consultar() e atualizações read-modify-write usam transacao(), que trava o arquivo para escrita
+    desde o início, de modo que dois workers nunca decidem com base no mesmo saldo.
+
+    Cada arquivo tem a sua thread: código async chama executar() (ou submeter(), sem aguardar), e a
+    espera por um arquivo travado não para o event loop nem as operações de outros arquivos.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        # Uma única thread: as operações já são serializadas pelo lock da conexão
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estado")
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def criar_tabela(self, ddl: str):
+        with self._lock:
+            self._conn.executescript(ddl)
+
+    @contextmanager
+    def transacao(self) -> Iterator[sqlite3.Connection]:
+        """Transação de escrita exclusiva entre processos; desfeita se o bloco lançar exceção"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def consultar(self, sql: str, parametros: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, parametros).fetchall()
+
+    async def executar(self, funcao: Callable[..., Any], *args, desfazer: Optional[Callable[[Any], Any]] = None,
+                       **kwargs) -> Any:
+        """
+        Executa funcao na thread do arquivo e aguarda o resultado. Se quem aguarda for cancelado, a
+        operação já em andamento termina mesmo assim; desfazer recebe o resultado dela nesse caso
+        (ex.: devolver uma reserva que ninguém vai usar).
+        """
+        futuro = asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(funcao, *args, **kwargs))
+        try:
+            return await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            if desfazer is not None:
+                futuro.add_done_callback(
+                    lambda concluido: concluido.cancelled() or concluido.exception() or desfazer(concluido.result())
+                )
+            raise
+
+    def submeter(self, funcao: Callable[..., Any], *args, **kwargs):
+        """Como executar, sem aguardar"""
+        self._executor.submit(funcao, *args, **kwargs)
+
+
+_estado: Optional[EstadoCompartilhado] = None
+
+
+def obter_estado() -> Optional[EstadoCompartilhado]:
+    """Estado compartilhado do processo, ou None quando o backend é "memoria" (um único worker)"""
+    global _estado
+    if ESTADO_BACKEND != "sqlite":
+        return None
+    if _estado is None:
+        _estado = EstadoCompartilhado(ESTADO_SQLITE_PATH)
+    return _estado
+
+
+async def fora_do_loop(funcao: Callable[..., Any], *args, desfazer: Optional[Callable[[Any], Any]] = None,
+                       **kwargs) -> Any:
+    """
+    Executa funcao na thread do estado compartilhado (ver EstadoCompartilhado.executar) e aguarda o
+    resultado. Com o backend "memoria" as operações não tocam o arquivo e funcao é chamada direto,
+    sem trocar de thread.
+    """
+    estado = obter_estado()
+    if estado is None:
+        return funcao(*args, **kwargs)
+    return await estado.executar(funcao, *args, desfazer=desfazer, **kwargs)
+
+
+def em_segundo_plano(funcao: Callable[..., Any], *args, **kwargs):
+    """
+    Como fora_do_loop, sem aguardar: para liberações em caminhos de cancelamento, em que um novo
+    await poderia ser interrompido antes de a operação ser registrada
+    """
+    estado = obter_estado()
+    if estado is None:
+        funcao(*args, **kwargs)
+    else:
+        estado.submeter(funcao, *args, **kwargs)
@@ -0,0 +1,524 @@
+"""
+Fila de jobs assíncronos
+Jobs são enfileirados por prioridade e processados por workers do event loop; o resultado é consultado
+por id ou entregue em uma URL de callback. Com vários processos, a fila fica no estado compartilhado
+e qualquer worker executa ou consulta qualquer job.
+"""
+
+import asyncio
+import ipaddress
+import itertools
+import json
+import os
+import socket
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+
+from estado_compartilhado import EstadoCompartilhado, em_segundo_plano, fora_do_loop, obter_estado
+from log_estruturado import obter_logger
+from telemetria import percentil
+
+
+# Workers que processam jobs simultaneamente
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+# Máximo de jobs aguardando na fila (acima disso o envio é recusado)
+JOBS_MAX_FILA = int(os.getenv("JOBS_MAX_FILA", "1000"))
+# Prazo padrão de cada job, contado a partir do envio
+JOBS_PRAZO_SEGUNDOS = float(os.getenv("JOBS_PRAZO_SEGUNDOS", "300"))
+# Tempo que jobs finalizados ficam disponíveis para consulta
+JOBS_TTL_SEGUNDOS = float(os.getenv("JOBS_TTL_SEGUNDOS", "3600"))
+# Tentativas de entrega no callback e tempo limite de cada uma
+JOBS_CALLBACK_TENTATIVAS = int(os.getenv("JOBS_CALLBACK_TENTATIVAS", "3"))
+JOBS_CALLBACK_TIMEOUT_SEGUNDOS = float(os.getenv("JOBS_CALLBACK_TIMEOUT_SEGUNDOS", "10"))
+# Hosts aceitos em callback_url, separados por vírgula ("*.exemplo.com" aceita subdomínios); vazio aceita qualquer host público
+JOBS_CALLBACK_HOSTS = [host.strip().lower() for host in os.getenv("JOBS_CALLBACK_HOSTS", "").split(",") if host.strip()]
+# Aceita callbacks para endereços privados, de loopback ou link-local (ex.: a API Java na mesma rede interna)
+JOBS_CALLBACK_PERMITIR_PRIVADOS = os.getenv("JOBS_CALLBACK_PERMITIR_PRIVADOS", "false").lower() == "true"
+# Fila compartilhada: intervalo com que o processo procura jobs enviados por outros processos; enquanto não
+# aparece nenhum, o intervalo dobra a cada consulta até JOBS_INTERVALO_CONSULTA_MAX_SEGUNDOS
+JOBS_INTERVALO_CONSULTA_SEGUNDOS = float(os.getenv("JOBS_INTERVALO_CONSULTA_SEGUNDOS", "0.5"))
+JOBS_INTERVALO_CONSULTA_MAX_SEGUNDOS = float(os.getenv("JOBS_INTERVALO_CONSULTA_MAX_SEGUNDOS", "5"))
+# Job ainda "executando" depois do prazo mais esta margem é de um worker encerrado
+MARGEM_ABANDONO_SEGUNDOS = 60
+
+# Prioridades: menor número é atendido primeiro
+PRIORIDADES = {"interativa": 0, "lote": 1, "backfill": 2}
+
+log = obter_logger("jobs")
+
+
+class FilaCheiaException(Exception):
+    """Exceção para envio de job com a fila cheia"""
+    pass
+
+
+class CallbackInvalidoException(Exception):
+    """Exceção para callback_url fora de http/https, fora de JOBS_CALLBACK_HOSTS ou apontando para a rede interna"""
+    pass
+
+
+class Job:
+    """Estado de um job: pendente -> executando -> concluido (ou erro)"""
+
+    def __init__(self, tipo: str, dados: Any, prioridade: str, prazo_segundos: float, callback_url: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.dados = dados
+        self.prioridade = prioridade
+        self.callback_url = callback_url
+        self.status = "pendente"
+        self.criado_em = time.time()
+        # Relógio de parede: o prazo precisa valer para todos os processos
+        self.prazo = self.criado_em + prazo_segundos
+        self.iniciado_em: Optional[float] = None
+        self.concluido_em: Optional[float] = None
+        self.resultado: Any = None
+        self.erro: Optional[str] = None
+        self.prazo_expirado = False
+        self.callback_status: Optional[str] = None
+
+    @classmethod
+    def restaurar(cls, campos: Dict[str, Any]) -> "Job":
+        """Recria o job a partir dos campos gravados no estado compartilhado"""
+        job = cls.__new__(cls)
+        job.__dict__.update(campos)
+        return job
+
+    def restante(self) -> float:
+        return self.prazo - time.time()
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "status": self.status,
+            "prioridade": self.prioridade,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "concluido_em": self.concluido_em,
+            "prazo_expirado": self.prazo_expirado,
+            "resultado": self.resultado,
+            "erro": self.erro,
+            "callback_status": self.callback_status,
+        }
+
+
+class FilaJobs:
+    """
+    Fila de prioridade com workers assíncronos.
+
+    Cada tipo de job tem um executor async(dados, orcamento) que recebe o tempo restante até o
+    prazo do job, e um executor de expiração chamado se o prazo acabar antes do início.
+    """
+
+    def __init__(self, workers: int = JOBS_WORKERS, max_fila: int = JOBS_MAX_FILA):
+        self.num_workers = workers
+        self.max_fila = max_fila
+        self._executores: Dict[str, Callable[[Any, float], Awaitable[Any]]] = {}
+        self._expirados: Dict[str, Callable[[Any], Any]] = {}
+        self._modelos: Dict[str, Optional[Type[BaseModel]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fila: Optional[asyncio.PriorityQueue] = None
+        self._workers: list = []
+        self._sequencia = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._esperas: Dict[str, Deque[float]] = {prioridade: deque(maxlen=1000) for prioridade in PRIORIDADES}
+        # Entregas de callback em andamento (a referência impede que a tarefa seja coletada no meio)
+        self._callbacks: Set[asyncio.Task] = set()
+        self.contagens: Dict[str, int] = {"enviados": 0, "concluidos": 0, "erros": 0, "expirados": 0, "recusados": 0}
+
+    def registrar_tipo(self, tipo: str, executor: Callable[[Any, float], Awaitable[Any]],
+                       ao_expirar: Callable[[Any], Any], modelo: Optional[Type[BaseModel]] = None):
+        """modelo: tipo pydantic dos dados, usado para recriá-los quando a fila é compartilhada"""
+        self._executores[tipo] = executor
+        self._expirados[tipo] = ao_expirar
+        self._modelos[tipo] = modelo
+
+    async def enviar(self, tipo: str, dados: Any, prioridade: str = "interativa",
+                     prazo_segundos: Optional[float] = None, callback_url: Optional[str] = None) -> Job:
+        """
+        Enfileira o job e retorna imediatamente; lança FilaCheiaException se a fila estiver cheia e
+        CallbackInvalidoException se a callback_url for recusada
+        """
+        if callback_url:
+            await validar_callback_url(callback_url)
+        self._iniciar()
+        self._limpar_finalizados()
+        if self._fila.qsize() >= self.max_fila:
+            self.contagens["recusados"] += 1
+            raise FilaCheiaException(f"Fila de jobs cheia ({self.max_fila} aguardando)")
+        job = Job(tipo, dados, prioridade, JOBS_PRAZO_SEGUNDOS if prazo_segundos is None else prazo_segundos, callback_url)
+        self._jobs[job.id] = job
+        self._fila.put_nowait((PRIORIDADES[prioridade], next(self._sequencia), job))
+        self.contagens["enviados"] += 1
+        return job
+
+    async def obter(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def iniciar(self):
+        """Inicia os workers no lifespan, para que o processo atenda jobs antes de receber o primeiro envio"""
+        self._iniciar()
+
+    def _iniciar(self):
+        """Cria a fila e os workers no event loop atual (na primeira chamada ou se o loop mudou)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._fila = asyncio.PriorityQueue()
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.num_workers)]
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._fila.get()
+            try:
+                await self._executar(job)
+            finally:
+                self._fila.task_done()
+
+    async def _executar(self, job: Job):
+        job.iniciado_em = time.time()
+        self._esperas[job.prioridade].append(job.iniciado_em - job.criado_em)
+        job.status = "executando"
+        try:
+            if job.restante() <= 0:
+                # Prazo esgotado na fila: entrega o resultado degradado sem ocupar o Gemini
+                job.prazo_expirado = True
+                job.resultado = self._expirados[job.tipo](job.dados)
+                self.contagens["expirados"] += 1
+            else:
+                job.resultado = await self._executores[job.tipo](job.dados, job.restante())
+            job.status = "concluido"
+            self.contagens["concluidos"] += 1
+        except Exception as e:
+            log.exception("Erro ao executar job", extra={"job_id": job.id})
+            job.status = "erro"
+            job.erro = str(e)
+            self.contagens["erros"] += 1
+        job.concluido_em = time.time()
+        await fora_do_loop(self._salvar, job)
+        if job.callback_url:
+            tarefa = asyncio.ensure_future(self._entregar_callback(job))
+            self._callbacks.add(tarefa)
+            tarefa.add_done_callback(self._callbacks.discard)
+
+    async def _entregar_callback(self, job: Job):
+        """POST do job finalizado na URL de callback, com novas tentativas e espera exponencial"""
+        corpo = json.dumps(job.como_dict(), ensure_ascii=False, default=str).encode("utf-8")
+        loop = asyncio.get_running_loop()
+        for tentativa in range(1, JOBS_CALLBACK_TENTATIVAS + 1):
+            try:
+                await loop.run_in_executor(None, _post_json, job.callback_url, corpo)
+                job.callback_status = "entregue"
+                await fora_do_loop(self._salvar, job)
+                return
+            except Exception as e:
+                log.warning("Falha no callback do job", extra={"job_id": job.id, "tentativa": tentativa, "detalhe": str(e)})
+                job.callback_status = "falhou"
+                await fora_do_loop(self._salvar, job)
+                # Endereço recusado não muda na próxima tentativa; depois da última, não há o que esperar
+                if isinstance(e, CallbackInvalidoException) or tentativa == JOBS_CALLBACK_TENTATIVAS:
+                    return
+                await asyncio.sleep(2 ** tentativa)
+
+    def _salvar(self, job: Job):
+        """Persiste o estado do job (na fila em memória, o próprio objeto já é o estado)"""
+
+    def _limpar_finalizados(self):
+        limite = time.time() - JOBS_TTL_SEGUNDOS
+        for job_id in [j.id for j in self._jobs.values() if j.concluido_em is not None and j.concluido_em < limite]:
+            del self._jobs[job_id]
+
+    def _contar_status(self) -> Tuple[Dict[str, int], int]:
+        """(pendentes por prioridade, executando)"""
+        pendentes = {prioridade: 0 for prioridade in PRIORIDADES}
+        executando = 0
+        for job in self._jobs.values():
+            if job.status == "pendente":
+                pendentes[job.prioridade] += 1
+            elif job.status == "executando":
+                executando += 1
+        return pendentes, executando
+
+    async def consultar_estatisticas(self) -> Dict[str, Any]:
+        """estatisticas() com a contagem da fila feita fora do event loop (na fila compartilhada, uma consulta ao arquivo)"""
+        return self.estatisticas(await fora_do_loop(self._contar_status))
+
+    def estatisticas(self, contagem: Optional[Tuple[Dict[str, int], int]] = None) -> Dict[str, Any]:
+        pendentes, executando = contagem or self._contar_status()
+        esperas = {}
+        for prioridade, valores in self._esperas.items():
+            ordenados = sorted(valores)
+            esperas[prioridade] = {
+                "p50_ms": round(percentil(ordenados, 50) * 1000, 1),
+                "p95_ms": round(percentil(ordenados, 95) * 1000, 1),
+            }
+        return {
+            "backend": "memoria",
+            "workers": self.num_workers,
+            "fila": sum(pendentes.values()),
+            "fila_por_prioridade": pendentes,
+            "executando": executando,
+            "espera": esperas,
+            **self.contagens,
+        }
+
+
+class FilaJobsCompartilhada(FilaJobs):
+    """
+    Fila de jobs na tabela `jobs` do estado compartilhado. Cada processo roda seus workers, que
+    reivindicam o próximo job pendente (menor prioridade, depois ordem de envio) numa transação,
+    de modo que cada job é executado por um único worker. Um envio acorda os workers do próprio
+    processo; nos outros processos, uma única tarefa consulta a tabela periodicamente (só leitura)
+    e acorda os workers ociosos quando há job pendente.
+    """
+
+    COLUNAS = ("id", "tipo", "dados", "prioridade", "status", "criado_em", "prazo", "iniciado_em", "concluido_em",
+               "resultado", "erro", "prazo_expirado", "callback_url", "callback_status")
+
+    def __init__(self, estado: EstadoCompartilhado, workers: int = JOBS_WORKERS, max_fila: int = JOBS_MAX_FILA):
+        super().__init__(workers, max_fila)
+        self.estado = estado
+        self._aviso: Optional[asyncio.Event] = None
+        self._ociosos = 0
+        estado.criar_tabela(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                prioridade TEXT NOT NULL,
+                ordem INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                prazo REAL NOT NULL,
+                iniciado_em REAL,
+                concluido_em REAL,
+                resultado TEXT,
+                erro TEXT,
+                prazo_expirado INTEGER NOT NULL DEFAULT 0,
+                callback_url TEXT,
+                callback_status TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs (status, ordem);
+            CREATE INDEX IF NOT EXISTS idx_jobs_concluido ON jobs (concluido_em);
+            """
+        )
+
+    def _serializar_dados(self, dados: Any) -> str:
+        if isinstance(dados, BaseModel):
+            return dados.model_dump_json()
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+    def _job(self, linha: tuple) -> Job:
+        campos = dict(zip(self.COLUNAS, linha))
+        modelo = self._modelos.get(campos["tipo"])
+        campos["dados"] = modelo.model_validate_json(campos["dados"]) if modelo else json.loads(campos["dados"])
+        campos["resultado"] = json.loads(campos["resultado"]) if campos["resultado"] is not None else None
+        campos["prazo_expirado"] = bool(campos["prazo_expirado"])
+        return Job.restaurar(campos)
+
+    async def enviar(self, tipo: str, dados: Any, prioridade: str = "interativa",
+                     prazo_segundos: Optional[float] = None, callback_url: Optional[str] = None) -> Job:
+        if callback_url:
+            await validar_callback_url(callback_url)
+        self._iniciar()
+        job = Job(tipo, dados, prioridade, JOBS_PRAZO_SEGUNDOS if prazo_segundos is None else prazo_segundos, callback_url)
+        await fora_do_loop(self._inserir, job)
+        self.contagens["enviados"] += 1
+        self._aviso.set()
+        return job
+
+    def _inserir(self, job: Job):
+        self._limpar_finalizados()
+        with self.estado.transacao() as conn:
+            aguardando = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pendente'").fetchone()[0]
+            if aguardando >= self.max_fila:
+                self.contagens["recusados"] += 1
+                raise FilaCheiaException(f"Fila de jobs cheia ({self.max_fila} aguardando)")
+            conn.execute(
+                "INSERT INTO jobs (id, tipo, dados, prioridade, ordem, status, criado_em, prazo, callback_url) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.tipo, self._serializar_dados(job.dados), job.prioridade, PRIORIDADES[job.prioridade],
+                 job.status, job.criado_em, job.prazo, job.callback_url),
+            )
+
+    async def obter(self, job_id: str) -> Optional[Job]:
+        linhas = await fora_do_loop(self.estado.consultar, f"SELECT {', '.join(self.COLUNAS)} FROM jobs WHERE id = ?",
+                                    (job_id,))
+        return self._job(linhas[0]) if linhas else None
+
+    def _iniciar(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._aviso = asyncio.Event()
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.num_workers)]
+            self._workers.append(asyncio.ensure_future(self._consultor()))
+
+    def _ha_pendentes(self) -> bool:
+        # Só leitura: não disputa a trava de escrita do arquivo com os outros processos
+        return bool(self.estado.consultar("SELECT 1 FROM jobs WHERE status = 'pendente' LIMIT 1"))
+
+    def _reivindicar(self) -> Optional[Job]:
+        """Marca o próximo job pendente como executando por este worker e o retorna"""
+        if not self._ha_pendentes():
+            return None
+        with self.estado.transacao() as conn:
+            linha = conn.execute(
+                f"SELECT {', '.join(self.COLUNAS)} FROM jobs WHERE status = 'pendente' ORDER BY ordem, rowid LIMIT 1"
+            ).fetchone()
+            if linha is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'executando', iniciado_em = ? WHERE id = ?", (time.time(), linha[0]))
+        return self._job(linha)
+
+    def _devolver(self, job: Job):
+        """Volta para a fila um job reivindicado por um worker que foi encerrado antes de executá-lo"""
+        with self.estado.transacao() as conn:
+            conn.execute("UPDATE jobs SET status = 'pendente', iniciado_em = NULL WHERE id = ? AND status = 'executando'",
+                         (job.id,))
+
+    async def _worker(self):
+        while True:
+            self._aviso.clear()
+            try:
+                job = await fora_do_loop(self._reivindicar,
+                                         desfazer=lambda job: job and em_segundo_plano(self._devolver, job))
+            except Exception:
+                log.exception("Erro ao buscar job na fila compartilhada")
+                job = None
+            if job is None:
+                self._ociosos += 1
+                try:
+                    await self._aviso.wait()
+                finally:
+                    self._ociosos -= 1
+                continue
+            await self._executar(job)
+
+    async def _consultor(self):
+        """Acorda os workers ociosos quando outro processo enfileira um job"""
+        intervalo = JOBS_INTERVALO_CONSULTA_SEGUNDOS
+        while True:
+            await asyncio.sleep(intervalo)
+            if not self._ociosos:
+                # Todos ocupados: cada worker procura o próximo job ao terminar o atual
+                intervalo = JOBS_INTERVALO_CONSULTA_SEGUNDOS
+                continue
+            try:
+                pendentes = await fora_do_loop(self._ha_pendentes)
+            except Exception:
+                log.exception("Erro ao consultar a fila compartilhada")
+                pendentes = False
+            if pendentes:
+                self._aviso.set()
+                intervalo = JOBS_INTERVALO_CONSULTA_SEGUNDOS
+            else:
+                intervalo = min(intervalo * 2, JOBS_INTERVALO_CONSULTA_MAX_SEGUNDOS)
+
+    def _salvar(self, job: Job):
+        resultado = json.dumps(job.resultado, ensure_ascii=False, default=str) if job.resultado is not None else None
+        with self.estado.transacao() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, iniciado_em = ?, concluido_em = ?, resultado = ?, erro = ?, "
+                "prazo_expirado = ?, callback_status = ? WHERE id = ?",
+                (job.status, job.iniciado_em, job.concluido_em, resultado, job.erro, int(job.prazo_expirado),
+                 job.callback_status, job.id),
+            )
+
+    def _limpar_finalizados(self):
+        agora = time.time()
+        with self.estado.transacao() as conn:
+            conn.execute("DELETE FROM jobs WHERE concluido_em < ?", (agora - JOBS_TTL_SEGUNDOS,))
+            conn.execute(
+                "UPDATE jobs SET status = 'erro', erro = 'Worker encerrado durante a execução', concluido_em = ? "
+                "WHERE status = 'executando' AND prazo < ?",
+                (agora, agora - MARGEM_ABANDONO_SEGUNDOS),
+            )
+
+    def _contar_status(self) -> Tuple[Dict[str, int], int]:
+        pendentes = {prioridade: 0 for prioridade in PRIORIDADES}
+        executando = 0
+        for status, prioridade, quantidade in self.estado.consultar(
+            "SELECT status, prioridade, COUNT(*) FROM jobs WHERE status IN ('pendente', 'executando') "
+            "GROUP BY status, prioridade"
+        ):
+            if status == "pendente":
+                pendentes[prioridade] = quantidade
+            else:
+                executando += quantidade
+        return pendentes, executando
+
+    def estatisticas(self, contagem: Optional[Tuple[Dict[str, int], int]] = None) -> Dict[str, Any]:
+        # Fila e executando somam todos os processos; espera e contagens são deste worker
+        return {**super().estatisticas(contagem), "backend": "sqlite"}
+
+
+def _host_callback(url: str) -> Tuple[str, int]:
+    """Host e porta da callback_url, se o esquema e o host forem aceitos"""
+    partes = urllib.parse.urlsplit(url)
+    if partes.scheme not in ("http", "https") or not partes.hostname:
+        raise CallbackInvalidoException("callback_url deve ser uma URL http ou https")
+    host = partes.hostname.lower()
+    if JOBS_CALLBACK_HOSTS and not any(
+        host == permitido or (permitido.startswith("*.") and host.endswith(permitido[1:])) for permitido in JOBS_CALLBACK_HOSTS
+    ):
+        raise CallbackInvalidoException(f"Host do callback_url fora de JOBS_CALLBACK_HOSTS: {host}")
+    try:
+        porta = partes.port or (443 if partes.scheme == "https" else 80)
+    except ValueError:
+        raise CallbackInvalidoException("Porta inválida no callback_url")
+    return host, porta
+
+
+def _verificar_enderecos(host: str, enderecos: Iterable[str]):
+    """Recusa hosts que resolvem para a rede interna (privados, loopback, link-local como o metadata da nuvem)"""
+    if JOBS_CALLBACK_PERMITIR_PRIVADOS:
+        return
+    for endereco in enderecos:
+        ip = ipaddress.ip_address(endereco.split("%")[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            raise CallbackInvalidoException(f"callback_url aponta para um endereço interno ({host} -> {ip})")
+
+
+async def validar_callback_url(url: str):
+    """Valida a callback_url no envio do job (a resolução do host não bloqueia o event loop)"""
+    host, porta = _host_callback(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, porta, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise CallbackInvalidoException(f"Host do callback_url não encontrado: {host}")
+    _verificar_enderecos(host, (info[4][0] for info in infos))
+
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """Um redirecionamento levaria o POST a um host que não foi verificado: a resposta 3xx vira erro"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_abridor_callback = urllib.request.build_opener(_SemRedirecionamento)
+
+
+def _post_json(url: str, corpo: bytes):
+    # Verificado de novo na entrega: o DNS do host pode ter mudado desde o envio do job
+    host, porta = _host_callback(url)
+    _verificar_enderecos(host, (info[4][0] for info in socket.getaddrinfo(host, porta, type=socket.SOCK_STREAM)))
+    requisicao = urllib.request.Request(url, data=corpo, headers={"Content-Type": "application/json"}, method="POST")
+    with _abridor_callback.open(requisicao, timeout=JOBS_CALLBACK_TIMEOUT_SEGUNDOS) as resposta:
+        if resposta.status >= 400:
+            raise OSError(f"Callback respondeu {resposta.status}")
+
+
+_estado = obter_estado()
+fila_jobs = FilaJobs() if _estado is None else FilaJobsCompartilhada(_estado)
@@ -3,41 +3,48 @@ Módulo de Geração de Plano de Estudos Personalizado com IA Generativa
 Integração: Gemini API para geração de conteúdo estruturado
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional, Dict
-from google import genai
-from google.genai import types
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, List, Literal, Optional, Dict, Tuple, Type
 import os
-from dotenv import load_dotenv
-from pathlib import Path
 import json
+import asyncio
+import time
+from functools import lru_cache
+
+# Módulos locais leem suas configurações do ambiente na importação (o .env é carregado pelo main.py)
+from cache_aquecido import obter_armazem, termos_aquecidos
+from cache_respostas import chave_cache, normalizar, obter_cache
+from cache_semantico import obter_cache_semantico, termos_campos
+from controle_admissao import SobrecargaException, obter_limitador
+from controle_quota import QuotaExceededException
+from fila_jobs import CallbackInvalidoException, FilaCheiaException, fila_jobs
+from cliente_gemini import (
+    aguardar_conectado,
+    cliente_compartilhado,
+    gerar_conteudo_com_hedge,
+    gerar_conteudo_stream,
+    orcamento_latencia,
+    schema_resposta,
+    tipos_gemini,
+)
+from json_incremental import ELEMENTO, INICIO_ARRAY, MEMBRO, ParserJsonIncremental
+from log_estruturado import obter_logger
+from metricas import rastrear
+from motor_fallback import obter_motor
+from planos_usuario import VersaoPlano, calcular_etag, etag_corresponde, obter_repositorio_planos
+from prefixo_prompt import prefixo_prompt
+from requisicoes_em_voo import obter_tabela
+from telemetria import registrar_fallback, telemetria_camadas
 
+# Cliente Gemini único do processo, criado sob demanda (ver cliente_gemini.py)
+client = cliente_compartilhado
 
-class QuotaExceededException(Exception):
-    """Exceção customizada para quota excedida"""
-    pass
-
-# Carregar variáveis de ambiente
-env_path = Path(__file__).resolve().parent / ".env"
-load_dotenv(dotenv_path=env_path)
-
-# Obter API key e inicializar cliente Gemini
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if gemini_api_key:
-    # Mostrar apenas os primeiros e últimos caracteres da chave para segurança
-    key_preview = f"{gemini_api_key[:10]}...{gemini_api_key[-4:]}" if len(gemini_api_key) > 14 else "***"
-    print(f"GEMINI_API_KEY carregada: {key_preview}")
-    client = genai.Client(api_key=gemini_api_key)
-else:
-    print("GEMINI_API_KEY não encontrada no arquivo .env!")
-    client = None
-
-app = FastAPI(
-    title="IOT - Geração de Plano de Estudos com IA",
-    description="IA Generativa para criar planos de estudos personalizados",
-    version="1.0.0",
-)
+# Rotas do plano de estudos, incluídas no app do main.py
+router = APIRouter()
+
+log = obter_logger("plano_estudos")
 
 
 class PlanoEstudosRequest(BaseModel):
@@ -67,9 +74,53 @@ class PlanoEstudosResponse(BaseModel):
     recursos_adicionais: List[str]
     metricas_sucesso: List[str]
     motivacao: str
+    # True quando o serviço respondeu com o plano fallback por sobrecarga (fora do schema enviado ao Gemini)
+    degradado: Optional[bool] = False
+
+
+class PlanoEstudosLoteRequest(BaseModel):
+    itens: List[PlanoEstudosRequest]
+    concorrencia: Optional[int] = None  # chamadas simultâneas ao Gemini (padrão e máximo LOTE_CONCORRENCIA)
+    prazo_segundos: Optional[float] = None  # prazo do lote inteiro (padrão LOTE_PRAZO_SEGUNDOS)
+    ordenado: bool = True  # True: resultados na ordem dos itens; False: conforme ficam prontos
+
+
+class EtapasRegeneradas(BaseModel):
+    etapas: List[EtapaEstudo]
+
+
+class JobPlanoEstudosRequest(PlanoEstudosRequest):
+    prioridade: Literal["interativa", "lote", "backfill"] = "interativa"
+    prazo_segundos: Optional[float] = None  # prazo do job a partir do envio (padrão JOBS_PRAZO_SEGUNDOS)
+    callback_url: Optional[str] = None  # recebe um POST com o job finalizado
+
 
+# Configurações do endpoint de lote
+LOTE_CONCORRENCIA = int(os.getenv("LOTE_CONCORRENCIA", "4"))
+LOTE_PRAZO_SEGUNDOS = float(os.getenv("LOTE_PRAZO_SEGUNDOS", "120"))
+LOTE_MAX_ITENS = int(os.getenv("LOTE_MAX_ITENS", "100"))
 
-async def gerar_plano_estudos(request: PlanoEstudosRequest):
+# Competências novas no perfil que ainda permitem regenerar só as etapas afetadas (acima disso, o plano inteiro)
+PLANOS_MAX_COMPETENCIAS_NOVAS = int(os.getenv("PLANOS_MAX_COMPETENCIAS_NOVAS", "3"))
+
+
+# Schema enviado ao Gemini para que a resposta já venha no formato de PlanoEstudosResponse
+SCHEMA_PLANO_ESTUDOS = schema_resposta(PlanoEstudosResponse, excluir=("degradado",))
+SCHEMA_ETAPAS = schema_resposta(EtapasRegeneradas)
+
+
+# Planos já gerados pelo Gemini, indexados pela requisição normalizada
+cache_planos = obter_cache("plano_estudos", PlanoEstudosResponse)
+# Planos de perfis quase idênticos, reaproveitados com prazo e horas ajustados (None se desativado)
+cache_planos_semantico = obter_cache_semantico("plano_estudos")
+planos_em_voo = obter_tabela("plano_estudos")
+# Trilhas do plano fallback carregadas e pré-compiladas na inicialização
+obter_motor()
+limitador_planos = obter_limitador("plano_estudos")
+
+
+async def gerar_plano_estudos(request: PlanoEstudosRequest, http_request: Optional[Request] = None,
+                              orcamento: Optional[float] = None):
     """
     Gera um plano de estudos personalizado usando IA Generativa (Gemini).
     
@@ -77,63 +128,141 @@ async def gerar_plano_estudos(request: PlanoEstudosRequest):
     - Prompt Engineering avançado
     - Geração de conteúdo estruturado
     - Personalização baseada em perfil do usuário
+
+    orcamento substitui o orçamento de latência da requisição HTTP (ex.: tempo restante de um job).
     """
+    plano, _ = await gerar_plano_estudos_com_camada(request, http_request, orcamento)
+    return plano
+
+
+async def gerar_plano_estudos_com_camada(request: PlanoEstudosRequest, http_request: Optional[Request] = None,
+                                         orcamento: Optional[float] = None) -> Tuple[PlanoEstudosResponse, str]:
+    """Como gerar_plano_estudos, retornando também a camada que atendeu (ex.: "cache", "primario", "fallback")"""
+    inicio = time.perf_counter()
+    chave = chave_cache("plano_estudos", request)
+    plano_em_cache, camada = await obter_plano_em_cache(request, chave)
+    if plano_em_cache is not None:
+        telemetria_camadas.registrar("plano_estudos", camada, time.perf_counter() - inicio)
+        return plano_em_cache, camada
+
     # Verificar se API key está configurada
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key or client is None:
-        print("GEMINI_API_KEY não configurada ou cliente não inicializado. Usando plano fallback.")
-        plano_fallback_dict = criar_plano_fallback(request, "")
-        return processar_resposta_gemini_fallback(plano_fallback_dict, request)
+    if not client.configurado:
+        log.info("GEMINI_API_KEY não configurada ou cliente não inicializado. Usando plano fallback.")
+        registrar_fallback("plano_estudos", "sem_chave")
+        telemetria_camadas.registrar("plano_estudos", "fallback", time.perf_counter() - inicio)
+        return plano_fallback(request), "fallback"
     
-    try:
-        print("Tentando chamar Gemini API...")
+    if orcamento is None:
+        orcamento = orcamento_latencia(http_request)
+
+    async def _gerar_com_gemini() -> Tuple[PlanoEstudosResponse, str]:
         # Construir prompt estruturado
         prompt = construir_prompt_plano_estudos(request)
         
-        # Chamar Gemini
-        resposta_gemini = chamar_gemini_plano_estudos(prompt)
-        print("Gemini API respondeu com sucesso!")
-        print(f"Resposta recebida (primeiros 200 chars): {resposta_gemini[:200]}...")
+        # Chamar Gemini (só se houver vaga no limite de gerações simultâneas)
+        async with limitador_planos.admitir():
+            resposta_gemini, camada = await chamar_gemini_plano_estudos(prompt, orcamento)
         
         # Processar resposta
         plano_estruturado = processar_resposta_gemini(resposta_gemini, request)
-        print("Plano processado com sucesso usando resposta do Gemini!")
-        
-        return plano_estruturado
+        cache_planos.gravar(chave, plano_estruturado)
+        gravar_plano_semantico(request, plano_estruturado)
+        return plano_estruturado, camada
+
+    try:
+        # Requisições idênticas simultâneas compartilham a mesma chamada ao Gemini
+        plano, camada = await aguardar_conectado(planos_em_voo.executar(chave, _gerar_com_gemini), http_request, orcamento)
+        telemetria_camadas.registrar("plano_estudos", camada, time.perf_counter() - inicio)
+        return plano, camada
         
+    except SobrecargaException as e:
+        # Sem vaga para chamar o Gemini: responde na hora em vez de acumular requisições
+        log.warning("Serviço sobrecarregado. Usando plano fallback.", extra={"detalhe": str(e)})
+        registrar_fallback("plano_estudos", "sobrecarga")
+        telemetria_camadas.registrar("plano_estudos", "descartado", time.perf_counter() - inicio)
+        return plano_degradado(request), "descartado"
     except QuotaExceededException:
         # Retornar plano fallback quando quota excedida
-        print("Quota do Gemini excedida. Usando plano fallback.")
-        plano_fallback_dict = criar_plano_fallback(request, "")
-        return processar_resposta_gemini_fallback(plano_fallback_dict, request)
+        log.warning("Quota do Gemini excedida. Usando plano fallback.")
+        registrar_fallback("plano_estudos", "quota")
+        telemetria_camadas.registrar("plano_estudos", "fallback", time.perf_counter() - inicio)
+        return plano_fallback(request), "fallback"
     except Exception as e:
-        error_msg = str(e)
-        print(f"Erro ao chamar Gemini: {error_msg}")
-        # Verificar se é erro de quota excedida (fallback adicional)
-        if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
-            print("Quota do Gemini excedida (detectado no catch geral). Usando plano fallback.")
-            plano_fallback_dict = criar_plano_fallback(request, "")
-            return processar_resposta_gemini_fallback(plano_fallback_dict, request)
-        else:
-            print(f"Erro desconhecido do Gemini. Usando plano fallback. Erro: {error_msg}")
-            # Em caso de erro desconhecido, também usar fallback para não quebrar a aplicação
-            plano_fallback_dict = criar_plano_fallback(request, "")
-            return processar_resposta_gemini_fallback(plano_fallback_dict, request)
+        log.warning("Erro desconhecido do Gemini. Usando plano fallback.", extra={"detalhe": str(e)})
+        # Em caso de erro desconhecido (ou orçamento de latência esgotado), também usar fallback
+        registrar_fallback("plano_estudos", "timeout" if isinstance(e, TimeoutError) else "erro")
+        telemetria_camadas.registrar("plano_estudos", "fallback", time.perf_counter() - inicio)
+        return plano_fallback(request), "fallback"
 
 
-def construir_prompt_plano_estudos(request: PlanoEstudosRequest) -> str:
-    """Constrói prompt estruturado para Gemini usando técnicas de Prompt Engineering"""
-    
-    prompt = f"""
-Você é um especialista em educação e desenvolvimento de carreira. Crie um plano de estudos personalizado e detalhado.
+async def obter_plano_em_cache(request: PlanoEstudosRequest, chave: str) -> Tuple[Optional[PlanoEstudosResponse], str]:
+    """
+    Plano do cache exato ou, se não houver, o plano de um perfil quase idêntico (cache semântico, e
+    depois os perfis pré-gerados do cache aquecido) ajustado ao prazo e às horas da requisição.
+    Retorna (plano, camada) ou (None, "").
+    """
+    plano = await cache_planos.obter(chave)
+    if plano is not None:
+        return plano, "cache"
+
+    encontrado = None
+    if cache_planos_semantico is not None:
+        encontrado = cache_planos_semantico.obter(normalizar(request.nivel_atual), termos_plano(request))
+    camada = "cache_semantico"
+    if encontrado is None:
+        encontrado = obter_armazem().obter("plano_estudos", normalizar(request.nivel_atual),
+                                           termos_aquecidos(request.objetivo_carreira, request.competencias_atuais))
+        if encontrado is None:
+            return None, ""
+        plano, original, similaridade = encontrado
+        encontrado = (PlanoEstudosResponse.model_validate(plano), PlanoEstudosRequest.model_validate(original), similaridade)
+        camada = "aquecido"
+    plano, request_original, similaridade = encontrado
+    log.debug("Plano reaproveitado de perfil semelhante", extra={"camada": camada, "similaridade": round(similaridade, 4)})
+    plano = ajustar_plano(plano, request_original, request)
+    cache_planos.gravar(chave, plano)
+    return plano, camada
+
+
+def termos_plano(request: PlanoEstudosRequest) -> set:
+    """Termos comparados pelo cache semântico (campos numéricos ficam de fora e são ajustados depois)"""
+    return termos_campos(
+        objetivo=request.objetivo_carreira,
+        competencias=request.competencias_atuais,
+        interesses=request.areas_interesse or [],
+    )
+
+
+def gravar_plano_semantico(request: PlanoEstudosRequest, plano: PlanoEstudosResponse):
+    """Registra o plano gerado pelo Gemini no cache semântico"""
+    if cache_planos_semantico is not None:
+        cache_planos_semantico.gravar(normalizar(request.nivel_atual), termos_plano(request), plano, request)
+
+
+def ajustar_plano(plano: PlanoEstudosResponse, original: PlanoEstudosRequest,
+                  request: PlanoEstudosRequest) -> PlanoEstudosResponse:
+    """Adapta o plano de um perfil semelhante: objetivo e nível da requisição, prazo, horas e duração das etapas"""
+    prazo_original = original.prazo_meses or 6
+    prazo_novo = request.prazo_meses or 6
+    horas_original = original.tempo_disponivel_semana * prazo_original
+    horas_novo = request.tempo_disponivel_semana * prazo_novo
+    horas = round(plano.horas_totais_estimadas * horas_novo / horas_original) if horas_original else plano.horas_totais_estimadas
+    return plano.model_copy(update={
+        "objetivo_carreira": request.objetivo_carreira,
+        "nivel_atual": request.nivel_atual,
+        "prazo_total_meses": prazo_novo,
+        "horas_totais_estimadas": horas,
+        "etapas": [
+            etapa.model_copy(update={"duracao_semanas": max(1, round(etapa.duracao_semanas * prazo_novo / prazo_original))})
+            for etapa in plano.etapas
+        ],
+    })
 
-PERFIL DO USUÁRIO:
-- Objetivo de Carreira: {request.objetivo_carreira}
-- Nível Atual: {request.nivel_atual}
-- Competências Atuais: {', '.join(request.competencias_atuais)}
-- Tempo Disponível: {request.tempo_disponivel_semana} horas por semana
-- Prazo Desejado: {request.prazo_meses} meses
-- Áreas de Interesse: {', '.join(request.areas_interesse) if request.areas_interesse else 'Não especificado'}
+
+# Parte fixa do prompt do plano (papel, tarefas, formato e regras), montada uma vez; a mensagem leva só o perfil
+PREFIXO_PLANO_ESTUDOS = prefixo_prompt("plano_estudos", """
+Você é um especialista em educação e desenvolvimento de carreira. Crie um plano de estudos personalizado e detalhado
+para o PERFIL DO USUÁRIO informado na mensagem.
 
 TAREFAS:
 1. Crie um plano de estudos estruturado em ETAPAS progressivas
@@ -149,25 +278,25 @@ TAREFAS:
 6. Inclua uma mensagem motivacional personalizada
 
 FORMATO DE RESPOSTA (JSON):
-{{
-  "objetivo_carreira": "{request.objetivo_carreira}",
-  "nivel_atual": "{request.nivel_atual}",
-  "prazo_total_meses": {request.prazo_meses},
+{
+  "objetivo_carreira": "<objetivo de carreira do perfil>",
+  "nivel_atual": "<nível atual do perfil>",
+  "prazo_total_meses": <prazo desejado do perfil, em meses>,
   "horas_totais_estimadas": <número>,
   "etapas": [
-    {{
+    {
       "ordem": 1,
       "titulo": "...",
       "descricao": "...",
       "duracao_semanas": <número>,
       "recursos_sugeridos": ["...", "..."],
       "competencias_desenvolvidas": ["...", "..."]
-    }}
+    }
   ],
   "recursos_adicionais": ["...", "..."],
   "metricas_sucesso": ["...", "..."],
   "motivacao": "..."
-}}
+}
 
 IMPORTANTE:
 - Seja realista com os prazos
@@ -175,260 +304,670 @@ IMPORTANTE:
 - Inclua projetos práticos em cada etapa
 - Foque em competências relevantes para o objetivo de carreira
 - Responda APENAS com JSON válido, sem markdown, sem explicações adicionais
+""")
+
+
+@rastrear("construir_prompt")
+def construir_prompt_plano_estudos(request: PlanoEstudosRequest) -> str:
+    """Parte variável do prompt do plano: só o perfil (as instruções vão em PREFIXO_PLANO_ESTUDOS)"""
+    return f"""PERFIL DO USUÁRIO:
+- Objetivo de Carreira: {request.objetivo_carreira}
+- Nível Atual: {request.nivel_atual}
+- Competências Atuais: {', '.join(request.competencias_atuais)}
+- Tempo Disponível: {request.tempo_disponivel_semana} horas por semana
+- Prazo Desejado: {request.prazo_meses} meses
+- Áreas de Interesse: {', '.join(request.areas_interesse) if request.areas_interesse else 'Não especificado'}
 """
-    
-    return prompt
 
 
-def chamar_gemini_plano_estudos(prompt: str) -> str:
-    """Chama Gemini API com configurações otimizadas para geração de conteúdo estruturado"""
-    if client is None:
+async def chamar_gemini_plano_estudos(prompt: str, orcamento: Optional[float] = None) -> Tuple[str, str]:
+    """
+    Chama Gemini API com configurações otimizadas para geração de conteúdo estruturado.
+    Retorna o texto e a camada que respondeu ("primario" ou "hedge").
+    """
+    if not client.configurado:
         raise Exception("Cliente Gemini não inicializado. Verifique GEMINI_API_KEY no arquivo .env")
     
     try:
-        # Mostrar preview da chave sendo usada
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        key_preview = f"{api_key[:10]}...{api_key[-4:]}" if len(api_key) > 14 else "***"
-        print(f"Chamando Gemini API (modelo: gemini-2.0-flash-exp) com chave: {key_preview}")
-        response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,  # Criatividade balanceada
-                top_p=0.9,
-                top_k=40,
-            ),
-        )
+        with rastrear("chamar_gemini"):
+            resposta_texto, camada = await gerar_conteudo_com_hedge(
+                client,
+                model='gemini-2.0-flash-exp',
+                contents=prompt,
+                config=config_plano_estudos(),
+                orcamento=orcamento,
+                validar=lambda texto: '"etapas"' in texto,
+                prefixo=PREFIXO_PLANO_ESTUDOS,
+            )
         
-        resposta_texto = response.text
-        print(f"Gemini retornou resposta com {len(resposta_texto)} caracteres")
-        return resposta_texto
+        log.debug("Gemini retornou resposta", extra={"camada": camada, "caracteres": len(resposta_texto)})
+        return resposta_texto, camada
         
+    except QuotaExceededException as e:
+        # Quota excedida (429 do Gemini, limite local ou disjuntor aberto) é tratada no handler
+        log.warning("Quota do Gemini indisponível", extra={"detalhe": str(e)})
+        raise
     except Exception as e:
-        error_str = str(e)
-        print(f"Erro na chamada ao Gemini: {error_str}")
-        # Verificar se é erro de quota excedida
-        if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
-            # Lançar exceção especial que será capturada no handler
-            raise QuotaExceededException("Quota do Gemini excedida")
-        else:
-            raise Exception(f"Erro ao chamar Gemini: {error_str}")
+        # Repassa o erro original: o handler distingue orçamento esgotado (TimeoutError) dos demais
+        log.warning("Erro na chamada ao Gemini", extra={"detalhe": str(e)})
+        raise
+
 
+def config_plano_estudos():
+    """Configuração de geração do plano: saída JSON no schema de PlanoEstudosResponse (structured output)"""
+    return tipos_gemini().GenerateContentConfig(
+        temperature=0.7,  # Criatividade balanceada
+        top_p=0.9,
+        top_k=40,
+        response_mime_type="application/json",
+        response_schema=SCHEMA_PLANO_ESTUDOS,
+    )
 
+
+@rastrear("processar_resposta")
 def processar_resposta_gemini(resposta: str, request: PlanoEstudosRequest) -> PlanoEstudosResponse:
-    """Processa resposta do Gemini e estrutura em modelo Pydantic"""
+    """
+    Valida a resposta estruturada do Gemini direto em PlanoEstudosResponse.
+
+    Se algum campo falhar na validação, aproveita o que for válido (inclusive etapas completas
+    de um JSON truncado) e repara apenas os campos inválidos. Lança ValueError se nenhuma
+    etapa puder ser aproveitada.
+    """
     try:
-        # Limpar markdown se existir
-        resposta_limpa = resposta.replace("```json", "").replace("```", "").strip()
-        
-        # Tentar parsear JSON
-        try:
-            dados = json.loads(resposta_limpa)
-            print("JSON do Gemini parseado com sucesso!")
-        except json.JSONDecodeError as json_err:
-            # Se não for JSON válido, criar estrutura básica
-            print(f"Resposta do Gemini não é JSON válido. Erro: {json_err}")
-            print(f"Tentando usar resposta como texto e criar estrutura básica...")
-            dados = criar_plano_fallback(request, resposta)
-        
-        return processar_resposta_gemini_fallback(dados, request)
-        
-    except Exception as e:
-        # Fallback em caso de erro
-        print(f"Erro ao processar resposta do Gemini: {str(e)}")
-        dados_fallback = criar_plano_fallback(request, resposta)
-        return processar_resposta_gemini_fallback(dados_fallback, request)
+        # Parsing e validação acontecem juntos no caminho comum
+        return PlanoEstudosResponse.model_validate_json(resposta)
+    except ValidationError as e:
+        campos = sorted({".".join(str(parte) for parte in erro["loc"]) for erro in e.errors() if erro["loc"]})
+        if campos:
+            log.warning("Resposta do Gemini com campos inválidos. Reparando apenas esses campos...", extra={"campos": campos})
+        else:
+            log.warning("Resposta do Gemini não é JSON válido (ex.: truncada). Aproveitando as partes completas...")
+
+    with rastrear("extrair_json_parcial"):
+        dados = extrair_dados_parciais(resposta)
+    with rastrear("validar_com_reparo"):
+        etapas = [construir_etapa(etapa_data, i) for i, etapa_data in enumerate(
+            etapa_data for etapa_data in dados.get("etapas", []) if isinstance(etapa_data, dict)
+        )]
+        if not etapas:
+            raise ValueError("Resposta do Gemini sem nenhuma etapa aproveitável")
 
+        padroes = {**campos_cabecalho({}, request), **campos_resumo({}, request)}
+        return validar_com_reparo(PlanoEstudosResponse, {**dados, "etapas": etapas}, padroes)
 
-def processar_resposta_gemini_fallback(dados: dict, request: PlanoEstudosRequest) -> PlanoEstudosResponse:
-    """Processa dados estruturados em PlanoEstudosResponse"""
+
+def extrair_dados_parciais(resposta: str) -> dict:
+    """Membros e etapas completos de uma resposta JSON possivelmente truncada ou com marcação markdown"""
+    parser = ParserJsonIncremental("etapas")
     try:
-        # Mapear etapas
-        etapas = []
-        etapas_data = dados.get("etapas", [])
-        
-        # Garantir que etapas_data é uma lista
-        if not isinstance(etapas_data, list):
-            etapas_data = []
-        
-        for etapa_data in etapas_data:
-            if not isinstance(etapa_data, dict):
-                continue
-            try:
-                etapa = EtapaEstudo(
-                    ordem=etapa_data.get("ordem", len(etapas) + 1),
-                    titulo=etapa_data.get("titulo", f"Etapa {len(etapas) + 1}"),
-                    descricao=etapa_data.get("descricao", ""),
-                    duracao_semanas=etapa_data.get("duracao_semanas", 2),
-                    recursos_sugeridos=etapa_data.get("recursos_sugeridos", []) or [],
-                    competencias_desenvolvidas=etapa_data.get("competencias_desenvolvidas", []) or []
-                )
-                etapas.append(etapa)
-            except Exception as e:
-                print(f"Erro ao processar etapa: {str(e)}")
-                continue
-        
-        # Se não houver etapas, criar uma básica
-        if not etapas:
-            etapas.append(EtapaEstudo(
-                ordem=1,
-                titulo="Fundamentos",
-                descricao=f"Estabeleça uma base sólida em {request.objetivo_carreira}",
-                duracao_semanas=4,
-                recursos_sugeridos=["Cursos online", "Documentação oficial"],
-                competencias_desenvolvidas=request.competencias_atuais[:2] if request.competencias_atuais else []
-            ))
-        
-        # Criar resposta estruturada
-        return PlanoEstudosResponse(
-            objetivo_carreira=dados.get("objetivo_carreira", request.objetivo_carreira) or request.objetivo_carreira,
-            nivel_atual=dados.get("nivel_atual", request.nivel_atual) or request.nivel_atual,
-            prazo_total_meses=dados.get("prazo_total_meses", request.prazo_meses) or request.prazo_meses or 6,
-            horas_totais_estimadas=dados.get("horas_totais_estimadas", request.tempo_disponivel_semana * (request.prazo_meses or 6) * 4),
-            etapas=etapas,
-            recursos_adicionais=dados.get("recursos_adicionais", []) or [],
-            metricas_sucesso=dados.get("metricas_sucesso", []) or [],
-            motivacao=dados.get("motivacao", f"Continue focado em {request.objetivo_carreira}!") or f"Continue focado em {request.objetivo_carreira}!"
-        )
-    except Exception as e:
-        print(f"Erro ao processar resposta fallback: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Retornar resposta mínima válida
-        return PlanoEstudosResponse(
-            objetivo_carreira=request.objetivo_carreira,
-            nivel_atual=request.nivel_atual,
-            prazo_total_meses=request.prazo_meses or 6,
-            horas_totais_estimadas=request.tempo_disponivel_semana * (request.prazo_meses or 6) * 4,
-            etapas=[EtapaEstudo(
-                ordem=1,
-                titulo="Plano de Estudos",
-                descricao=f"Desenvolva suas habilidades em {request.objetivo_carreira}",
-                duracao_semanas=4,
-                recursos_sugeridos=["Cursos online", "Documentação"],
-                competencias_desenvolvidas=request.competencias_atuais[:2] if request.competencias_atuais else []
-            )],
-            recursos_adicionais=["Comunidades online"],
-            metricas_sucesso=["Conclusão de projetos"],
-            motivacao="Continue estudando!"
-        )
+        eventos = parser.alimentar(resposta)
+    except ValueError as e:
+        log.warning("Resposta do Gemini não é JSON válido", extra={"detalhe": str(e)})
+        eventos = []
+
+    dados: dict = {"etapas": []}
+    for tipo, chave_json, valor in eventos:
+        if tipo == MEMBRO:
+            dados[chave_json] = valor
+        elif tipo == ELEMENTO:
+            dados["etapas"].append(valor)
+    return dados
+
+
+def validar_com_reparo(modelo: Type[BaseModel], dados: dict, padroes: dict):
+    """Valida os dados no modelo; os campos que falharem recebem o valor padrão correspondente"""
+    try:
+        return modelo.model_validate(dados)
+    except ValidationError as e:
+        invalidos = {erro["loc"][0] for erro in e.errors() if erro["loc"]}
+        return modelo.model_validate({**dados, **{campo: padroes[campo] for campo in invalidos if campo in padroes}})
+
+
+def construir_etapa(etapa_data: dict, indice: int) -> EtapaEstudo:
+    """Valida a etapa do Gemini, substituindo campos ausentes ou inválidos por valores padrão"""
+    return validar_com_reparo(EtapaEstudo, etapa_data, {
+        "ordem": indice + 1,
+        "titulo": f"Etapa {indice + 1}",
+        "descricao": "",
+        "duracao_semanas": 2,
+        "recursos_sugeridos": [],
+        "competencias_desenvolvidas": [],
+    })
+
+
+def campos_cabecalho(dados: dict, request: PlanoEstudosRequest) -> dict:
+    """Campos do plano que antecedem as etapas, com valores padrão da requisição"""
+    return {
+        "objetivo_carreira": dados.get("objetivo_carreira", request.objetivo_carreira) or request.objetivo_carreira,
+        "nivel_atual": dados.get("nivel_atual", request.nivel_atual) or request.nivel_atual,
+        "prazo_total_meses": dados.get("prazo_total_meses", request.prazo_meses) or request.prazo_meses or 6,
+        "horas_totais_estimadas": dados.get("horas_totais_estimadas", request.tempo_disponivel_semana * (request.prazo_meses or 6) * 4),
+    }
 
 
-def criar_plano_fallback(request: PlanoEstudosRequest, resposta_texto: str) -> dict:
-    """Cria plano básico caso Gemini não retorne JSON válido ou quota excedida"""
-    # Criar etapas baseadas no objetivo e competências
-    etapas = []
-    prazo_meses = request.prazo_meses or 6  # Default 6 meses se None
-    num_etapas = min(3, max(2, prazo_meses // 2)) if prazo_meses > 0 else 2
-    
-    # Determinar recursos específicos baseados no objetivo
-    objetivo_lower = request.objetivo_carreira.lower()
-    recursos_especificos = []
-    if "microservices" in objetivo_lower or "microserviços" in objetivo_lower:
-        recursos_especificos = [
-            "Curso: Spring Cloud e Microservices (Udemy/Coursera)",
-            "Documentação: Spring Cloud Gateway, Eureka, Config Server",
-            "Projeto prático: Sistema de e-commerce com microservices",
-            "Livro: 'Building Microservices' - Sam Newman"
-        ]
-    elif "java" in objetivo_lower:
-        recursos_especificos = [
-            "Curso: Java Completo (Nélio Alves - Udemy)",
-            "Documentação oficial: Oracle Java Documentation",
-            "Projeto prático: API REST com Spring Boot",
-            "Livro: 'Effective Java' - Joshua Bloch"
-        ]
-    else:
-        recursos_especificos = [
-            "Cursos online especializados na área",
-            "Documentação oficial das tecnologias",
-            "Projetos práticos para portfólio",
-            "Comunidades de desenvolvedores (Stack Overflow, Reddit)"
-        ]
-    
-    for i in range(num_etapas):
-        etapa_num = i + 1
-        semanas_por_etapa = max(4, prazo_meses * 4 // num_etapas) if num_etapas > 0 else 4
-        
-        if etapa_num == 1:
-            titulo = "Fundamentos e Base Sólida"
-            competencias_base = request.competencias_atuais[:2] if len(request.competencias_atuais) >= 2 else request.competencias_atuais
-            descricao = f"Estabeleça uma base sólida em {', '.join(competencias_base)}. Foque em entender os conceitos fundamentais e práticas essenciais."
-            competencias = competencias_base
-            recursos_etapa = recursos_especificos[:2] if recursos_especificos else ["Cursos online especializados", "Documentação oficial"]
-        elif etapa_num == 2:
-            titulo = "Aprofundamento e Prática"
-            descricao = f"Aprofunde seus conhecimentos e aplique em projetos práticos relacionados a {request.objetivo_carreira}. Desenvolva projetos reais para consolidar o aprendizado."
-            competencias = request.competencias_atuais[1:3] if len(request.competencias_atuais) >= 3 else request.competencias_atuais
-            recursos_etapa = recursos_especificos[2:] if len(recursos_especificos) > 2 else ["Projetos práticos", "Comunidades de desenvolvedores"]
-        else:
-            titulo = "Especialização e Projetos Avançados"
-            descricao = f"Desenvolva projetos avançados e especialize-se em {request.objetivo_carreira}. Crie soluções complexas e publique seu portfólio."
-            competencias = request.competencias_atuais[-2:] if len(request.competencias_atuais) >= 2 else request.competencias_atuais
-            recursos_etapa = recursos_especificos if recursos_especificos else ["Projetos avançados", "Certificações profissionais"]
-        
-        etapas.append({
-            "ordem": etapa_num,
-            "titulo": titulo,
-            "descricao": descricao,
-            "duracao_semanas": semanas_por_etapa,
-            "recursos_sugeridos": recursos_etapa,
-            "competencias_desenvolvidas": competencias
-        })
-    
+def campos_resumo(dados: dict, request: PlanoEstudosRequest) -> dict:
+    """Campos do plano que sucedem as etapas, com valores padrão"""
     return {
-        "objetivo_carreira": request.objetivo_carreira,
-        "nivel_atual": request.nivel_atual,
-        "prazo_total_meses": prazo_meses,
-        "horas_totais_estimadas": request.tempo_disponivel_semana * prazo_meses * 4,
-        "etapas": etapas,
-        "recursos_adicionais": [
-            "Comunidades online (Stack Overflow, Reddit)",
-            "Fóruns de discussão",
-            "Certificações profissionais",
-            "Networking com profissionais da área"
-        ],
-        "metricas_sucesso": [
-            "Conclusão de projetos práticos",
-            "Aplicação do conhecimento em situações reais",
-            "Participação ativa em comunidades",
-            "Desenvolvimento de portfólio"
-        ],
-        "motivacao": resposta_texto[:200] if resposta_texto else f"Você está no caminho certo para alcançar seu objetivo de {request.objetivo_carreira}! Com dedicação de {request.tempo_disponivel_semana} horas por semana, você terá {request.tempo_disponivel_semana * prazo_meses * 4} horas de aprendizado. Cada etapa concluída é um passo importante na sua jornada profissional. Mantenha o foco e pratique constantemente!"
+        "recursos_adicionais": dados.get("recursos_adicionais", []) or [],
+        "metricas_sucesso": dados.get("metricas_sucesso", []) or [],
+        "motivacao": dados.get("motivacao", f"Continue focado em {request.objetivo_carreira}!") or f"Continue focado em {request.objetivo_carreira}!",
     }
 
 
-@app.post("/gerar-plano-estudos", response_model=PlanoEstudosResponse)
-async def gerar_plano_estudos_endpoint(request: PlanoEstudosRequest):
+def plano_degradado(request: PlanoEstudosRequest) -> PlanoEstudosResponse:
+    """Plano fallback marcado como degradado (sobrecarga ou prazo esgotado antes da geração)"""
+    return plano_fallback(request).model_copy(update={"degradado": True})
+
+
+def criar_plano_fallback(request: PlanoEstudosRequest, resposta_texto: str) -> dict:
+    """Cria plano básico caso Gemini não retorne JSON válido ou quota excedida (trilhas de trilhas_fallback.json)"""
+    return obter_motor().montar(
+        request.objetivo_carreira,
+        request.nivel_atual,
+        request.competencias_atuais,
+        request.tempo_disponivel_semana,
+        request.prazo_meses,
+        request.areas_interesse,
+        motivacao=resposta_texto[:200] if resposta_texto else "",
+    )
+
+
+def plano_fallback(request: PlanoEstudosRequest) -> PlanoEstudosResponse:
+    """Plano fallback validado; perfis repetidos reaproveitam o plano já montado (cópia rasa)"""
+    plano = _plano_fallback_memorizado(
+        obter_motor(),
+        request.objetivo_carreira,
+        request.nivel_atual,
+        tuple(request.competencias_atuais),
+        request.tempo_disponivel_semana,
+        request.prazo_meses,
+        tuple(request.areas_interesse or ()),
+    )
+    return plano.model_copy()
+
+
+@lru_cache(maxsize=4096)
+def _plano_fallback_memorizado(motor, objetivo_carreira, nivel_atual, competencias_atuais, tempo_disponivel_semana,
+                               prazo_meses, areas_interesse) -> PlanoEstudosResponse:
+    # O motor faz parte da chave: recarregar as trilhas invalida os planos memorizados
+    dados = motor.montar(objetivo_carreira, nivel_atual, list(competencias_atuais), tempo_disponivel_semana,
+                         prazo_meses, areas_interesse)
+    return PlanoEstudosResponse.model_validate(dados)
+
+
+@router.post("/gerar-plano-estudos", response_model=PlanoEstudosResponse, tags=["Plano de Estudos"])
+async def gerar_plano_estudos_endpoint(request: PlanoEstudosRequest, http_request: Request):
     """
     Endpoint principal para gerar plano de estudos.
-    Pode ser usado diretamente ou importado pelo main.py
+    Pode ser usado diretamente ou importado pelo main.py.
+    A resposta traz ETag; se o If-None-Match já tiver esse plano, responde 304 sem corpo.
     """
     try:
-        return await gerar_plano_estudos(request)
+        plano = await gerar_plano_estudos(request, http_request)
     except HTTPException:
         # Re-raise HTTPException para manter status code correto
         raise
     except Exception as e:
         # Capturar qualquer outro erro e retornar fallback
-        print(f"Erro inesperado no endpoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Erro inesperado no endpoint")
         # Retornar plano fallback em caso de qualquer erro
         try:
-            plano_fallback_dict = criar_plano_fallback(request, "")
-            return processar_resposta_gemini_fallback(plano_fallback_dict, request)
+            plano = plano_fallback(request)
         except Exception as fallback_error:
-            print(f"Erro no fallback: {str(fallback_error)}")
+            log.error("Erro no fallback", extra={"detalhe": str(fallback_error)})
             raise HTTPException(status_code=500, detail=f"Erro ao gerar plano de estudos: {str(e)}")
+    return resposta_plano(plano.model_dump_json(), http_request)
 
 
-@app.get("/health")
-async def health_check():
-    """Health check"""
-    return {
-        "status": "ok",
-        "servico": "IOT - Geração de Plano de Estudos",
-        "modelo_ia": "Gemini 2.0 Flash"
+def resposta_plano(plano_json: str, http_request: Request, etag: Optional[str] = None,
+                   cabecalhos: Optional[Dict[str, str]] = None) -> Response:
+    """Plano já serializado com ETag; 304 sem corpo quando o cliente já tem essa versão (If-None-Match)"""
+    cabecalhos = {"ETag": etag or calcular_etag(plano_json), **(cabecalhos or {})}
+    if etag_corresponde(http_request.headers.get("if-none-match"), cabecalhos["ETag"]):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=plano_json, media_type="application/json", headers=cabecalhos)
+
+
+def classificar_mudanca(anterior: PlanoEstudosRequest, novo: PlanoEstudosRequest) -> Tuple[str, set]:
+    """
+    Compara o perfil com o da última versão do plano. Retorna (tipo, competências adicionadas):
+    - "inalterado": mesmo perfil normalizado
+    - "ajuste": só tempo por semana e/ou prazo mudaram (recalculados sem chamar o Gemini)
+    - "etapas": até PLANOS_MAX_COMPETENCIAS_NOVAS competências adicionadas (só as etapas afetadas mudam)
+    - "completo": objetivo, nível, áreas de interesse ou competências removidas (plano gerado de novo)
+    """
+    if normalizar(anterior) == normalizar(novo):
+        return "inalterado", set()
+    if (normalizar(anterior.objetivo_carreira) != normalizar(novo.objetivo_carreira)
+            or normalizar(anterior.nivel_atual) != normalizar(novo.nivel_atual)
+            or normalizar(anterior.areas_interesse or []) != normalizar(novo.areas_interesse or [])):
+        return "completo", set()
+    antes = set(normalizar(anterior.competencias_atuais))
+    depois = set(normalizar(novo.competencias_atuais))
+    adicionadas = depois - antes
+    if antes - depois or len(adicionadas) > PLANOS_MAX_COMPETENCIAS_NOVAS:
+        return "completo", set()
+    return ("etapas" if adicionadas else "ajuste"), adicionadas
+
+
+def etapas_afetadas(plano: PlanoEstudosResponse, adicionadas: set) -> List[int]:
+    """Índices das etapas que ensinam alguma competência que o usuário acabou de adicionar ao perfil"""
+    def afetada(etapa: EtapaEstudo) -> bool:
+        competencias = normalizar(etapa.competencias_desenvolvidas)
+        return any(nova in competencia or competencia in nova for nova in adicionadas for competencia in competencias)
+    return [indice for indice, etapa in enumerate(plano.etapas) if afetada(etapa)]
+
+
+def construir_prompt_etapas(plano: PlanoEstudosResponse, request: PlanoEstudosRequest,
+                            indices: List[int], adicionadas: set) -> str:
+    """Prompt que pede ao Gemini só as etapas afetadas, com o restante do plano como contexto"""
+    resumo_plano = "\n".join(
+        f"{etapa.ordem}. {etapa.titulo} ({etapa.duracao_semanas} semanas)" for etapa in plano.etapas
+    )
+    etapas = json.dumps([plano.etapas[indice].model_dump() for indice in indices], ensure_ascii=False, indent=2)
+    return f"""
+Você é um especialista em educação e desenvolvimento de carreira. O usuário já segue o plano de estudos abaixo
+e acabou de adicionar ao perfil as competências: {', '.join(sorted(adicionadas))}.
+
+PERFIL DO USUÁRIO:
+- Objetivo de Carreira: {request.objetivo_carreira}
+- Nível Atual: {request.nivel_atual}
+- Competências Atuais: {', '.join(request.competencias_atuais)}
+- Tempo Disponível: {request.tempo_disponivel_semana} horas por semana
+- Prazo Desejado: {request.prazo_meses} meses
+
+PLANO ATUAL:
+{resumo_plano}
+
+TAREFA:
+Reescreva apenas as etapas abaixo, que ensinam competências que o usuário agora já tem. Troque esse conteúdo
+por tópicos mais avançados ou complementares ao objetivo de carreira, mantendo a ordem, a mesma quantidade
+de etapas e uma duração parecida.
+
+ETAPAS A REESCREVER:
+{etapas}
+
+Responda APENAS com JSON válido no formato {{"etapas": [...]}}, sem markdown, sem explicações adicionais
+"""
+
+
+def config_etapas():
+    """Configuração da regeneração de etapas: saída JSON no schema de EtapasRegeneradas"""
+    return tipos_gemini().GenerateContentConfig(
+        temperature=0.7,
+        top_p=0.9,
+        top_k=40,
+        response_mime_type="application/json",
+        response_schema=SCHEMA_ETAPAS,
+    )
+
+
+async def regenerar_etapas(plano: PlanoEstudosResponse, request: PlanoEstudosRequest, indices: List[int],
+                           adicionadas: set, orcamento: float) -> PlanoEstudosResponse:
+    """Substitui as etapas afetadas pelas reescritas pelo Gemini; as demais (e a ordem) são mantidas"""
+    prompt = construir_prompt_etapas(plano, request, indices, adicionadas)
+    async with limitador_planos.admitir():
+        with rastrear("chamar_gemini"):
+            resposta, _ = await gerar_conteudo_com_hedge(
+                client,
+                model='gemini-2.0-flash-exp',
+                contents=prompt,
+                config=config_etapas(),
+                orcamento=orcamento,
+                validar=lambda texto: '"etapas"' in texto,
+            )
+    with rastrear("processar_resposta"):
+        novas = EtapasRegeneradas.model_validate_json(resposta).etapas
+    etapas = list(plano.etapas)
+    for indice, nova in zip(indices, novas):
+        etapas[indice] = nova.model_copy(update={"ordem": etapas[indice].ordem})
+    # Horas totais acompanham a nova duração das etapas, no mesmo ritmo de horas por semana do plano
+    semanas_antes = sum(etapa.duracao_semanas for etapa in plano.etapas)
+    semanas_depois = sum(etapa.duracao_semanas for etapa in etapas)
+    horas = round(plano.horas_totais_estimadas * semanas_depois / semanas_antes) if semanas_antes else plano.horas_totais_estimadas
+    return plano.model_copy(update={"etapas": etapas, "horas_totais_estimadas": horas})
+
+
+async def atualizar_plano_usuario(usuario_id: str, request: PlanoEstudosRequest,
+                                  http_request: Optional[Request] = None) -> Tuple[str, Optional[VersaoPlano], str]:
+    """
+    Atualiza o plano do usuário para o perfil recebido, fazendo o mínimo necessário em relação à
+    última versão guardada (ver classificar_mudanca). Retorna (plano JSON, versão gravada, tipo).
+    Planos fallback não são gravados como versão, para que a próxima atualização tente o Gemini.
+    """
+    inicio = time.perf_counter()
+    repositorio = obter_repositorio_planos()
+    atual = await repositorio.estado.executar(repositorio.obter, usuario_id)
+    if atual is None:
+        tipo, adicionadas = "completo", set()
+    else:
+        tipo, adicionadas = classificar_mudanca(PlanoEstudosRequest.model_validate(atual.perfil), request)
+
+    if tipo == "inalterado":
+        repositorio.registrar(tipo)
+        telemetria_camadas.registrar("plano_estudos_usuario", "armazenado", time.perf_counter() - inicio)
+        return atual.plano_json, atual, tipo
+
+    if tipo == "completo":
+        plano, camada = await gerar_plano_estudos_com_camada(request, http_request)
+        repositorio.registrar(tipo)
+        telemetria_camadas.registrar("plano_estudos_usuario", camada, time.perf_counter() - inicio)
+        if camada in ("fallback", "descartado"):
+            return plano.model_dump_json(), None, tipo
+        plano_json = plano.model_dump_json()
+        versao = await repositorio.estado.executar(repositorio.gravar, usuario_id, request.model_dump(), plano_json, tipo)
+        return plano_json, versao, tipo
+
+    perfil_anterior = PlanoEstudosRequest.model_validate(atual.perfil)
+    plano = ajustar_plano(PlanoEstudosResponse.model_validate_json(atual.plano_json), perfil_anterior, request)
+    indices = etapas_afetadas(plano, adicionadas)
+    if not indices:
+        # Nenhuma etapa ensina o que foi adicionado: o ajuste de prazo e horas basta
+        tipo = "ajuste"
+    elif client.configurado:
+        try:
+            plano = await regenerar_etapas(plano, request, indices, adicionadas, orcamento_latencia(http_request))
+        except Exception as e:
+            # O plano ajustado continua válido; só as etapas afetadas ficam como estavam
+            log.warning("Não foi possível regenerar as etapas afetadas. Mantendo o plano ajustado.",
+                        extra={"detalhe": str(e), "etapas": len(indices)})
+            tipo = "ajuste"
+    else:
+        tipo = "ajuste"
+    repositorio.registrar(tipo)
+    telemetria_camadas.registrar("plano_estudos_usuario", tipo, time.perf_counter() - inicio)
+    plano_json = plano.model_dump_json()
+    versao = await repositorio.estado.executar(repositorio.gravar, usuario_id, request.model_dump(), plano_json, tipo)
+    return plano_json, versao, tipo
+
+
+def cabecalhos_versao(versao: Optional[VersaoPlano], tipo: Optional[str] = None) -> Dict[str, str]:
+    cabecalhos = {}
+    if versao is not None:
+        cabecalhos["X-Plano-Versao"] = str(versao.versao)
+    if tipo is not None:
+        cabecalhos["X-Plano-Atualizacao"] = tipo
+    return cabecalhos
+
+
+@router.put("/usuarios/{usuario_id}/plano-estudos", response_model=PlanoEstudosResponse, tags=["Plano de Estudos"])
+async def atualizar_plano_usuario_endpoint(usuario_id: str, request: PlanoEstudosRequest, http_request: Request):
+    """
+    Envia o perfil atual do usuário e recebe o plano correspondente, guardado como nova versão.
+    Mudanças pequenas no perfil não geram o plano do zero: prazo e horas são recalculados e, se
+    competências foram adicionadas, só as etapas afetadas são regeneradas. O header
+    X-Plano-Atualizacao informa o que foi feito (inalterado, ajuste, etapas ou completo).
+    """
+    try:
+        plano_json, versao, tipo = await atualizar_plano_usuario(usuario_id, request, http_request)
+    except Exception:
+        log.exception("Erro inesperado ao atualizar o plano do usuário")
+        return resposta_plano(plano_fallback(request).model_dump_json(), http_request)
+    return resposta_plano(plano_json, http_request, versao.etag if versao else None, cabecalhos_versao(versao, tipo))
+
+
+@router.get("/usuarios/{usuario_id}/plano-estudos", response_model=PlanoEstudosResponse, tags=["Plano de Estudos"])
+async def consultar_plano_usuario_endpoint(usuario_id: str, http_request: Request, versao: Optional[int] = None):
+    """Última versão (ou a versão pedida) do plano do usuário; 304 se o If-None-Match já tiver esse plano"""
+    repositorio = obter_repositorio_planos()
+    guardada = await repositorio.estado.executar(repositorio.obter, usuario_id, versao)
+    if guardada is None:
+        raise HTTPException(status_code=404, detail="Plano não encontrado para o usuário")
+    cabecalhos = {"Cache-Control": "private, no-cache", **cabecalhos_versao(guardada)}
+    return resposta_plano(guardada.plano_json, http_request, guardada.etag, cabecalhos)
+
+
+async def gerar_plano_estudos_stream(request: PlanoEstudosRequest) -> AsyncIterator[dict]:
+    """
+    Gera o plano de estudos em streaming, emitindo eventos assim que cada parte fica pronta:
+    - cabecalho: objetivo, nível, prazo e horas estimadas
+    - etapa: cada EtapaEstudo validada, na ordem em que o Gemini a conclui
+    - resumo: recursos adicionais, métricas de sucesso e motivação
+    - fim: origem do plano (gemini, cache ou fallback)
+    """
+    inicio = time.perf_counter()
+    chave = chave_cache("plano_estudos", request)
+    plano_em_cache, camada = await obter_plano_em_cache(request, chave)
+    if plano_em_cache is not None:
+        telemetria_camadas.registrar("plano_estudos_stream", camada, time.perf_counter() - inicio)
+        for evento in eventos_do_plano(plano_em_cache, "cache"):
+            yield evento
+        return
+
+    membros: dict = {}
+    etapas: List[EtapaEstudo] = []
+    cabecalho_enviado = False
+    origem = "gemini"
+
+    try:
+        if not client.configurado:
+            raise Exception("Cliente Gemini não inicializado. Verifique GEMINI_API_KEY no arquivo .env")
+
+        parser = ParserJsonIncremental("etapas")
+        async for trecho in gerar_conteudo_stream(
+            client,
+            model='gemini-2.0-flash-exp',
+            contents=construir_prompt_plano_estudos(request),
+            config=config_plano_estudos(),
+            prefixo=PREFIXO_PLANO_ESTUDOS,
+        ):
+            for tipo, chave_json, valor in parser.alimentar(trecho):
+                if tipo == MEMBRO:
+                    membros[chave_json] = valor
+                elif tipo == INICIO_ARRAY and not cabecalho_enviado:
+                    cabecalho_enviado = True
+                    yield {"evento": "cabecalho", "dados": campos_cabecalho(membros, request)}
+                elif tipo == ELEMENTO and isinstance(valor, dict):
+                    try:
+                        etapa = construir_etapa(valor, len(etapas))
+                    except Exception as e:
+                        log.warning("Erro ao processar etapa", extra={"detalhe": str(e)})
+                        continue
+                    etapas.append(etapa)
+                    yield {"evento": "etapa", "dados": etapa.model_dump()}
+
+        if not parser.finalizado:
+            raise ValueError("Resposta do Gemini terminou antes de fechar o JSON")
+
+    except Exception as e:
+        if isinstance(e, QuotaExceededException):
+            log.warning("Quota do Gemini excedida durante o streaming. Completando com plano fallback.")
+            registrar_fallback("plano_estudos_stream", "quota")
+        else:
+            log.warning("Erro no streaming do Gemini. Completando com plano fallback.", extra={"detalhe": str(e)})
+            registrar_fallback("plano_estudos_stream", "timeout" if isinstance(e, TimeoutError) else "erro")
+        origem = "fallback"
+        # Mantém o que já foi enviado e completa o restante com o plano fallback
+        dados_fallback = criar_plano_fallback(request, "")
+        membros = {**dados_fallback, **membros}
+        if not etapas:
+            etapas = [construir_etapa(etapa_data, i) for i, etapa_data in enumerate(dados_fallback["etapas"])]
+            if not cabecalho_enviado:
+                cabecalho_enviado = True
+                yield {"evento": "cabecalho", "dados": campos_cabecalho(membros, request)}
+            for etapa in etapas:
+                yield {"evento": "etapa", "dados": etapa.model_dump()}
+
+    if not cabecalho_enviado:
+        yield {"evento": "cabecalho", "dados": campos_cabecalho(membros, request)}
+    yield {"evento": "resumo", "dados": campos_resumo(membros, request)}
+
+    if origem == "gemini" and etapas:
+        # Campos inválidos no stream (ex.: horas nulas) recebem o valor padrão, como na geração sem streaming
+        padroes = {**campos_cabecalho({}, request), **campos_resumo({}, request)}
+        plano = validar_com_reparo(PlanoEstudosResponse, {
+            **campos_cabecalho(membros, request),
+            "etapas": etapas,
+            **campos_resumo(membros, request)
+        }, padroes)
+        cache_planos.gravar(chave, plano)
+        gravar_plano_semantico(request, plano)
+    telemetria_camadas.registrar("plano_estudos_stream", "primario" if origem == "gemini" else origem, time.perf_counter() - inicio)
+    yield {"evento": "fim", "dados": {"origem": origem}}
+
+
+def eventos_do_plano(plano: PlanoEstudosResponse, origem: str) -> List[dict]:
+    """Converte um plano completo na mesma sequência de eventos do streaming"""
+    dados = plano.model_dump()
+    eventos = [{"evento": "cabecalho", "dados": {campo: dados[campo] for campo in
+                                                 ("objetivo_carreira", "nivel_atual", "prazo_total_meses", "horas_totais_estimadas")}}]
+    eventos += [{"evento": "etapa", "dados": etapa} for etapa in dados["etapas"]]
+    eventos.append({"evento": "resumo", "dados": {campo: dados[campo] for campo in
+                                                  ("recursos_adicionais", "metricas_sucesso", "motivacao")}})
+    eventos.append({"evento": "fim", "dados": {"origem": origem}})
+    return eventos
+
+
+@router.post("/gerar-plano-estudos/stream", tags=["Plano de Estudos"])
+async def gerar_plano_estudos_stream_endpoint(request: PlanoEstudosRequest):
+    """
+    Versão em streaming do /gerar-plano-estudos.
+    Responde em NDJSON (um evento JSON por linha), permitindo exibir a primeira etapa antes do fim da geração.
+    """
+    async def linhas_ndjson():
+        async for evento in gerar_plano_estudos_stream(request):
+            yield json.dumps(evento, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(linhas_ndjson(), media_type="application/x-ndjson")
+
+
+async def gerar_planos_lote(lote: PlanoEstudosLoteRequest) -> AsyncIterator[dict]:
+    """
+    Gera planos para vários perfis com concorrência limitada.
+
+    Itens idênticos (mesma requisição normalizada) são gerados uma única vez. Itens que
+    falharem ou não terminarem dentro do prazo do lote recebem o plano fallback.
+    Cada resultado é emitido como {"indice": i, "plano": {...}}.
+    """
+    # O cliente pode pedir menos chamadas simultâneas, nunca mais que LOTE_CONCORRENCIA
+    concorrencia = max(1, min(lote.concorrencia or LOTE_CONCORRENCIA, LOTE_CONCORRENCIA))
+    prazo_segundos = lote.prazo_segundos if lote.prazo_segundos is not None else LOTE_PRAZO_SEGUNDOS
+    semaforo = asyncio.Semaphore(concorrencia)
+    loop = asyncio.get_running_loop()
+    prazo = loop.time() + prazo_segundos
+
+    # Agrupar índices de itens idênticos
+    indices_por_chave: Dict[str, List[int]] = {}
+    for indice, item in enumerate(lote.itens):
+        indices_por_chave.setdefault(chave_cache("plano_estudos", item), []).append(indice)
+
+    async def gerar_item(item: PlanoEstudosRequest) -> PlanoEstudosResponse:
+        async with semaforo:
+            return await gerar_plano_estudos(item)
+
+    tarefas: Dict[str, asyncio.Task] = {
+        chave: asyncio.ensure_future(gerar_item(lote.itens[indices[0]]))
+        for chave, indices in indices_por_chave.items()
     }
 
+    async def resultado(chave: str) -> PlanoEstudosResponse:
+        """Aguarda a tarefa até o prazo do lote; em caso de falha usa o plano fallback"""
+        tarefa = tarefas[chave]
+        item = lote.itens[indices_por_chave[chave][0]]
+        try:
+            return await asyncio.wait_for(asyncio.shield(tarefa), max(prazo - loop.time(), 0))
+        except asyncio.TimeoutError:
+            log.warning("Item do lote não concluído dentro do prazo. Usando plano fallback.", extra={"prazo_segundos": prazo_segundos})
+            registrar_fallback("plano_estudos_lote", "prazo_lote")
+        except Exception as e:
+            log.warning("Erro ao gerar item do lote. Usando plano fallback.", extra={"detalhe": str(e)})
+            registrar_fallback("plano_estudos_lote", "erro")
+        return plano_fallback(item)
+
+    try:
+        if lote.ordenado:
+            planos: Dict[str, PlanoEstudosResponse] = {}
+            for indice, item in enumerate(lote.itens):
+                chave = chave_cache("plano_estudos", item)
+                if chave not in planos:
+                    planos[chave] = await resultado(chave)
+                yield {"indice": indice, "plano": planos[chave].model_dump()}
+        else:
+            chave_por_tarefa = {tarefa: chave for chave, tarefa in tarefas.items()}
+            pendentes = set(tarefas.values())
+            while pendentes:
+                concluidas, pendentes = await asyncio.wait(
+                    pendentes, timeout=max(prazo - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                # Prazo esgotado: as tarefas restantes recebem o plano fallback
+                prontas = concluidas or pendentes
+                if not concluidas:
+                    pendentes = set()
+                for tarefa in prontas:
+                    chave = chave_por_tarefa[tarefa]
+                    plano = await resultado(chave)
+                    for indice in indices_por_chave[chave]:
+                        yield {"indice": indice, "plano": plano.model_dump()}
+    finally:
+        for tarefa in tarefas.values():
+            if not tarefa.done():
+                tarefa.cancel()
+
+
+@router.post("/gerar-plano-estudos/lote", tags=["Plano de Estudos"])
+async def gerar_plano_estudos_lote_endpoint(lote: PlanoEstudosLoteRequest):
+    """
+    Gera planos de estudos para uma lista de perfis em uma única requisição.
+    Responde em NDJSON: uma linha {"indice": i, "plano": {...}} por item do lote.
+    """
+    if len(lote.itens) > LOTE_MAX_ITENS:
+        raise HTTPException(status_code=400, detail=f"O lote aceita no máximo {LOTE_MAX_ITENS} itens")
+
+    async def linhas_ndjson():
+        async for resultado in gerar_planos_lote(lote):
+            yield json.dumps(resultado, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(linhas_ndjson(), media_type="application/x-ndjson")
+
+
+async def executar_job_plano(request: PlanoEstudosRequest, orcamento: float) -> dict:
+    plano = await gerar_plano_estudos(request, orcamento=orcamento)
+    return plano.model_dump()
+
+
+def plano_job_expirado(request: PlanoEstudosRequest) -> dict:
+    """Job que esperou além do prazo na fila recebe o plano fallback, sem chamar o Gemini"""
+    registrar_fallback("plano_estudos_job", "prazo_job")
+    return plano_degradado(request).model_dump()
+
+
+fila_jobs.registrar_tipo("plano_estudos", executar_job_plano, plano_job_expirado, modelo=PlanoEstudosRequest)
+
+
+@router.post("/jobs/plano-estudos", status_code=202, tags=["Jobs"])
+async def enviar_job_plano_estudos_endpoint(job_request: JobPlanoEstudosRequest):
+    """
+    Enfileira a geração do plano e responde imediatamente com o id do job.
+    O resultado é consultado em GET /jobs/{job_id} ou entregue via POST em callback_url.
+    """
+    # Só os campos do perfil seguem para a geração, para compartilhar cache com /gerar-plano-estudos
+    request = PlanoEstudosRequest(**job_request.model_dump(include=set(PlanoEstudosRequest.model_fields)))
+    try:
+        job = await fila_jobs.enviar(
+            "plano_estudos",
+            request,
+            prioridade=job_request.prioridade,
+            prazo_segundos=job_request.prazo_segundos,
+            callback_url=job_request.callback_url,
+        )
+    except FilaCheiaException as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except CallbackInvalidoException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "prioridade": job.prioridade, "consulta": f"/jobs/{job.id}"}
+
+
+@router.get("/jobs/{job_id}", tags=["Jobs"])
+async def consultar_job_endpoint(job_id: str):
+    """Status do job; quando concluído, inclui o plano em resultado"""
+    job = await fila_jobs.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    return job.como_dict()
+
+
+@router.get("/jobs", tags=["Jobs"])
+async def estatisticas_jobs_endpoint():
+    """Profundidade da fila por prioridade, tempos de espera e contagens de jobs"""
+    return await fila_jobs.consultar_estatisticas()
+
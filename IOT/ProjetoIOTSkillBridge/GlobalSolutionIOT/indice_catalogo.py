@@ -0,0 +1,151 @@
+"""
+Índice local do catálogo de cursos e vagas
+Ranqueia o catálogo exportado contra o perfil do usuário (TF-IDF em índice invertido), sem chamar o Gemini
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from log_estruturado import obter_logger
+
+
+# Arquivo do catálogo exportado ({"cursos": [...], "vagas": [...]}, com as colunas das tabelas curso e vaga)
+CATALOGO_PATH = os.getenv("CATALOGO_PATH", str(Path(__file__).resolve().parent / "catalogo.json"))
+# Quantidade de cursos e de vagas retornados por recomendação
+RECOMENDACOES_TOP_K = int(os.getenv("RECOMENDACOES_TOP_K", "3"))
+
+# Campos indexados de cada tipo, com o peso de cada campo no documento
+CAMPOS_INDEXADOS = {
+    "cursos": {"nome": 2, "area": 1, "descricao": 1, "nivel": 1},
+    "vagas": {"titulo": 2, "requisitos": 2, "responsabilidades": 1, "nivel_senioridade": 1},
+}
+# Peso de cada parte do perfil na consulta
+PESOS_CONSULTA = {"habilidades": 1.0, "interesses": 1.0, "objetivos": 0.5}
+
+log = obter_logger("catalogo")
+
+STOPWORDS = frozenset(
+    "a o as os de da do das dos e em no na nos nas para por com sem um uma uns umas ao aos "
+    "que se como mais meu minha ser ter the and of for to in on".split()
+)
+
+
+def tokenizar(texto: Any) -> List[str]:
+    """Termos normalizados do texto: minúsculas, sem acentos e sem stopwords"""
+    if not texto:
+        return []
+    sem_acentos = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return [termo for termo in re.findall(r"[a-z0-9+#]+", sem_acentos.casefold())
+            if len(termo) > 1 and termo not in STOPWORDS]
+
+
+class IndiceTipo:
+    """Índice invertido TF-IDF (vetores normalizados) dos itens de um tipo do catálogo"""
+
+    def __init__(self, itens: List[Dict[str, Any]], campos: Dict[str, int]):
+        self.itens = itens
+        frequencias: List[Dict[str, float]] = []
+        documentos_por_termo: Dict[str, int] = {}
+        for item in itens:
+            tf: Dict[str, float] = {}
+            for campo, peso in campos.items():
+                for termo in tokenizar(item.get(campo)):
+                    tf[termo] = tf.get(termo, 0.0) + peso
+            frequencias.append(tf)
+            for termo in tf:
+                documentos_por_termo[termo] = documentos_por_termo.get(termo, 0) + 1
+
+        total = len(itens)
+        self.idf = {termo: math.log((1 + total) / (1 + df)) + 1 for termo, df in documentos_por_termo.items()}
+        # termo -> [(índice do item, peso normalizado)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for indice, tf in enumerate(frequencias):
+            pesos = {termo: (1 + math.log(freq)) * self.idf[termo] for termo, freq in tf.items()}
+            norma = math.sqrt(sum(peso * peso for peso in pesos.values())) or 1.0
+            for termo, peso in pesos.items():
+                self.postings.setdefault(termo, []).append((indice, peso / norma))
+
+    def buscar(self, consulta: Dict[str, float], top_k: int) -> List[Dict[str, Any]]:
+        """Itens com maior similaridade de cosseno com a consulta, com os termos que casaram"""
+        pontuacoes: Dict[int, float] = {}
+        termos: Dict[int, List[str]] = {}
+        for termo, peso_consulta in consulta.items():
+            for indice, peso in self.postings.get(termo, ()):
+                pontuacoes[indice] = pontuacoes.get(indice, 0.0) + peso_consulta * peso
+                termos.setdefault(indice, []).append(termo)
+
+        norma = math.sqrt(sum(peso * peso for peso in consulta.values())) or 1.0
+        melhores = sorted(pontuacoes.items(), key=lambda par: (-par[1], par[0]))[:top_k]
+        return [
+            {**self.itens[indice], "pontuacao": round(pontuacao / norma, 4), "termos": sorted(termos[indice])}
+            for indice, pontuacao in melhores
+        ]
+
+
+class IndiceCatalogo:
+    """Índices de cursos e vagas construídos a partir do catálogo exportado"""
+
+    def __init__(self, catalogo: Dict[str, List[Dict[str, Any]]], origem: str = ""):
+        self.origem = origem
+        self.tipos = {tipo: IndiceTipo(catalogo.get(tipo) or [], campos) for tipo, campos in CAMPOS_INDEXADOS.items()}
+        self.carregado_em = time.time()
+        # Versão do conteúdo, usada na chave de cache das respostas que dependem do catálogo
+        conteudo = json.dumps(catalogo, sort_keys=True, ensure_ascii=False)
+        self.versao = hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+        self.buscas = 0
+
+    @classmethod
+    def carregar(cls, caminho: str = CATALOGO_PATH) -> "IndiceCatalogo":
+        """Constrói o índice a partir do arquivo; catálogo ausente ou inválido gera um índice vazio"""
+        try:
+            with open(caminho, encoding="utf-8") as arquivo:
+                catalogo = json.load(arquivo)
+        except (OSError, ValueError) as e:
+            log.warning("Catálogo não carregado. Recomendações locais desativadas.", extra={"caminho": caminho, "detalhe": str(e)})
+            catalogo = {}
+        return cls(catalogo, caminho)
+
+    def recomendar(self, habilidades: Iterable[str], interesses: Iterable[str], objetivos: str = "",
+                   top_k: int = RECOMENDACOES_TOP_K) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k cursos e vagas para o perfil, ranqueados localmente"""
+        consulta: Dict[str, float] = {}
+        for parte, textos in (("habilidades", habilidades), ("interesses", interesses), ("objetivos", [objetivos])):
+            for texto in textos:
+                for termo in tokenizar(texto):
+                    consulta[termo] = consulta.get(termo, 0.0) + PESOS_CONSULTA[parte]
+        self.buscas += 1
+        return {tipo: indice.buscar(consulta, top_k) for tipo, indice in self.tipos.items()}
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "origem": self.origem,
+            "cursos": len(self.tipos["cursos"].itens),
+            "vagas": len(self.tipos["vagas"].itens),
+            "termos": sum(len(indice.postings) for indice in self.tipos.values()),
+            "buscas": self.buscas,
+        }
+
+
+_indice: Optional[IndiceCatalogo] = None
+
+
+def obter_indice() -> IndiceCatalogo:
+    """Retorna o índice do catálogo, construindo-o na primeira chamada"""
+    global _indice
+    if _indice is None:
+        _indice = IndiceCatalogo.carregar()
+    return _indice
+
+
+def recarregar_indice(caminho: str = CATALOGO_PATH) -> IndiceCatalogo:
+    """Reconstrói o índice a partir do arquivo do catálogo (ex.: após nova exportação)"""
+    global _indice
+    _indice = IndiceCatalogo.carregar(caminho)
+    return _indice
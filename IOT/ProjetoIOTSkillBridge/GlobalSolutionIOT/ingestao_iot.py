@@ -0,0 +1,321 @@
+"""
+Ingestão de telemetria IoT/IoB
+Eventos de sessões de estudo e de foco ficam em buffers circulares por usuário, com agregados
+atualizados a cada evento; as recomendações usam só o resumo pré-calculado (dados_iot). Com o estado
+compartilhado (ESTADO_BACKEND=sqlite), os buffers de cada usuário ficam no arquivo, e qualquer worker
+recebe eventos e responde o resumo
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from pydantic import BaseModel
+
+from estado_compartilhado import EstadoCompartilhado, obter_estado
+from telemetria import percentil
+
+
+# Eventos mantidos por usuário em cada buffer (os mais antigos são sobrescritos)
+IOT_EVENTOS_POR_USUARIO = int(os.getenv("IOT_EVENTOS_POR_USUARIO", "512"))
+# Usuários mantidos em memória; os inativos há mais tempo são removidos primeiro
+IOT_MAX_USUARIOS = int(os.getenv("IOT_MAX_USUARIOS", "10000"))
+# Máximo de eventos aceitos por requisição de ingestão
+IOT_MAX_EVENTOS_LOTE = int(os.getenv("IOT_MAX_EVENTOS_LOTE", "10000"))
+# Tamanho máximo do corpo de uma requisição de ingestão e de cada linha (evento), em bytes
+IOT_MAX_BYTES_LOTE = int(os.getenv("IOT_MAX_BYTES_LOTE", str(4 * 1024 * 1024)))
+IOT_MAX_BYTES_EVENTO = int(os.getenv("IOT_MAX_BYTES_EVENTO", "4096"))
+# Fuso usado para dia da semana e horário (timestamps sem fuso também são interpretados nele)
+IOT_FUSO_HORARIO = timezone(timedelta(hours=float(os.getenv("IOT_FUSO_HORAS", "-3"))))
+
+DIAS_SEMANA = ("seg", "ter", "qua", "qui", "sex", "sab", "dom")
+
+
+class EventoIot(BaseModel):
+    usuario_id: str
+    tipo: Literal["estudo", "foco"]
+    ts: datetime  # epoch em segundos ou ISO 8601
+    minutos: Optional[float] = None  # eventos "estudo": duração da sessão
+    pontuacao: Optional[float] = None  # eventos "foco": 0 a 100
+
+
+class BufferCircular:
+    """Buffer de tamanho fixo em arrays; gravar retorna a posição ocupada e se sobrescreveu um valor"""
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self.ts = array("d", bytes(8 * capacidade))
+        self.valores = array("d", bytes(8 * capacidade))
+        self.tamanho = 0
+        self._proxima = 0
+
+    def gravar(self, ts: float, valor: float) -> Optional[tuple]:
+        """Grava o evento e retorna (ts, valor) do evento sobrescrito, se o buffer estava cheio"""
+        posicao = self._proxima
+        antigo = (self.ts[posicao], self.valores[posicao]) if self.tamanho == self.capacidade else None
+        self.ts[posicao] = ts
+        self.valores[posicao] = valor
+        self._proxima = (posicao + 1) % self.capacidade
+        self.tamanho = min(self.tamanho + 1, self.capacidade)
+        return antigo
+
+    def ts_validos(self) -> array:
+        return self.ts[:self.tamanho]
+
+    def valores_validos(self) -> array:
+        return self.valores[:self.tamanho]
+
+
+class AgregadosUsuario:
+    """Buffers de estudo e de foco de um usuário e agregados da janela que eles cobrem"""
+
+    # capacidade, tamanho e próxima posição dos dois buffers, soma do foco
+    _CABECALHO = struct.Struct("<IIIIId")
+
+    def __init__(self, capacidade: int = IOT_EVENTOS_POR_USUARIO):
+        self.estudo = BufferCircular(capacidade)
+        self.foco = BufferCircular(capacidade)
+        self.minutos_por_dia = array("d", bytes(8 * 7))
+        self.minutos_por_hora = array("d", bytes(8 * 24))
+        self.soma_foco = 0.0
+        self._resumo: Optional[Dict[str, Any]] = None
+
+    def registrar_estudo(self, ts: float, minutos: float):
+        self._acumular(ts, minutos, 1)
+        antigo = self.estudo.gravar(ts, minutos)
+        if antigo is not None:
+            self._acumular(*antigo, -1)
+        self._resumo = None
+
+    def registrar_foco(self, ts: float, pontuacao: float):
+        self.soma_foco += pontuacao
+        antigo = self.foco.gravar(ts, pontuacao)
+        if antigo is not None:
+            self.soma_foco -= antigo[1]
+        self._resumo = None
+
+    def serializar(self) -> bytes:
+        """Buffers e agregados em bytes (compactados), para guardar no estado compartilhado"""
+        cabecalho = self._CABECALHO.pack(self.estudo.capacidade, self.estudo.tamanho, self.estudo._proxima,
+                                         self.foco.tamanho, self.foco._proxima, self.soma_foco)
+        arrays = (self.estudo.ts, self.estudo.valores, self.foco.ts, self.foco.valores,
+                  self.minutos_por_dia, self.minutos_por_hora)
+        return zlib.compress(cabecalho + b"".join(valores.tobytes() for valores in arrays), 1)
+
+    @classmethod
+    def desserializar(cls, dados: bytes) -> "AgregadosUsuario":
+        dados = zlib.decompress(dados)
+        capacidade, tamanho_estudo, proxima_estudo, tamanho_foco, proxima_foco, soma_foco = \
+            cls._CABECALHO.unpack_from(dados)
+        agregados = cls(capacidade)
+        posicao = cls._CABECALHO.size
+        for valores in (agregados.estudo.ts, agregados.estudo.valores, agregados.foco.ts, agregados.foco.valores,
+                        agregados.minutos_por_dia, agregados.minutos_por_hora):
+            tamanho = len(valores) * valores.itemsize
+            valores[:] = array("d", dados[posicao:posicao + tamanho])
+            posicao += tamanho
+        agregados.estudo.tamanho, agregados.estudo._proxima = tamanho_estudo, proxima_estudo
+        agregados.foco.tamanho, agregados.foco._proxima = tamanho_foco, proxima_foco
+        agregados.soma_foco = soma_foco
+        return agregados
+
+    def _acumular(self, ts: float, minutos: float, sinal: int):
+        momento = datetime.fromtimestamp(ts, IOT_FUSO_HORARIO)
+        self.minutos_por_dia[momento.weekday()] += sinal * minutos
+        self.minutos_por_hora[momento.hour] += sinal * minutos
+
+    def resumo(self) -> Dict[str, Any]:
+        """Resumo compacto usado como dados_iot (recalculado só após novos eventos)"""
+        if self._resumo is None:
+            self._resumo = self._calcular_resumo()
+        return self._resumo
+
+    def _calcular_resumo(self) -> Dict[str, Any]:
+        resumo: Dict[str, Any] = {"sessoes_estudo": self.estudo.tamanho}
+        if self.estudo.tamanho:
+            ts = self.estudo.ts_validos()
+            semanas = max(1.0, (max(ts) - min(ts)) / (7 * 86400))
+            total = sum(self.minutos_por_dia)
+            horas = sorted(range(24), key=lambda hora: -self.minutos_por_hora[hora])
+            resumo.update({
+                "tempo_estudo_semana_min": round(total / semanas),
+                "minutos_por_dia_semana": {dia: round(self.minutos_por_dia[i] / semanas) for i, dia in enumerate(DIAS_SEMANA)},
+                "horas_preferidas": [hora for hora in horas[:3] if self.minutos_por_hora[hora] > 0],
+                "horario_preferido": periodo_do_dia(horas[0]),
+            })
+        if self.foco.tamanho:
+            pontuacoes = sorted(self.foco.valores_validos())
+            resumo.update({
+                "foco_medio": round(self.soma_foco / self.foco.tamanho, 1),
+                "foco_p10": round(percentil(pontuacoes, 10), 1),
+                "foco_p50": round(percentil(pontuacoes, 50), 1),
+                "foco_p90": round(percentil(pontuacoes, 90), 1),
+            })
+        return resumo
+
+
+def periodo_do_dia(hora: int) -> str:
+    if 5 <= hora < 12:
+        return "manha"
+    if 12 <= hora < 18:
+        return "tarde"
+    if 18 <= hora < 24:
+        return "noite"
+    return "madrugada"
+
+
+class RepositorioIot:
+    """Agregados de telemetria por usuário, com limite de usuários em memória (LRU)"""
+
+    def __init__(self, max_usuarios: int = IOT_MAX_USUARIOS):
+        self.max_usuarios = max_usuarios
+        self._usuarios: "OrderedDict[str, AgregadosUsuario]" = OrderedDict()
+        self.eventos_aceitos = 0
+        self.eventos_rejeitados = 0
+        self.remocoes = 0
+
+    def ingerir(self, eventos: Iterable[EventoIot]) -> int:
+        """Aplica os eventos aos buffers dos usuários e retorna quantos foram aceitos"""
+        aceitos = 0
+        for evento in eventos:
+            if not evento_valido(evento):
+                self.eventos_rejeitados += 1
+                continue
+            aplicar_evento(self._agregados(evento.usuario_id), evento)
+            aceitos += 1
+        self.eventos_aceitos += aceitos
+        return aceitos
+
+    def resumo(self, usuario_id: str) -> Optional[Dict[str, Any]]:
+        agregados = self._usuarios.get(usuario_id)
+        return agregados.resumo() if agregados is not None else None
+
+    def _agregados(self, usuario_id: str) -> AgregadosUsuario:
+        agregados = self._usuarios.get(usuario_id)
+        if agregados is None:
+            agregados = self._usuarios[usuario_id] = AgregadosUsuario()
+            while len(self._usuarios) > self.max_usuarios:
+                self._usuarios.popitem(last=False)
+                self.remocoes += 1
+        else:
+            self._usuarios.move_to_end(usuario_id)
+        return agregados
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "usuarios": len(self._usuarios),
+            "eventos_aceitos": self.eventos_aceitos,
+            "eventos_rejeitados": self.eventos_rejeitados,
+            "remocoes": self.remocoes,
+        }
+
+
+class RepositorioIotCompartilhado(RepositorioIot):
+    """
+    Agregados no estado compartilhado: uma linha por usuário, com os buffers serializados e o resumo
+    já calculado. Um lote é aplicado numa única transação (cada usuário lido, atualizado e gravado),
+    e os usuários atualizados há mais tempo saem acima de max_usuarios. Os métodos acessam o
+    arquivo: o código async os chama com fora_do_loop().
+    """
+
+    def __init__(self, estado: EstadoCompartilhado, max_usuarios: int = IOT_MAX_USUARIOS):
+        super().__init__(max_usuarios)
+        self.estado = estado
+        self.estado.criar_tabela(_TABELA_IOT)
+        self._total_usuarios = 0
+
+    def ingerir(self, eventos: Iterable[EventoIot]) -> int:
+        por_usuario: Dict[str, List[EventoIot]] = {}
+        for evento in eventos:
+            if evento_valido(evento):
+                por_usuario.setdefault(evento.usuario_id, []).append(evento)
+            else:
+                self.eventos_rejeitados += 1
+        if not por_usuario:
+            return 0
+
+        agora = time.time()
+        with self.estado.transacao() as conn:
+            for usuario_id, eventos_usuario in por_usuario.items():
+                linha = conn.execute("SELECT dados FROM iot_usuarios WHERE usuario_id = ?", (usuario_id,)).fetchone()
+                agregados = AgregadosUsuario.desserializar(linha[0]) if linha else AgregadosUsuario()
+                for evento in eventos_usuario:
+                    aplicar_evento(agregados, evento)
+                conn.execute(
+                    "INSERT OR REPLACE INTO iot_usuarios (usuario_id, dados, resumo, atualizado_em) VALUES (?, ?, ?, ?)",
+                    (usuario_id, agregados.serializar(), json.dumps(agregados.resumo()), agora),
+                )
+            cursor = conn.execute(
+                "DELETE FROM iot_usuarios WHERE usuario_id IN ("
+                "SELECT usuario_id FROM iot_usuarios ORDER BY atualizado_em DESC LIMIT -1 OFFSET ?)",
+                (self.max_usuarios,),
+            )
+            remocoes = max(cursor.rowcount, 0)
+            total = conn.execute("SELECT COUNT(*) FROM iot_usuarios").fetchone()[0]
+        aceitos = sum(len(eventos_usuario) for eventos_usuario in por_usuario.values())
+        self.eventos_aceitos += aceitos
+        self.remocoes += remocoes
+        self._total_usuarios = total
+        return aceitos
+
+    def resumo(self, usuario_id: str) -> Optional[Dict[str, Any]]:
+        linhas = self.estado.consultar("SELECT resumo FROM iot_usuarios WHERE usuario_id = ?", (usuario_id,))
+        return json.loads(linhas[0][0]) if linhas else None
+
+    def estatisticas(self) -> Dict[str, int]:
+        # usuarios: total no arquivo visto na última ingestão deste worker
+        return {**super().estatisticas(), "usuarios": self._total_usuarios}
+
+
+_TABELA_IOT = """
+CREATE TABLE IF NOT EXISTS iot_usuarios (
+    usuario_id TEXT PRIMARY KEY,
+    dados BLOB NOT NULL,
+    resumo TEXT NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_iot_atualizado ON iot_usuarios (atualizado_em);
+"""
+
+
+def evento_valido(evento: EventoIot) -> bool:
+    if evento.tipo == "estudo":
+        return evento.minutos is not None and evento.minutos >= 0
+    return evento.pontuacao is not None and 0 <= evento.pontuacao <= 100
+
+
+def aplicar_evento(agregados: AgregadosUsuario, evento: EventoIot):
+    if evento.tipo == "estudo":
+        agregados.registrar_estudo(_epoch(evento.ts), evento.minutos)
+    else:
+        agregados.registrar_foco(_epoch(evento.ts), evento.pontuacao)
+
+
+def _epoch(momento: datetime) -> float:
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=IOT_FUSO_HORARIO)
+    return momento.timestamp()
+
+
+def ler_eventos_ndjson(linhas: Iterable[str]) -> tuple:
+    """Converte linhas NDJSON em eventos; retorna (eventos, quantidade de linhas inválidas)"""
+    eventos: List[EventoIot] = []
+    invalidas = 0
+    for linha in linhas:
+        if not linha.strip():
+            continue
+        try:
+            eventos.append(EventoIot.model_validate_json(linha))
+        except ValueError:
+            invalidas += 1
+    return eventos, invalidas
+
+
+_estado = obter_estado()
+repositorio_iot = RepositorioIot() if _estado is None else RepositorioIotCompartilhado(_estado)
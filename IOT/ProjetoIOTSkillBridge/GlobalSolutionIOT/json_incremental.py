@@ -0,0 +1,109 @@
+"""
+Parser JSON incremental
+Lê um objeto JSON recebido em partes (streaming) e emite cada membro assim que fica completo
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+# Tipos de evento emitidos pelo parser
+MEMBRO = "membro"              # (MEMBRO, chave, valor) - membro de primeiro nível completo
+INICIO_ARRAY = "inicio_array"  # (INICIO_ARRAY, chave, None) - início do array monitorado
+ELEMENTO = "elemento"          # (ELEMENTO, chave, valor) - objeto completo dentro do array monitorado
+
+
+class ParserJsonIncremental:
+    """
+    Parser de um objeto JSON de primeiro nível recebido em partes.
+
+    Texto antes do primeiro "{" (ex.: marcação ```json) é ignorado. Os objetos do
+    array indicado em chave_array são emitidos um a um, sem esperar o fechamento
+    do array; os demais membros são emitidos quando o valor termina.
+    """
+
+    def __init__(self, chave_array: str):
+        self.chave_array = chave_array
+        self.finalizado = False
+        self._buffer = ""
+        self._pos = 0
+        self._iniciado = False
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+        self._inicio_string = 0
+        self._esperando_chave = True
+        self._chave_atual = None
+        self._inicio_valor = None
+        self._inicio_elemento = None
+
+    def alimentar(self, texto: str) -> List[Tuple[str, str, Any]]:
+        """Processa mais um trecho do texto e retorna os eventos completados por ele"""
+        eventos: List[Tuple[str, str, Any]] = []
+        if self.finalizado:
+            return eventos
+        self._buffer += texto
+        buffer = self._buffer
+
+        while self._pos < len(buffer):
+            i = self._pos
+            c = buffer[i]
+            self._pos += 1
+
+            if not self._iniciado:
+                if c == "{":
+                    self._iniciado = True
+                    self._profundidade = 1
+                continue
+
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+                    if self._profundidade == 1 and self._esperando_chave:
+                        self._chave_atual = json.loads(buffer[self._inicio_string:i + 1])
+                continue
+
+            if c == '"':
+                self._em_string = True
+                self._inicio_string = i
+            elif c in "{[":
+                self._profundidade += 1
+                if self._monitorando_array():
+                    if self._profundidade == 2 and c == "[":
+                        eventos.append((INICIO_ARRAY, self._chave_atual, None))
+                    elif self._profundidade == 3 and c == "{":
+                        self._inicio_elemento = i
+            elif c in "}]":
+                if self._monitorando_array() and self._profundidade == 3 and c == "}" and self._inicio_elemento is not None:
+                    eventos.append((ELEMENTO, self._chave_atual, json.loads(buffer[self._inicio_elemento:i + 1])))
+                    self._inicio_elemento = None
+                if self._profundidade == 1:
+                    self._finalizar_membro(i, eventos)
+                    self.finalizado = True
+                    break
+                self._profundidade -= 1
+            elif self._profundidade == 1:
+                if c == ":":
+                    self._esperando_chave = False
+                    self._inicio_valor = i + 1
+                elif c == ",":
+                    self._finalizar_membro(i, eventos)
+
+        return eventos
+
+    def _monitorando_array(self) -> bool:
+        return not self._esperando_chave and self._chave_atual == self.chave_array
+
+    def _finalizar_membro(self, fim: int, eventos: List[Tuple[str, str, Any]]):
+        """Emite o membro de primeiro nível cujo valor termina na posição fim"""
+        if not self._esperando_chave and self._inicio_valor is not None:
+            if self._chave_atual != self.chave_array:
+                valor_texto = self._buffer[self._inicio_valor:fim].strip()
+                eventos.append((MEMBRO, self._chave_atual, json.loads(valor_texto)))
+        self._esperando_chave = True
+        self._chave_atual = None
+        self._inicio_valor = None
@@ -0,0 +1,67 @@
+"""
+Log estruturado do serviço
+Cada registro vira uma linha JSON; a escrita no stdout acontece em uma thread própria, de modo que
+logar no caminho da requisição só enfileira o registro
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Nível mínimo registrado (DEBUG, INFO, WARNING, ERROR)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+
+# Atributos padrão do LogRecord; os demais vieram de extra={...} e viram campos do JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro: ts, nivel, logger, mensagem, campos extras e traceback"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        linha = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                linha[chave] = valor
+        if record.exc_info:
+            linha["erro"] = self.formatException(record.exc_info)
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class _HandlerFila(QueueHandler):
+    """Enfileira o registro sem formatá-lo: a serialização fica com a thread de escrita"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve os argumentos agora, antes que objetos mutáveis mudem
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_fila: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_saida = logging.StreamHandler(sys.stdout)
+_saida.setFormatter(FormatadorJson())
+_escritor = QueueListener(_fila, _saida, respect_handler_level=False)
+_escritor.start()
+# Esvazia a fila ao encerrar o processo
+atexit.register(_escritor.stop)
+
+_raiz = logging.getLogger("skillbridge")
+_raiz.setLevel(LOG_NIVEL)
+_raiz.addHandler(_HandlerFila(_fila))
+_raiz.propagate = False
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """Logger do módulo; use extra={...} para campos estruturados"""
+    return _raiz.getChild(nome)
@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+import time
+
+# Início da importação do app, para o relatório de tempos de inicialização
+INICIO_IMPORTACAO = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
-from google import genai 
-from google.genai import types 
+from typing import Any, List, Optional, Dict, Tuple
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -12,16 +18,80 @@ from pathlib import Path
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+# Módulos locais leem suas configurações do ambiente na importação
+from cache_aquecido import obter_armazem, termos_aquecidos
+from cache_respostas import chave_cache, estatisticas_caches, obter_cache
+from cache_semantico import estatisticas_caches_semanticos, obter_cache_semantico, termos_campos, trocar_nome
+from cliente_gemini import (
+    aguardar_conectado,
+    cliente_compartilhado,
+    gerar_conteudo_com_hedge,
+    orcamento_latencia,
+    preparar_gemini,
+    tipos_gemini,
+)
+from controle_admissao import SobrecargaException, estatisticas_admissao, obter_limitador
+from controle_quota import QuotaExceededException, estado_quota
+from credenciais_gemini import obter_pool
+from digest_vaga import (
+    PREFIXO_AVALIACAO_VAGA,
+    PREFIXO_DIGEST_VAGA,
+    RESUMO_VAGA_AVALIACAO,
+    DigestVaga,
+    avaliar_perfil_local,
+    chave_digest,
+    config_avaliacao,
+    config_digest,
+    formatar_analise,
+    montar_prompt_avaliacao,
+    montar_prompt_digest,
+)
+from estado_compartilhado import fora_do_loop
+from fila_jobs import fila_jobs
+from indice_catalogo import IndiceCatalogo, obter_indice, recarregar_indice
+from ingestao_iot import (
+    IOT_MAX_BYTES_EVENTO,
+    IOT_MAX_BYTES_LOTE,
+    IOT_MAX_EVENTOS_LOTE,
+    ler_eventos_ndjson,
+    repositorio_iot,
+)
+from log_estruturado import obter_logger
+from metricas import MiddlewareMetricas, gauges_de_estatisticas, rastrear, registro_metricas
+from motor_fallback import obter_motor
+from orcamento_prompt import estatisticas_prompt, preparar_descricao
+from planos_usuario import estatisticas_planos
+from prefixo_prompt import cache_contexto, prefixo_prompt
+from ranking_vagas import RANKING_MAX_RESUMOS, RANKING_MAX_VAGAS, obter_lexico, ranquear_vagas
+from requisicoes_em_voo import estatisticas_em_voo, obter_tabela
+from telemetria import registrar_fallback, telemetria_camadas, tempos_inicializacao
+
+
+log = obter_logger("app")
+log.info("Configuração carregada", extra={"gemini_api_key_configurada": os.getenv("GEMINI_API_KEY") is not None})
 
-print("GEMINI_API_KEY carregada?:", os.getenv("GEMINI_API_KEY") is not None)
 
+# Clientes Gemini do processo (um por credencial): o SDK é importado e os clientes criados em segundo plano no lifespan
+client = cliente_compartilhado
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepara o cliente Gemini sem atrasar a abertura da porta; /pronto indica quando terminou"""
+    preparacao = asyncio.ensure_future(preparar_gemini())
+    # Com a fila compartilhada, todo worker executa jobs, inclusive os enviados a outros processos
+    fila_jobs.iniciar()
+    yield
+    preparacao.cancel()
+    cache_contexto.liberar()
+    client.fechar()
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
 app = FastAPI(
     title="Módulo de IA - Recomendações de Cursos e Vagas",
     description="IA integrada a IoT/IoB para recomendações personalizadas e resumo de vagas",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configurar CORS para permitir requisições da API Java
@@ -32,6 +102,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Contagem e latência por rota para o /metrics (e rastros amostrados por etapa no log)
+app.add_middleware(MiddlewareMetricas)
 
 
 class PerfilUsuario(BaseModel):
@@ -42,6 +114,7 @@ class PerfilUsuario(BaseModel):
     habilidades: List[str]
     interesses: List[str]
     dados_iot: Optional[Dict] = None
+    usuario_id: Optional[str] = None  # com telemetria ingerida em /iot/eventos, substitui dados_iot
 
 
 class Vaga(BaseModel):
@@ -50,17 +123,93 @@ class Vaga(BaseModel):
     perfil_usuario: Optional[PerfilUsuario] = None
 
 
+class RankingVagasRequest(BaseModel):
+    perfil_usuario: PerfilUsuario
+    vagas: List[Vaga]  # o perfil_usuario de cada vaga é ignorado
+    resumir_top_k: int = 0  # resumo do Gemini só para as k primeiras (até RANKING_MAX_RESUMOS)
+
+
+# Respostas já geradas pelo Gemini, indexadas pela requisição normalizada
+cache_recomendacoes = obter_cache("recomendacoes")
+# Digest da vaga (independe do usuário) por conteúdo; avaliações do Gemini por digest e perfil
+cache_digest_vaga = obter_cache("digest_vaga", DigestVaga)
+cache_avaliacao_vaga = obter_cache("avaliacao_vaga")
+# Recomendações de perfis quase idênticos com o mesmo top-k do catálogo (None se desativado)
+cache_recomendacoes_semantico = obter_cache_semantico("recomendacoes")
+recomendacoes_em_voo = obter_tabela("recomendacoes")
+resumo_vaga_em_voo = obter_tabela("resumo_vaga")
+limitador_recomendacoes = obter_limitador("recomendacoes")
+limitador_resumo_vaga = obter_limitador("resumo_vaga")
+# Instrução fixa das recomendações, montada uma vez; a mensagem leva só o perfil e o catálogo pré-selecionado
+PREFIXO_RECOMENDACOES = prefixo_prompt("recomendacoes", (
+    "Você é um orientador de carreira para estudantes brasileiros. "
+    "Use linguagem simples, objetiva e motivadora. "
+    "Leve em conta o perfil do usuário e também os dados de IoT/IoB "
+    "(hábitos, tempo de estudo, preferências de uso do app, etc.). "
+    "Recomende apenas cursos e vagas da lista pré-selecionada do catálogo. "
+    "Responda SEMPRE em português."
+))
+# Índice local do catálogo construído na inicialização (recarregável em /catalogo/recarregar)
+obter_indice()
+# Perfis pré-gerados por python -m pregeracao, mapeados do arquivo do cache aquecido
+obter_armazem()
+
+
 @app.post("/recomendacoes")
-async def gerar_recomendacoes(perfil: PerfilUsuario):
-    try:
-        system_msg = (
-            "Você é um orientador de carreira para estudantes brasileiros. "
-            "Use linguagem simples, objetiva e motivadora. "
-            "Leve em conta o perfil do usuário e também os dados de IoT/IoB "
-            "(hábitos, tempo de estudo, preferências de uso do app, etc.). "
-            "Responda SEMPRE em português."
-        )
+async def gerar_recomendacoes(perfil: PerfilUsuario, http_request: Request, redigir: bool = True):
+    """
+    Recomenda cursos e vagas do catálogo ranqueados localmente para o perfil.
+    Com redigir=true (padrão), o Gemini reescreve o top-k em texto; sem ele, ou se o Gemini
+    falhar, o texto é montado a partir do próprio ranking.
+    """
+    resposta, _ = await gerar_recomendacoes_com_camada(perfil, http_request, redigir)
+    return resposta
+
+
+async def gerar_recomendacoes_com_camada(perfil: PerfilUsuario, http_request: Optional[Request] = None,
+                                         redigir: bool = True, orcamento: Optional[float] = None) -> Tuple[Dict[str, Any], str]:
+    """Como gerar_recomendacoes, retornando também a camada que atendeu (ex.: "cache", "primario", "catalogo")"""
+    inicio = time.perf_counter()
+    perfil = await com_dados_iot(perfil)
+    indice = obter_indice()
+    with rastrear("ranking_catalogo"):
+        catalogo = indice.recomendar(perfil.habilidades, perfil.interesses, perfil.objetivos)
+    if not redigir:
+        telemetria_camadas.registrar("recomendacoes", "catalogo", time.perf_counter() - inicio)
+        return {"recomendacoes": texto_recomendacoes_catalogo(catalogo), **catalogo}, "catalogo"
+
+    chave = chave_cache("recomendacoes", perfil, indice.versao)
+    resposta = await cache_recomendacoes.obter(chave)
+    if resposta is not None:
+        telemetria_camadas.registrar("recomendacoes", "cache", time.perf_counter() - inicio)
+        return {"recomendacoes": resposta, **catalogo}, "cache"
+
+    # O texto de um perfil semelhante só serve se o ranking local escolheu os mesmos itens
+    particao = particao_recomendacoes(indice, catalogo)
+    termos = termos_campos(
+        objetivos=perfil.objetivos,
+        habilidades=perfil.habilidades,
+        interesses=perfil.interesses,
+        formacao=perfil.nivel_formacao,
+        iot=str(perfil.dados_iot or ""),
+    )
+    if cache_recomendacoes_semantico is not None:
+        encontrado = cache_recomendacoes_semantico.obter(particao, termos)
+        if encontrado is not None:
+            texto, nome_original, _ = encontrado
+            resposta = trocar_nome(texto, nome_original, perfil.nome)
+            cache_recomendacoes.gravar(chave, resposta)
+            telemetria_camadas.registrar("recomendacoes", "cache_semantico", time.perf_counter() - inicio)
+            return {"recomendacoes": resposta, **catalogo}, "cache_semantico"
+    encontrado = obter_armazem().obter("recomendacoes", particao, termos_aquecidos(perfil.objetivos, perfil.habilidades))
+    if encontrado is not None:
+        texto, nome_original, _ = encontrado
+        resposta = trocar_nome(texto, nome_original, perfil.nome)
+        cache_recomendacoes.gravar(chave, resposta)
+        telemetria_camadas.registrar("recomendacoes", "aquecido", time.perf_counter() - inicio)
+        return {"recomendacoes": resposta, **catalogo}, "aquecido"
 
+    try:
         user_msg = f"""
 Perfil do usuário:
 - Nome: {perfil.nome}
@@ -70,22 +219,47 @@ Perfil do usuário:
 - Habilidades: {", ".join(perfil.habilidades)}
 - Interesses: {", ".join(perfil.interesses)}
 - Dados IoT/IoB: {perfil.dados_iot}
-"""
 
-        # Chamada para a API do Gemini
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=user_msg, 
-            config=types.GenerateContentConfig(
-                system_instruction=system_msg,
-                temperature=0.7,
-            ),
-        )
+Cursos e vagas pré-selecionados do catálogo (mais aderentes primeiro):
+{listar_catalogo(catalogo)}
+"""
 
-        resposta = response.text 
-        return {"recomendacoes": resposta}
+        if orcamento is None:
+            orcamento = orcamento_latencia(http_request)
+
+        async def _chamar_gemini() -> Tuple[str, str]:
+            # Chamada para a API do Gemini (com hedge no modelo alternativo se o primário demorar)
+            async with limitador_recomendacoes.admitir():
+                with rastrear("chamar_gemini"):
+                    texto, camada = await gerar_conteudo_com_hedge(
+                        client,
+                        model='gemini-2.5-flash',
+                        contents=user_msg,
+                        config=tipos_gemini().GenerateContentConfig(temperature=0.7),
+                        orcamento=orcamento,
+                        prefixo=PREFIXO_RECOMENDACOES,
+                    )
+            cache_recomendacoes.gravar(chave, texto)
+            if cache_recomendacoes_semantico is not None:
+                cache_recomendacoes_semantico.gravar(particao, termos, texto, perfil.nome)
+            return texto, camada
+
+        # Requisições idênticas simultâneas compartilham a mesma chamada ao Gemini
+        resposta, camada = await aguardar_conectado(recomendacoes_em_voo.executar(chave, _chamar_gemini), http_request, orcamento)
+        telemetria_camadas.registrar("recomendacoes", camada, time.perf_counter() - inicio)
+        return {"recomendacoes": resposta, **catalogo}, camada
+
+    except Exception as e:
+        # Sem vaga para chamar o Gemini (sobrecarga): a resposta sai na hora, marcada como degradada
+        degradado = {"degradado": True} if isinstance(e, SobrecargaException) else {}
+        log.warning("Respondendo sem o Gemini", extra={"endpoint": "recomendacoes", "detalhe": str(e)})
+        registrar_fallback("recomendacoes", motivo_fallback(e))
+        if catalogo["cursos"] or catalogo["vagas"]:
+            # Gemini indisponível: o ranking local continua personalizado
+            camada = "descartado" if degradado else "catalogo"
+            telemetria_camadas.registrar("recomendacoes", camada, time.perf_counter() - inicio)
+            return {"recomendacoes": texto_recomendacoes_catalogo(catalogo), **catalogo, **degradado}, camada
 
-    except Exception:
         resposta_falsa = (
             "Modo offline (simulação):\n\n"
             "1. Curso recomendado: **Desenvolvimento Backend com Java (iniciante)** — ideal para fortalecer sua lógica.\n"
@@ -94,84 +268,155 @@ Perfil do usuário:
             "Sugestão de vagas: Estágio em Backend, Suporte Técnico, Jovem Aprendiz em TI.\n\n"
             "Observação: baseado nos dados IoT, seu foco e horário de estudo são adequados para rotinas noturnas."
         )
-        return {"recomendacoes": resposta_falsa}
-
-
-# Importar módulo de plano de estudos (opcional - pode executar gerar_plano_estudos.py separadamente)
+        camada = "descartado" if degradado else "fallback"
+        telemetria_camadas.registrar("recomendacoes", camada, time.perf_counter() - inicio)
+        return {"recomendacoes": resposta_falsa, **catalogo, **degradado}, camada
+
+
+def particao_recomendacoes(indice: IndiceCatalogo, catalogo: Dict[str, List[Dict]]) -> str:
+    """Versão do catálogo e itens do top-k: textos de perfis semelhantes só valem para o mesmo ranking"""
+    return "|".join([indice.versao] + [curso["nome"] for curso in catalogo["cursos"]] + [vaga["titulo"] for vaga in catalogo["vagas"]])
+
+
+def motivo_fallback(erro: Exception) -> str:
+    """Motivo da resposta sem o Gemini, para o contador de fallbacks"""
+    if isinstance(erro, SobrecargaException):
+        return "sobrecarga"
+    if isinstance(erro, QuotaExceededException):
+        return "quota"
+    if isinstance(erro, TimeoutError):
+        return "timeout"
+    return "erro"
+
+
+def listar_catalogo(catalogo: Dict[str, List[Dict]]) -> str:
+    """Top-k do catálogo em tópicos para o prompt"""
+    linhas = [
+        f"- Curso: {curso['nome']} ({curso.get('nivel') or 'nível não informado'}, {curso.get('duracao_horas')}h, "
+        f"{curso.get('modalidade')}) - {curso.get('descricao') or ''}"
+        for curso in catalogo["cursos"]
+    ]
+    linhas += [
+        f"- Vaga: {vaga['titulo']} na {vaga.get('empresa')} ({vaga.get('nivel_senioridade') or 'nível não informado'}, "
+        f"{vaga.get('formato_trabalho')}) - requisitos: {vaga.get('requisitos') or 'não informados'}"
+        for vaga in catalogo["vagas"]
+    ]
+    return "\n".join(linhas) or "- Nenhum item do catálogo corresponde ao perfil."
+
+
+def texto_recomendacoes_catalogo(catalogo: Dict[str, List[Dict]]) -> str:
+    """Texto de recomendações montado só com o ranking local (sem IA)"""
+    partes = []
+    for i, curso in enumerate(catalogo["cursos"], start=1):
+        motivo = f" — relacionado a {', '.join(curso['termos'])}" if curso["termos"] else ""
+        partes.append(f"{i}. Curso recomendado: **{curso['nome']}** ({curso.get('duracao_horas')}h, {curso.get('modalidade')}){motivo}.")
+    if catalogo["vagas"]:
+        vagas = ", ".join(f"{vaga['titulo']} ({vaga.get('empresa')})" for vaga in catalogo["vagas"])
+        partes.append(f"\nSugestão de vagas: {vagas}.")
+    return "\n".join(partes) or "Nenhum curso ou vaga do catálogo corresponde ao seu perfil no momento."
+
+
+async def com_dados_iot(perfil: PerfilUsuario) -> PerfilUsuario:
+    """
+    Substitui dados_iot pelo resumo pré-calculado da telemetria do usuário, quando houver.
+    O usuario_id sai do perfil para que a chave de cache dependa só do conteúdo.
+    """
+    if perfil.usuario_id is None:
+        return perfil
+    resumo = await fora_do_loop(repositorio_iot.resumo, perfil.usuario_id)
+    return perfil.model_copy(update={"usuario_id": None, "dados_iot": resumo if resumo is not None else perfil.dados_iot})
+
+
+@app.post("/iot/eventos")
+async def ingerir_eventos_iot(http_request: Request):
+    """
+    Recebe eventos de telemetria em NDJSON, um por linha:
+    {"usuario_id": "...", "tipo": "estudo", "ts": 1731355200, "minutos": 45}
+    {"usuario_id": "...", "tipo": "foco", "ts": "2025-11-11T20:00:00-03:00", "pontuacao": 82}
+
+    Os limites de eventos, de bytes do corpo e de bytes por linha são verificados durante a leitura,
+    então um corpo grande demais (com ou sem quebras de linha) é recusado sem ser lido até o fim.
+    """
+    tamanho_declarado = http_request.headers.get("content-length")
+    if tamanho_declarado and tamanho_declarado.isdigit() and int(tamanho_declarado) > IOT_MAX_BYTES_LOTE:
+        raise HTTPException(status_code=413, detail=f"O lote aceita no máximo {IOT_MAX_BYTES_LOTE} bytes")
+    linhas: List[bytes] = []
+    pendente = b""
+    recebidos = 0
+    async for bloco in http_request.stream():
+        recebidos += len(bloco)
+        if recebidos > IOT_MAX_BYTES_LOTE:
+            raise HTTPException(status_code=413, detail=f"O lote aceita no máximo {IOT_MAX_BYTES_LOTE} bytes")
+        pendente += bloco
+        *completas, pendente = pendente.split(b"\n")
+        if len(pendente) > IOT_MAX_BYTES_EVENTO or any(len(linha) > IOT_MAX_BYTES_EVENTO for linha in completas):
+            raise HTTPException(status_code=413, detail=f"Cada evento aceita no máximo {IOT_MAX_BYTES_EVENTO} bytes")
+        linhas.extend(completas)
+        if len(linhas) > IOT_MAX_EVENTOS_LOTE:
+            raise HTTPException(status_code=413, detail=f"O lote aceita no máximo {IOT_MAX_EVENTOS_LOTE} eventos")
+    linhas.append(pendente)
+
+    eventos, invalidas = ler_eventos_ndjson(linhas)
+    aceitos = await fora_do_loop(repositorio_iot.ingerir, eventos)
+    repositorio_iot.eventos_rejeitados += invalidas
+    return {"aceitos": aceitos, "rejeitados": invalidas + len(eventos) - aceitos}
+
+
+@app.get("/iot/resumo/{usuario_id}")
+async def resumo_iot(usuario_id: str):
+    """Resumo da telemetria do usuário, no formato usado como dados_iot"""
+    resumo = await fora_do_loop(repositorio_iot.resumo, usuario_id)
+    if resumo is None:
+        raise HTTPException(status_code=404, detail="Nenhum evento IoT registrado para o usuário")
+    return resumo
+
+
+@app.post("/catalogo/recarregar")
+async def recarregar_catalogo():
+    """Reconstrói o índice local a partir do arquivo do catálogo exportado"""
+    return recarregar_indice().estatisticas()
+
+
+# Rotas do plano de estudos e dos jobs (módulo gerar_plano_estudos.py)
 try:
-    from gerar_plano_estudos import (
-        PlanoEstudosRequest as PlanoRequest,
-        PlanoEstudosResponse,
-        gerar_plano_estudos_endpoint
-    )
-    
-    # Adicionar rota do módulo ao app principal
-    app.add_api_route(
-        "/gerar-plano-estudos",
-        gerar_plano_estudos_endpoint,
-        methods=["POST"],
-        response_model=PlanoEstudosResponse,
-        tags=["Plano de Estudos"]
-    )
+    from gerar_plano_estudos import router as router_plano_estudos
+
+    app.include_router(router_plano_estudos)
 except ImportError:
     # Se módulo não disponível, criar endpoint básico
     @app.post("/gerar-plano-estudos")
     async def gerar_plano_estudos_fallback(perfil: PerfilUsuario):
-        return {"mensagem": "Módulo de plano de estudos não disponível. Execute gerar_plano_estudos.py separadamente."}
+        return {"mensagem": "Módulo de plano de estudos não disponível."}
 
 
 @app.post("/resumo-vaga")
-async def resumir_vaga(vaga: Vaga):
+async def resumir_vaga(vaga: Vaga, http_request: Request):
+    """
+    Resume a vaga em duas etapas. O digest (resumo, requisitos, benefícios e pontos de atenção) é
+    gerado uma vez por conteúdo de vaga e fica em cache, então o custo de cada visualização não
+    depende do tamanho da descrição. A adequação ao perfil é calculada a partir dos requisitos do
+    digest: localmente ou, com RESUMO_VAGA_AVALIACAO=gemini, com um prompt curto.
+    """
+    inicio = time.perf_counter()
+    perfil = await com_dados_iot(vaga.perfil_usuario) if vaga.perfil_usuario is not None else None
+    orcamento = orcamento_latencia(http_request)
     try:
-        system_msg = (
-            "Você é um assistente de carreira que resume vagas de emprego. "
-            "Sempre responda em português, em tópicos, de forma simples."
-        )
-
-        perfil_txt = "Nenhum perfil informado."
-        if vaga.perfil_usuario is not None:
-            p = vaga.perfil_usuario
-            perfil_txt = f"""
-Perfil do usuário:
-- Idade: {p.idade}
-- Formação: {p.nivel_formacao}
-- Objetivos: {p.objetivos}
-- Habilidades: {", ".join(p.habilidades)}
-- Interesses: {", ".join(p.interesses)}
-- Dados IoT/IoB: {p.dados_iot}
-"""
-
-        user_msg = f"""
-Título da vaga: {vaga.titulo}
-
-Descrição completa da vaga:
-'''{vaga.descricao_completa}'''
-
-{perfil_txt}
-
-Tarefas:
-1) Faça um RESUMO da vaga em no máximo 5 linhas.
-2) Liste os principais REQUISITOS em tópicos.
-3) Liste BENEFÍCIOS se houver, ou diga que não estão claros.
-4) Aponte PONTOS DE ATENÇÃO (ex.: jornada, salário não informado, experiência exigida).
-5) Se o perfil do usuário foi informado, diga se essa vaga é adequada
-   e o que ele ainda precisa estudar ou melhorar.
-"""
-
-        # Chamada para a API do Gemini
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=user_msg,
-            config=types.GenerateContentConfig(
-                system_instruction=system_msg,
-                temperature=0.5,
-            ),
-        )
-
-        resposta = response.text
-        return {"analise_vaga": resposta}
-
-    except Exception:
+        chave = chave_digest(vaga.titulo, vaga.descricao_completa)
+        digest, camada = await obter_digest(vaga, chave, http_request, orcamento)
+        resposta: Dict = {"digest": digest.model_dump()}
+        avaliacao = None
+        if perfil is not None:
+            restante = orcamento - (time.perf_counter() - inicio)
+            resposta["avaliacao_perfil"] = await avaliar_perfil_vaga(vaga.titulo, digest, chave, perfil, restante)
+            avaliacao = resposta["avaliacao_perfil"]["texto"]
+        telemetria_camadas.registrar("resumo_vaga", camada, time.perf_counter() - inicio)
+        return {"analise_vaga": formatar_analise(digest, avaliacao), **resposta}
+
+    except Exception as e:
+        # Sem vaga para chamar o Gemini (sobrecarga): a resposta sai na hora, marcada como degradada
+        degradado = {"degradado": True} if isinstance(e, SobrecargaException) else {}
+        log.warning("Respondendo sem o Gemini", extra={"endpoint": "resumo_vaga", "detalhe": str(e)})
+        registrar_fallback("resumo_vaga", motivo_fallback(e))
         resumo_falso = (
             "Modo offline (simulação):\n\n"
             "Resumo: Vaga de estágio para auxiliar no desenvolvimento de APIs e manutenção de sistemas backend.\n"
@@ -180,7 +425,128 @@ Tarefas:
             "Pontos de atenção: jornada de trabalho e salário não especificados.\n"
             "Avaliação do perfil: adequado — já possui conhecimentos em Java e Python, basta aprofundar em REST e banco de dados."
         )
-        return {"analise_vaga": resumo_falso}
+        telemetria_camadas.registrar("resumo_vaga", "descartado" if degradado else "fallback", time.perf_counter() - inicio)
+        return {"analise_vaga": resumo_falso, **degradado}
+
+
+async def obter_digest(vaga: Vaga, chave: str, http_request: Request, orcamento: float) -> Tuple[DigestVaga, str]:
+    """Digest do cache ou gerado pelo Gemini; visualizações simultâneas da mesma vaga compartilham a chamada"""
+    digest = await cache_digest_vaga.obter(chave)
+    if digest is not None:
+        return digest, "cache"
+
+    async def _gerar_digest() -> Tuple[DigestVaga, str]:
+        async with limitador_resumo_vaga.admitir():
+            # Descrições muito longas são resumidas em trechos paralelos antes do prompt do digest
+            inicio_chamada = time.perf_counter()
+            descricao = await preparar_descricao(
+                client, vaga.descricao_completa, model='gemini-2.5-flash', orcamento=orcamento, rotulo="resumo-vaga"
+            )
+            # Chamada para a API do Gemini (com hedge no modelo alternativo se o primário demorar)
+            with rastrear("chamar_gemini"):
+                texto, camada = await gerar_conteudo_com_hedge(
+                    client,
+                    model='gemini-2.5-flash',
+                    contents=montar_prompt_digest(vaga.titulo, descricao),
+                    config=config_digest(),
+                    prefixo=PREFIXO_DIGEST_VAGA,
+                    orcamento=orcamento - (time.perf_counter() - inicio_chamada),
+                    validar=lambda texto: '"requisitos"' in texto,
+                )
+        with rastrear("processar_resposta"):
+            gerado = DigestVaga.model_validate_json(texto)
+        cache_digest_vaga.gravar(chave, gerado)
+        return gerado, camada
+
+    return await aguardar_conectado(resumo_vaga_em_voo.executar(chave, _gerar_digest), http_request, orcamento)
+
+
+async def avaliar_perfil_vaga(titulo: str, digest: DigestVaga, chave: str, perfil: PerfilUsuario,
+                              orcamento: float) -> Dict:
+    """
+    Adequação do perfil à vaga. A avaliação local (requisitos do digest x habilidades) é sempre
+    calculada; com RESUMO_VAGA_AVALIACAO=gemini, o texto vem de um prompt curto, e a local é
+    usada se o Gemini não responder.
+    """
+    avaliacao = avaliar_perfil_local(digest, perfil.habilidades)
+    if RESUMO_VAGA_AVALIACAO != "gemini" or not client.configurado:
+        return avaliacao
+
+    chave_avaliacao = chave_cache("avaliacao_vaga", chave, perfil)
+    texto = await cache_avaliacao_vaga.obter(chave_avaliacao)
+    if texto is None:
+        try:
+            async with limitador_resumo_vaga.admitir():
+                with rastrear("chamar_gemini"):
+                    texto, _ = await gerar_conteudo_com_hedge(
+                        client,
+                        model='gemini-2.5-flash',
+                        contents=montar_prompt_avaliacao(titulo, digest, perfil),
+                        config=config_avaliacao(),
+                        orcamento=max(orcamento, 0.001),
+                        prefixo=PREFIXO_AVALIACAO_VAGA,
+                    )
+        except Exception as e:
+            log.warning("Avaliação do perfil sem o Gemini; usando a avaliação local", extra={"detalhe": str(e)})
+            return avaliacao
+        texto = texto.strip()
+        if not texto.lower().startswith("avaliação do perfil"):
+            texto = f"Avaliação do perfil: {texto}"
+        cache_avaliacao_vaga.gravar(chave_avaliacao, texto)
+    return {**avaliacao, "texto": texto}
+
+
+@app.post("/vagas/ranking")
+async def ranquear_vagas_perfil(requisicao: RankingVagasRequest, http_request: Request):
+    """
+    Ranqueia as vagas para o perfil localmente, com as habilidades atendidas e as lacunas de cada uma,
+    em vez de um /resumo-vaga por vaga. Com resumir_top_k, só as primeiras do ranking passam pelo
+    digest do Gemini (em paralelo e com o cache do /resumo-vaga).
+    """
+    inicio = time.perf_counter()
+    if len(requisicao.vagas) > RANKING_MAX_VAGAS:
+        raise HTTPException(status_code=413, detail=f"O ranking aceita no máximo {RANKING_MAX_VAGAS} vagas")
+    perfil = await com_dados_iot(requisicao.perfil_usuario)
+    resultado = ranquear_vagas(
+        [(vaga.titulo, vaga.descricao_completa) for vaga in requisicao.vagas],
+        perfil.habilidades,
+        perfil.interesses,
+        obter_lexico(obter_indice()),
+    )
+
+    primeiras = resultado["vagas"][:min(max(requisicao.resumir_top_k, 0), RANKING_MAX_RESUMOS)]
+    camada = "local"
+    if primeiras:
+        orcamento = orcamento_latencia(http_request)
+        resumos = await asyncio.gather(*(
+            resumir_vaga_ranking(requisicao.vagas[item["indice"]], perfil, http_request, orcamento)
+            for item in primeiras
+        ))
+        for item, resumo in zip(primeiras, resumos):
+            item["resumo"] = resumo
+        camada = "resumido" if all(resumos) else "parcial"
+    telemetria_camadas.registrar("ranking_vagas", camada, time.perf_counter() - inicio)
+    return {"total": len(requisicao.vagas), "resumidas": len(primeiras), **resultado}
+
+
+async def resumir_vaga_ranking(vaga: Vaga, perfil: PerfilUsuario, http_request: Request,
+                               orcamento: float) -> Optional[Dict]:
+    """Resumo de uma vaga do topo do ranking no formato do /resumo-vaga; None se o Gemini não responder"""
+    inicio = time.perf_counter()
+    try:
+        chave = chave_digest(vaga.titulo, vaga.descricao_completa)
+        digest, _ = await obter_digest(vaga, chave, http_request, orcamento)
+        restante = orcamento - (time.perf_counter() - inicio)
+        avaliacao = await avaliar_perfil_vaga(vaga.titulo, digest, chave, perfil, restante)
+    except Exception as e:
+        log.warning("Vaga do ranking sem resumo", extra={"endpoint": "ranking_vagas", "detalhe": str(e)})
+        registrar_fallback("ranking_vagas", motivo_fallback(e))
+        return None
+    return {
+        "analise_vaga": formatar_analise(digest, avaliacao["texto"]),
+        "digest": digest.model_dump(),
+        "avaliacao_perfil": avaliacao,
+    }
 
 
 @app.get("/")
@@ -194,9 +560,20 @@ async def root():
         "endpoints": {
             "documentacao": "/docs",
             "health_check": "/health",
+            "pronto": "/pronto",
+            "metricas": "/metrics",
             "recomendacoes": "/recomendacoes",
+            "recarregar_catalogo": "/catalogo/recarregar",
+            "iot_eventos": "/iot/eventos",
+            "iot_resumo": "/iot/resumo/{usuario_id}",
             "resumo_vaga": "/resumo-vaga",
-            "gerar_plano_estudos": "/gerar-plano-estudos"
+            "ranking_vagas": "/vagas/ranking",
+            "gerar_plano_estudos": "/gerar-plano-estudos",
+            "gerar_plano_estudos_stream": "/gerar-plano-estudos/stream",
+            "gerar_plano_estudos_lote": "/gerar-plano-estudos/lote",
+            "plano_estudos_usuario": "/usuarios/{usuario_id}/plano-estudos",
+            "jobs_plano_estudos": "/jobs/plano-estudos",
+            "jobs_consulta": "/jobs/{job_id}"
         }
     }
 
@@ -207,5 +584,68 @@ async def health_check():
     return {
         "status": "ok",
         "servico": "IOT - Geração de Plano de Estudos",
-        "modelo_ia": "Gemini 2.5 Flash"
-    }
\ No newline at end of file
+        "modelo_ia": "Gemini 2.5 Flash",
+        "cache": estatisticas_caches(),
+        "cache_semantico": estatisticas_caches_semanticos(),
+        "cache_aquecido": obter_armazem().estatisticas(),
+        "requisicoes_em_voo": estatisticas_em_voo(),
+        "quota": await fora_do_loop(estado_quota),
+        "credenciais": obter_pool().estatisticas(),
+        "camadas": telemetria_camadas.estatisticas(),
+        "catalogo": obter_indice().estatisticas(),
+        "iot": repositorio_iot.estatisticas(),
+        "prompt_resumo_vaga": estatisticas_prompt.estatisticas(),
+        "jobs": await fila_jobs.consultar_estatisticas(),
+        "planos_usuario": await estatisticas_planos(),
+        "cache_contexto": cache_contexto.estatisticas(),
+        "admissao": estatisticas_admissao(),
+        "fallback": obter_motor().estatisticas(),
+        "inicializacao": tempos_inicializacao.estatisticas(),
+    }
+
+
+@app.get("/pronto")
+async def readiness_check():
+    """Readiness: 503 até o cliente Gemini estar criado (e a conexão aquecida, com GEMINI_AQUECER)"""
+    if not client.pronto:
+        return JSONResponse(status_code=503, content={"pronto": False})
+    return {"pronto": True, "inicializacao": tempos_inicializacao.estatisticas()}
+
+
+# Estatísticas que consultam arquivos SQLite, lidas fora do event loop antes de cada coleta do /metrics
+_estatisticas_estado: Dict[str, Any] = {"quota": {}, "jobs": {}, "planos": {}}
+
+
+def coletar_estatisticas():
+    """Estatísticas do /health convertidas em gauges a cada coleta do /metrics"""
+    yield from gauges_de_estatisticas("cache", "Cache de respostas por namespace", "namespace", estatisticas_caches())
+    yield from gauges_de_estatisticas("cache_semantico", "Cache semântico por namespace", "namespace", estatisticas_caches_semanticos())
+    yield from gauges_de_estatisticas("cache_aquecido", "Perfis pré-gerados do cache aquecido por namespace", "namespace",
+                                      obter_armazem().estatisticas())
+    yield from gauges_de_estatisticas("em_voo", "Chamadas compartilhadas entre requisições idênticas", "endpoint", estatisticas_em_voo())
+    yield from gauges_de_estatisticas("quota", "Disjuntor e orçamento de quota por modelo", "modelo", _estatisticas_estado["quota"])
+    yield from gauges_de_estatisticas("credencial", "Uso e saúde de cada credencial do Gemini", "credencial",
+                                      obter_pool().estatisticas())
+    yield from gauges_de_estatisticas("admissao", "Controle de admissão por endpoint", "endpoint", estatisticas_admissao())
+    yield from gauges_de_estatisticas("jobs", "Fila de jobs assíncronos", "fila", {"plano_estudos": _estatisticas_estado["jobs"]})
+    yield from gauges_de_estatisticas("planos_usuario", "Planos guardados por usuário e atualizações do perfil", "repositorio",
+                                      {"sqlite": _estatisticas_estado["planos"]})
+    yield from gauges_de_estatisticas("cache_contexto", "Prefixos de prompt e cache de contexto do Gemini", "prefixo",
+                                      cache_contexto.estatisticas())
+    yield from gauges_de_estatisticas("fallback_motor", "Motor do plano fallback", "origem", {"trilhas": obter_motor().estatisticas()})
+    yield from gauges_de_estatisticas("prompt", "Tamanho estimado das descrições de vaga", "endpoint", {"resumo_vaga": estatisticas_prompt.estatisticas()})
+
+
+registro_metricas.registrar_coletor(coletar_estatisticas)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    _estatisticas_estado["quota"] = await fora_do_loop(estado_quota)
+    _estatisticas_estado["jobs"] = await fila_jobs.consultar_estatisticas()
+    _estatisticas_estado["planos"] = await estatisticas_planos()
+    return PlainTextResponse(registro_metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+tempos_inicializacao.registrar("importacao_app", time.perf_counter() - INICIO_IMPORTACAO)
\ No newline at end of file
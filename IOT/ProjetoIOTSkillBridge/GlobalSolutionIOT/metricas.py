@@ -0,0 +1,260 @@
+"""
+Métricas no formato de exposição do Prometheus (texto 0.0.4) e rastreamento por etapa
+Contadores e histogramas registrados no caminho da requisição; as estatísticas dos módulos
+(caches, quota, admissão, jobs) são convertidas em gauges no momento da coleta em /metrics
+"""
+
+import contextvars
+import os
+import random
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from log_estruturado import obter_logger
+
+
+# Fração das requisições com rastreamento detalhado por etapa registrado no log (0 desativa)
+METRICAS_AMOSTRAGEM_RASTROS = float(os.getenv("METRICAS_AMOSTRAGEM_RASTROS", "0"))
+PREFIXO = "skillbridge"
+
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+BALDES_CARACTERES = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+BALDES_TOKENS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+log = obter_logger("rastros")
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes: Sequence[str], valores: Sequence[Any], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico com rótulos"""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def incrementar(self, *valores_rotulos: Any, quantidade: float = 1):
+        chave = tuple(str(valor) for valor in valores_rotulos)
+        self._valores[chave] = self._valores.get(chave, 0) + quantidade
+
+    def exportar(self) -> List[str]:
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}" for chave, valor in sorted(self._valores.items())]
+
+
+class Histograma:
+    """Histograma com baldes fixos; as contagens por balde só são acumuladas na exportação"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), baldes: Sequence[float] = BALDES_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.baldes = tuple(sorted(baldes))
+        # rótulos -> [contagem por balde (+Inf no fim), soma]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observar(self, valor: float, *valores_rotulos: Any):
+        chave = tuple(str(v) for v in valores_rotulos)
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = ([0] * (len(self.baldes) + 1), [0.0])
+        serie[0][bisect_left(self.baldes, valor)] += 1
+        serie[1][0] += valor
+
+    def exportar(self) -> List[str]:
+        linhas = []
+        for chave, (contagens, soma) in sorted(self._series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += contagem
+                le = 'le="' + _numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma[0])}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+# Coletor: função sem argumentos que retorna [(nome, ajuda, {rótulo: valor}, valor)], exportados como gauge
+Coletor = Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]
+
+
+class RegistroMetricas:
+    """Métricas do processo e coletores chamados a cada exportação"""
+
+    def __init__(self):
+        self._metricas: Dict[str, Any] = {}
+        self._coletores: List[Coletor] = []
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._metricas.setdefault(f"{PREFIXO}_{nome}", Contador(f"{PREFIXO}_{nome}", ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   baldes: Sequence[float] = BALDES_LATENCIA) -> Histograma:
+        return self._metricas.setdefault(f"{PREFIXO}_{nome}", Histograma(f"{PREFIXO}_{nome}", ajuda, rotulos, baldes))
+
+    def registrar_coletor(self, coletor: Coletor):
+        self._coletores.append(coletor)
+
+    def exportar(self) -> str:
+        linhas: List[str] = []
+        for metrica in self._metricas.values():
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.exportar())
+
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for coletor in self._coletores:
+            for nome, ajuda, rotulos, valor in coletor():
+                nome = f"{PREFIXO}_{nome}"
+                amostra = f"{nome}{_rotulos(list(rotulos), list(rotulos.values()))} {_numero(valor)}"
+                gauges.setdefault(nome, (ajuda, []))[1].append(amostra)
+        for nome, (ajuda, amostras) in gauges.items():
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} gauge")
+            linhas.extend(amostras)
+        return "\n".join(linhas) + "\n"
+
+
+registro_metricas = RegistroMetricas()
+
+
+def gauges_de_estatisticas(nome: str, ajuda: str, rotulo: str,
+                           estatisticas: Dict[str, Dict[str, Any]]) -> Iterator[Tuple[str, str, Dict[str, Any], float]]:
+    """
+    Converte {instância: {campo: valor}} (formato das funções estatisticas_*) em gauges
+    nome_campo{rotulo=instância}. Textos viram um rótulo "valor" com amostra 1
+    (ex.: disjuntor="aberto"); dicionários aninhados e listas são ignorados.
+    """
+    for instancia, campos in estatisticas.items():
+        for campo, valor in campos.items():
+            if isinstance(valor, bool):
+                yield f"{nome}_{campo}", ajuda, {rotulo: instancia}, int(valor)
+            elif isinstance(valor, (int, float)):
+                yield f"{nome}_{campo}", ajuda, {rotulo: instancia}, valor
+            elif isinstance(valor, str):
+                yield f"{nome}_{campo}", ajuda, {rotulo: instancia, "valor": valor}, 1
+
+
+# Tempo de cada etapa do pipeline (montagem do prompt, chamada ao Gemini, parsing, validação)
+duracao_etapas = registro_metricas.histograma(
+    "etapa_duracao_segundos", "Duração de cada etapa do pipeline de geração", ("etapa",)
+)
+
+
+class Rastro:
+    """Etapas de uma requisição amostrada, registradas no log ao final"""
+
+    __slots__ = ("id", "inicio", "etapas")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:16]
+        self.inicio = time.perf_counter()
+        self.etapas: List[Dict[str, Any]] = []
+
+
+_rastro_atual: contextvars.ContextVar[Optional[Rastro]] = contextvars.ContextVar("rastro_atual", default=None)
+
+
+@contextmanager
+def rastrear(etapa: str) -> Iterator[None]:
+    """Mede a etapa no histograma de etapas e, se a requisição for amostrada, no rastro dela"""
+    inicio = time.perf_counter()
+    erro: Optional[str] = None
+    try:
+        yield
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        duracao_etapas.observar(duracao, etapa)
+        rastro = _rastro_atual.get()
+        if rastro is not None:
+            rastro.etapas.append({
+                "etapa": etapa,
+                "inicio_ms": round((inicio - rastro.inicio) * 1000, 2),
+                "duracao_ms": round(duracao * 1000, 2),
+                **({"erro": erro} if erro else {}),
+            })
+
+
+requisicoes_http = registro_metricas.contador(
+    "http_requisicoes_total", "Requisições HTTP por rota, método e status", ("rota", "metodo", "status")
+)
+duracao_http = registro_metricas.histograma(
+    "http_duracao_segundos", "Duração das requisições HTTP até o último byte da resposta", ("rota", "metodo")
+)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: conta e mede cada requisição pela rota (o template, ex. /jobs/{job_id}) e,
+    para a fração amostrada ou com o header X-Rastrear: 1, registra no log o rastro das etapas
+    e devolve o id em X-Rastro-Id.
+    """
+
+    def __init__(self, app, amostragem: float = METRICAS_AMOSTRAGEM_RASTROS):
+        self.app = app
+        self.amostragem = amostragem
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        forcado = any(nome == b"x-rastrear" and valor == b"1" for nome, valor in scope.get("headers", ()))
+        rastro = Rastro() if forcado or (self.amostragem > 0 and random.random() < self.amostragem) else None
+        token = _rastro_atual.set(rastro)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                if rastro is not None:
+                    mensagem = {**mensagem, "headers": list(mensagem.get("headers", [])) + [(b"x-rastro-id", rastro.id.encode())]}
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _rastro_atual.reset(token)
+            rota = scope.get("route")
+            # Caminhos sem rota (404) ficam agrupados para não multiplicar séries
+            caminho = getattr(rota, "path", None) or "desconhecida"
+            duracao = time.perf_counter() - inicio
+            requisicoes_http.incrementar(caminho, scope["method"], status)
+            duracao_http.observar(duracao, caminho, scope["method"])
+            if rastro is not None:
+                log.info("rastro", extra={
+                    "rastro_id": rastro.id,
+                    "rota": caminho,
+                    "metodo": scope["method"],
+                    "status": status,
+                    "duracao_ms": round(duracao * 1000, 2),
+                    "etapas": rastro.etapas,
+                })
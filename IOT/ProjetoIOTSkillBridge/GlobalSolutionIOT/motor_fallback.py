@@ -0,0 +1,180 @@
+"""
+Motor do plano de estudos fallback
+Trilhas e modelos de etapas lidos de arquivo, validados e pré-compilados na inicialização; a trilha
+é escolhida por um índice invertido de palavras-chave sobre o objetivo e as áreas de interesse
+"""
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from indice_catalogo import tokenizar
+
+
+# Arquivo com as trilhas, os modelos de etapa e os textos do plano fallback
+TRILHAS_FALLBACK_PATH = os.getenv("TRILHAS_FALLBACK_PATH", str(Path(__file__).resolve().parent / "trilhas_fallback.json"))
+
+# Peso de uma palavra-chave encontrada no objetivo e nas áreas de interesse
+PESO_OBJETIVO = 2
+PESO_AREAS = 1
+
+
+class ModeloEtapa(BaseModel):
+    titulo: str
+    descricao: str  # aceita {objetivo} e {competencias}
+    competencias: Tuple[Optional[int], Optional[int]]  # fatia das competências atuais
+    recursos: Tuple[Optional[int], Optional[int]]  # fatia dos recursos da trilha
+    recursos_padrao: List[str]  # usados se a fatia de recursos ficar vazia
+
+
+class Trilha(BaseModel):
+    id: str
+    palavras_chave: List[str] = []
+    recursos: List[str]
+
+
+class ArquivoTrilhas(BaseModel):
+    etapas: List[ModeloEtapa]
+    trilhas: List[Trilha]
+    recursos_adicionais: List[str]
+    metricas_sucesso: List[str]
+    motivacao: str  # aceita {objetivo}, {horas_semana} e {horas_totais}
+
+
+class _EtapaCompilada:
+    """Etapa com título e recursos já resolvidos; por requisição só descrição, competências e semanas"""
+
+    __slots__ = ("ordem", "titulo", "descricao", "inicio", "fim", "recursos")
+
+    def __init__(self, ordem: int, modelo: ModeloEtapa, recursos_trilha: List[str]):
+        self.ordem = ordem
+        self.titulo = modelo.titulo
+        self.descricao = modelo.descricao
+        self.inicio, self.fim = modelo.competencias
+        self.recursos = recursos_trilha[slice(*modelo.recursos)] or list(modelo.recursos_padrao)
+
+    def montar(self, competencias_atuais: List[str], objetivo: str, semanas: int) -> Dict[str, Any]:
+        # Sem competências suficientes para a fatia, a etapa usa todas
+        if self.fim is not None and self.fim > 0 and len(competencias_atuais) < self.fim:
+            competencias = list(competencias_atuais)
+        else:
+            competencias = competencias_atuais[self.inicio:self.fim]
+        return {
+            "ordem": self.ordem,
+            "titulo": self.titulo,
+            "descricao": self.descricao.format(competencias=", ".join(competencias), objetivo=objetivo),
+            "duracao_semanas": semanas,
+            "recursos_sugeridos": list(self.recursos),
+            "competencias_desenvolvidas": competencias,
+        }
+
+
+class MotorFallback:
+    """
+    Monta planos fallback a partir do arquivo de trilhas.
+
+    Para cada trilha e quantidade de etapas, as etapas são compiladas uma vez; a escolha da
+    trilha pontua as palavras-chave (inclusive compostas, como "spring boot") encontradas no
+    objetivo e nas áreas de interesse. Empate fica com a trilha que vem primeiro no arquivo, e
+    sem nenhuma palavra-chave vale a trilha sem palavras-chave (geral).
+    """
+
+    def __init__(self, dados: ArquivoTrilhas, origem: str = ""):
+        self.origem = origem
+        self.dados = dados
+        # termo -> [(índice da trilha, termos da palavra-chave)]
+        self._indice: Dict[str, List[Tuple[int, Tuple[str, ...]]]] = {}
+        for posicao, trilha in enumerate(dados.trilhas):
+            for palavra in trilha.palavras_chave:
+                termos = tuple(tokenizar(palavra))
+                if termos:
+                    self._indice.setdefault(termos[0], []).append((posicao, termos))
+        self._padrao = next((i for i, trilha in enumerate(dados.trilhas) if not trilha.palavras_chave), 0)
+        # (índice da trilha, quantidade de etapas) -> etapas compiladas
+        self._etapas: Dict[Tuple[int, int], List[_EtapaCompilada]] = {
+            (posicao, quantidade): [
+                _EtapaCompilada(ordem, modelo, trilha.recursos)
+                for ordem, modelo in enumerate(dados.etapas[:quantidade], start=1)
+            ]
+            for posicao, trilha in enumerate(dados.trilhas)
+            for quantidade in range(1, len(dados.etapas) + 1)
+        }
+        self.planos = 0
+        # Trilha escolhida por (objetivo, áreas de interesse), memorizada por motor
+        self.selecionar_trilha = lru_cache(maxsize=4096)(self._selecionar_trilha)
+
+    @classmethod
+    def carregar(cls, caminho: str = TRILHAS_FALLBACK_PATH) -> "MotorFallback":
+        """Lê e valida o arquivo de trilhas; lança ValueError se ele for inválido"""
+        with open(caminho, encoding="utf-8") as arquivo:
+            dados = ArquivoTrilhas.model_validate(json.load(arquivo))
+        if not dados.etapas or not dados.trilhas:
+            raise ValueError(f"{caminho}: o arquivo precisa de ao menos uma etapa e uma trilha")
+        # Placeholders desconhecidos falham aqui, e não na primeira requisição
+        for modelo in dados.etapas:
+            modelo.descricao.format(objetivo="", competencias="")
+        dados.motivacao.format(objetivo="", horas_semana=0, horas_totais=0)
+        return cls(dados, caminho)
+
+    def _selecionar_trilha(self, objetivo: str, areas: Tuple[str, ...] = ()) -> int:
+        """Índice da trilha com mais palavras-chave encontradas no objetivo e nas áreas de interesse"""
+        pontuacoes: Dict[int, int] = {}
+        for peso, textos in ((PESO_OBJETIVO, (objetivo,)), (PESO_AREAS, areas)):
+            termos = set()
+            for texto in textos:
+                termos.update(tokenizar(texto))
+            for termo in termos:
+                for posicao, palavra in self._indice.get(termo, ()):
+                    if all(parte in termos for parte in palavra):
+                        pontuacoes[posicao] = pontuacoes.get(posicao, 0) + peso
+        if not pontuacoes:
+            return self._padrao
+        return min(pontuacoes, key=lambda posicao: (-pontuacoes[posicao], posicao))
+
+    def montar(self, objetivo: str, nivel_atual: str, competencias_atuais: List[str], tempo_disponivel_semana: int,
+               prazo_meses: Optional[int], areas_interesse: Optional[Iterable[str]] = None,
+               motivacao: str = "") -> Dict[str, Any]:
+        """Plano fallback no formato de PlanoEstudosResponse (dict)"""
+        prazo = prazo_meses or 6
+        quantidade = min(len(self.dados.etapas), max(2, prazo // 2)) if prazo > 0 else min(2, len(self.dados.etapas))
+        semanas = max(4, prazo * 4 // quantidade)
+        horas_totais = tempo_disponivel_semana * prazo * 4
+        trilha = self.selecionar_trilha(objetivo, tuple(areas_interesse or ()))
+        self.planos += 1
+        return {
+            "objetivo_carreira": objetivo,
+            "nivel_atual": nivel_atual,
+            "prazo_total_meses": prazo,
+            "horas_totais_estimadas": horas_totais,
+            "etapas": [etapa.montar(competencias_atuais, objetivo, semanas) for etapa in self._etapas[(trilha, quantidade)]],
+            "recursos_adicionais": list(self.dados.recursos_adicionais),
+            "metricas_sucesso": list(self.dados.metricas_sucesso),
+            "motivacao": motivacao or self.dados.motivacao.format(
+                objetivo=objetivo, horas_semana=tempo_disponivel_semana, horas_totais=horas_totais
+            ),
+        }
+
+    def estatisticas(self) -> Dict[str, Any]:
+        cache = self.selecionar_trilha.cache_info()
+        return {
+            "origem": self.origem,
+            "trilhas": len(self.dados.trilhas),
+            "planos_montados": self.planos,
+            "selecoes_em_cache": cache.hits,
+        }
+
+
+_motor: Optional[MotorFallback] = None
+
+
+def obter_motor() -> MotorFallback:
+    """Retorna o motor de fallback, carregando o arquivo de trilhas na primeira chamada"""
+    global _motor
+    if _motor is None:
+        _motor = MotorFallback.carregar()
+    return _motor
+
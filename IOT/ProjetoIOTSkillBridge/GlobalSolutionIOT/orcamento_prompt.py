@@ -0,0 +1,180 @@
+"""
+Orçamento de tamanho do prompt
+Remove parágrafos repetidos e, acima do limite de tokens, reduz a descrição trecho a trecho: cortando cada
+trecho localmente (padrão) ou resumindo os trechos em paralelo com o Gemini (map-reduce)
+"""
+
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from cache_respostas import chave_cache, normalizar, obter_cache
+from cliente_gemini import gerar_conteudo_com_hedge, tipos_gemini
+from controle_quota import estimar_tokens
+from log_estruturado import obter_logger
+from metricas import rastrear
+
+
+# Tokens estimados da descrição acima dos quais ela é resumida em trechos antes do prompt final
+RESUMO_VAGA_LIMITE_TOKENS = int(os.getenv("RESUMO_VAGA_LIMITE_TOKENS", "3000"))
+# Tamanho máximo de cada trecho, em tokens estimados
+RESUMO_TRECHO_TOKENS = int(os.getenv("RESUMO_TRECHO_TOKENS", "1500"))
+# Trechos resumidos ao mesmo tempo e máximo de trechos por descrição (o excedente é descartado)
+RESUMO_VAGA_CONCORRENCIA = int(os.getenv("RESUMO_VAGA_CONCORRENCIA", "4"))
+RESUMO_VAGA_MAX_TRECHOS = int(os.getenv("RESUMO_VAGA_MAX_TRECHOS", "12"))
+# Redução dos trechos: "local" (cada trecho cortado, sem chamadas) ou "gemini" (resumo de cada trecho)
+RESUMO_TRECHOS_MODO = os.getenv("RESUMO_TRECHOS_MODO", "local").lower()
+# Com "gemini", chamadas de resumo de trecho por requisição; os trechos além disso (fora do cache) são cortados.
+# O limite do gemini-2.5-flash é de 10 rpm: sem ele, uma única vaga longa poderia gastar a quota do minuto
+RESUMO_VAGA_MAX_CHAMADAS = int(os.getenv("RESUMO_VAGA_MAX_CHAMADAS", "3"))
+
+# Resumos de trechos já gerados, indexados pelo conteúdo do trecho
+cache_trechos = obter_cache("resumo_trecho")
+
+log = obter_logger("orcamento_prompt")
+
+
+class EstatisticasPrompt:
+    """Tokens estimados das descrições recebidas, para dimensionar a quota"""
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.tokens_total = 0
+        self.tokens_maximo = 0
+        self.map_reduce = 0
+        self.trechos_descartados = 0
+        self.trechos_cortados = 0
+
+    def registrar(self, tokens: int, trechos: int = 0):
+        self.requisicoes += 1
+        self.tokens_total += tokens
+        self.tokens_maximo = max(self.tokens_maximo, tokens)
+        if trechos:
+            self.map_reduce += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "requisicoes": self.requisicoes,
+            "tokens_medio": round(self.tokens_total / self.requisicoes) if self.requisicoes else 0,
+            "tokens_maximo": self.tokens_maximo,
+            "map_reduce": self.map_reduce,
+            "trechos_descartados": self.trechos_descartados,
+            "trechos_cortados": self.trechos_cortados,
+        }
+
+
+estatisticas_prompt = EstatisticasPrompt()
+
+
+def deduplicar_paragrafos(texto: str) -> str:
+    """Remove parágrafos repetidos (comparados sem diferenciar maiúsculas e espaços), mantendo a primeira ocorrência"""
+    vistos = set()
+    paragrafos = []
+    for paragrafo in re.split(r"\n\s*\n", texto):
+        chave = normalizar(paragrafo)
+        if chave and chave not in vistos:
+            vistos.add(chave)
+            paragrafos.append(paragrafo.strip())
+    return "\n\n".join(paragrafos)
+
+
+def dividir_em_trechos(texto: str, max_tokens: int = RESUMO_TRECHO_TOKENS) -> List[str]:
+    """Agrupa parágrafos em trechos de até max_tokens; parágrafos maiores são cortados por frases ou caracteres"""
+    max_caracteres = max_tokens * 4
+    partes: List[str] = []
+    for paragrafo in texto.split("\n\n"):
+        if len(paragrafo) <= max_caracteres:
+            partes.append(paragrafo)
+            continue
+        for frase in re.split(r"(?<=[.!?;])\s+", paragrafo):
+            partes.extend(frase[i:i + max_caracteres] for i in range(0, len(frase), max_caracteres))
+
+    trechos: List[str] = []
+    atual = ""
+    for parte in partes:
+        if atual and len(atual) + len(parte) + 2 > max_caracteres:
+            trechos.append(atual)
+            atual = parte
+        else:
+            atual = f"{atual}\n\n{parte}" if atual else parte
+    if atual:
+        trechos.append(atual)
+    return trechos
+
+
+async def resumir_descricao_longa(client, descricao: str, *, model: str, orcamento: float,
+                                  modo: str = RESUMO_TRECHOS_MODO, max_chamadas: int = RESUMO_VAGA_MAX_CHAMADAS) -> str:
+    """
+    Map-reduce da descrição: os resumos dos trechos são concatenados para o prompt final. Com
+    modo "gemini", até max_chamadas trechos fora do cache são resumidos em paralelo (com concorrência
+    limitada); os demais, os que falharem e, no modo "local", todos entram cortados no lugar do resumo.
+    """
+    trechos = dividir_em_trechos(descricao)
+    if len(trechos) > RESUMO_VAGA_MAX_TRECHOS:
+        estatisticas_prompt.trechos_descartados += len(trechos) - RESUMO_VAGA_MAX_TRECHOS
+        log.warning("Descrição com trechos demais; o excedente será descartado",
+                    extra={"trechos": len(trechos), "max_trechos": RESUMO_VAGA_MAX_TRECHOS})
+        trechos = trechos[:RESUMO_VAGA_MAX_TRECHOS]
+
+    semaforo = asyncio.Semaphore(max(1, RESUMO_VAGA_CONCORRENCIA))
+    caracteres_por_trecho = RESUMO_VAGA_LIMITE_TOKENS * 4 // len(trechos)
+    chamadas_restantes = max_chamadas if modo == "gemini" else 0
+
+    async def resumir(trecho: str) -> str:
+        nonlocal chamadas_restantes
+        chave = chave_cache("resumo_trecho", trecho)
+        resumo = await cache_trechos.obter(chave)
+        if resumo is not None:
+            return resumo
+        if chamadas_restantes <= 0:
+            estatisticas_prompt.trechos_cortados += 1
+            return trecho[:caracteres_por_trecho]
+        chamadas_restantes -= 1
+        try:
+            async with semaforo:
+                resumo, _ = await gerar_conteudo_com_hedge(
+                    client,
+                    model=model,
+                    contents=f"Trecho de uma vaga de emprego:\n'''{trecho}'''",
+                    config=tipos_gemini().GenerateContentConfig(
+                        system_instruction=(
+                            "Resuma o trecho da vaga em no máximo 8 tópicos curtos, em português, mantendo "
+                            "requisitos, benefícios, salário, jornada e responsabilidades. Ignore textos institucionais."
+                        ),
+                        temperature=0.2,
+                    ),
+                    orcamento=orcamento,
+                )
+        except Exception as e:
+            log.warning("Falha ao resumir trecho da vaga. Usando o trecho cortado.", extra={"detalhe": str(e)})
+            estatisticas_prompt.trechos_cortados += 1
+            return trecho[:caracteres_por_trecho]
+        cache_trechos.gravar(chave, resumo)
+        return resumo
+
+    resumos = await asyncio.gather(*(resumir(trecho) for trecho in trechos))
+    return "\n\n".join(f"Parte {i}:\n{resumo}" for i, resumo in enumerate(resumos, start=1))
+
+
+async def preparar_descricao(client, descricao: str, *, model: str, orcamento: float,
+                             rotulo: Optional[str] = None) -> str:
+    """
+    Deduplica a descrição e estima seus tokens localmente; acima de RESUMO_VAGA_LIMITE_TOKENS,
+    reduz os trechos (cortados ou, com RESUMO_TRECHOS_MODO=gemini, resumidos em paralelo usando até
+    metade do orçamento de latência).
+    """
+    with rastrear("deduplicar_descricao"):
+        descricao = deduplicar_paragrafos(descricao)
+        tokens = estimar_tokens(descricao)
+    if tokens <= RESUMO_VAGA_LIMITE_TOKENS:
+        estatisticas_prompt.registrar(tokens)
+        log.debug("Descrição dentro do limite", extra={"rotulo": rotulo, "tokens_estimados": tokens})
+        return descricao
+
+    trechos = len(dividir_em_trechos(descricao))
+    estatisticas_prompt.registrar(tokens, trechos)
+    log.info("Descrição acima do limite; resumindo em trechos",
+             extra={"rotulo": rotulo, "tokens_estimados": tokens, "trechos": trechos, "modo": RESUMO_TRECHOS_MODO})
+    with rastrear("resumir_trechos"):
+        return await resumir_descricao_longa(client, descricao, model=model, orcamento=orcamento / 2)
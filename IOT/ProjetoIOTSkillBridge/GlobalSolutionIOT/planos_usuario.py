@@ -0,0 +1,158 @@
+"""
+Repositório de planos por usuário
+Guarda o plano gerado para cada versão do perfil do usuário (como a tabela recomendacao_ia do banco),
+com ETag para que a API Java só baixe o plano quando ele mudar
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from estado_compartilhado import ESTADO_DIR, EstadoCompartilhado
+
+
+PLANOS_SQLITE_PATH = os.getenv("PLANOS_SQLITE_PATH", os.path.join(ESTADO_DIR, "planos_usuario.db"))
+# Versões mantidas por usuário; as mais antigas são removidas
+PLANOS_VERSOES_MANTIDAS = int(os.getenv("PLANOS_VERSOES_MANTIDAS", "5"))
+# Intervalo mínimo entre duas contagens da tabela para o /health e o /metrics
+PLANOS_ESTATISTICAS_TTL_SEGUNDOS = 30.0
+
+TIPOS_ATUALIZACAO = ("inalterado", "ajuste", "etapas", "completo")
+
+
+def calcular_etag(conteudo: str) -> str:
+    """ETag forte do corpo JSON da resposta"""
+    return '"' + hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    """True se o header If-None-Match contém a ETag (ou "*"); a comparação fraca ignora o prefixo W/"""
+    if not if_none_match:
+        return False
+    candidatos = {valor.strip().removeprefix("W/") for valor in if_none_match.split(",")}
+    return "*" in candidatos or etag in candidatos
+
+
+class VersaoPlano:
+    """Plano de uma versão do perfil, com o JSON já serializado (a resposta usa o texto gravado)"""
+
+    def __init__(self, usuario_id: str, versao: int, perfil: Dict[str, Any], plano_json: str, etag: str,
+                 origem: str, gerado_em: float):
+        self.usuario_id = usuario_id
+        self.versao = versao
+        self.perfil = perfil
+        self.plano_json = plano_json
+        self.etag = etag
+        self.origem = origem
+        self.gerado_em = gerado_em
+
+
+class RepositorioPlanos:
+    """
+    Tabela planos_usuario em SQLite (modo WAL), persistente e compartilhada entre workers.
+
+    obter e gravar acessam o arquivo (gravar espera a trava de escrita de outros workers): o código
+    async os chama com self.estado.executar(), na thread do arquivo.
+
+    origem indica como a versão foi obtida: "completo" (plano gerado do zero), "ajuste" (prazo e
+    horas recalculados a partir da versão anterior) ou "etapas" (só as etapas afetadas regeneradas).
+    """
+
+    def __init__(self, caminho: str = PLANOS_SQLITE_PATH, versoes_mantidas: int = PLANOS_VERSOES_MANTIDAS):
+        self.versoes_mantidas = versoes_mantidas
+        self.estado = EstadoCompartilhado(caminho)
+        self.estado.criar_tabela(
+            """
+            CREATE TABLE IF NOT EXISTS planos_usuario (
+                usuario_id TEXT NOT NULL,
+                versao INTEGER NOT NULL,
+                perfil TEXT NOT NULL,
+                plano TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                origem TEXT NOT NULL,
+                gerado_em REAL NOT NULL,
+                PRIMARY KEY (usuario_id, versao)
+            );
+            """
+        )
+        self.contagens: Dict[str, int] = dict.fromkeys(TIPOS_ATUALIZACAO, 0)
+        self._totais = {"usuarios": 0, "versoes": 0}
+        self._totais_em = float("-inf")
+
+    def _versao(self, linha: tuple) -> VersaoPlano:
+        usuario_id, versao, perfil, plano_json, etag, origem, gerado_em = linha
+        return VersaoPlano(usuario_id, versao, json.loads(perfil), plano_json, etag, origem, gerado_em)
+
+    def obter(self, usuario_id: str, versao: Optional[int] = None) -> Optional[VersaoPlano]:
+        """Versão pedida ou, sem versão, a mais recente do usuário"""
+        colunas = "usuario_id, versao, perfil, plano, etag, origem, gerado_em"
+        if versao is None:
+            linhas = self.estado.consultar(
+                f"SELECT {colunas} FROM planos_usuario WHERE usuario_id = ? ORDER BY versao DESC LIMIT 1", (usuario_id,)
+            )
+        else:
+            linhas = self.estado.consultar(
+                f"SELECT {colunas} FROM planos_usuario WHERE usuario_id = ? AND versao = ?", (usuario_id, versao)
+            )
+        return self._versao(linhas[0]) if linhas else None
+
+    def gravar(self, usuario_id: str, perfil: Dict[str, Any], plano_json: str, origem: str) -> VersaoPlano:
+        """Grava o plano como nova versão do usuário e remove as versões além de PLANOS_VERSOES_MANTIDAS"""
+        etag = calcular_etag(plano_json)
+        agora = time.time()
+        with self.estado.transacao() as conn:
+            ultima = conn.execute(
+                "SELECT COALESCE(MAX(versao), 0) FROM planos_usuario WHERE usuario_id = ?", (usuario_id,)
+            ).fetchone()[0]
+            versao = ultima + 1
+            conn.execute(
+                "INSERT INTO planos_usuario (usuario_id, versao, perfil, plano, etag, origem, gerado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (usuario_id, versao, json.dumps(perfil, ensure_ascii=False), plano_json, etag, origem, agora),
+            )
+            conn.execute(
+                "DELETE FROM planos_usuario WHERE usuario_id = ? AND versao <= ?",
+                (usuario_id, versao - self.versoes_mantidas),
+            )
+        return VersaoPlano(usuario_id, versao, perfil, plano_json, etag, origem, agora)
+
+    def registrar(self, tipo: str):
+        """Conta como a atualização do perfil foi atendida (inalterado, ajuste, etapas ou completo)"""
+        self.contagens[tipo] = self.contagens.get(tipo, 0) + 1
+
+    def _contar(self) -> Dict[str, int]:
+        usuarios, versoes = self.estado.consultar(
+            "SELECT COUNT(DISTINCT usuario_id), COUNT(*) FROM planos_usuario"
+        )[0]
+        return {"usuarios": usuarios, "versoes": versoes}
+
+    async def consultar_estatisticas(self) -> Dict[str, Any]:
+        """
+        Usuários e versões na tabela (de todos os workers) e contagens deste processo. A contagem
+        percorre a tabela inteira: é feita fora do event loop e reaproveitada por alguns segundos.
+        """
+        agora = time.monotonic()
+        if agora - self._totais_em >= PLANOS_ESTATISTICAS_TTL_SEGUNDOS:
+            self._totais_em = agora
+            self._totais = await self.estado.executar(self._contar)
+        return {**self._totais, **self.contagens}
+
+
+_repositorio: Optional[RepositorioPlanos] = None
+
+
+def obter_repositorio_planos() -> RepositorioPlanos:
+    """Repositório de planos do processo, criado na primeira chamada"""
+    global _repositorio
+    if _repositorio is None:
+        _repositorio = RepositorioPlanos()
+    return _repositorio
+
+
+async def estatisticas_planos() -> Dict[str, Any]:
+    """Estatísticas do repositório para o /health e o /metrics, sem criar o arquivo se ele ainda não existir"""
+    if _repositorio is None and not os.path.exists(PLANOS_SQLITE_PATH):
+        return {"usuarios": 0, "versoes": 0, **dict.fromkeys(TIPOS_ATUALIZACAO, 0)}
+    return await obter_repositorio_planos().consultar_estatisticas()
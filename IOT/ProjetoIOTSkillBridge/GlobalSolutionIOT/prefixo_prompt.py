@@ -0,0 +1,169 @@
+"""
+Prefixos estáticos dos prompts
+O texto fixo de cada prompt (papel, tarefas, formato e regras) é montado uma vez, na importação, e vai
+como instrução de sistema; cada requisição monta só o sufixo com os dados do usuário. Com
+GEMINI_CACHE_CONTEXTO=true, o prefixo é registrado no cache de contexto do Gemini (client.caches) uma
+vez por modelo, e as chamadas passam a referenciá-lo pelo nome em vez de reenviá-lo
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from controle_quota import estimar_tokens
+from log_estruturado import obter_logger
+
+
+GEMINI_CACHE_CONTEXTO = os.getenv("GEMINI_CACHE_CONTEXTO", "false").lower() in ("1", "true", "sim")
+# Validade de cada prefixo registrado no Gemini; o registro é renovado um pouco antes de expirar
+GEMINI_CACHE_CONTEXTO_TTL_SEGUNDOS = int(os.getenv("GEMINI_CACHE_CONTEXTO_TTL_SEGUNDOS", "3600"))
+# Prefixos menores que isso não são registrados (a API recusa caches abaixo do mínimo do modelo)
+GEMINI_CACHE_CONTEXTO_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_CONTEXTO_MIN_TOKENS", "1024"))
+MARGEM_RENOVACAO_SEGUNDOS = 60
+# Depois de uma falha ao registrar, o prefixo vai inline por esse tempo antes de uma nova tentativa
+ESPERA_APOS_FALHA_SEGUNDOS = 300
+# Códigos com que o Gemini recusa um cache inexistente, expirado ou de outro modelo
+CODIGOS_CACHE_INVALIDO = (400, 403, 404)
+
+log = obter_logger("prefixo_prompt")
+
+
+class PrefixoPrompt:
+    """Parte fixa de um prompt, com a estimativa de tokens calculada uma única vez"""
+
+    def __init__(self, nome: str, texto: str):
+        self.nome = nome
+        self.texto = texto.strip()
+        self.tokens = estimar_tokens(self.texto)
+        self.versao = hashlib.sha256(self.texto.encode("utf-8")).hexdigest()[:12]
+
+
+class CacheContexto:
+    """
+    Nomes dos caches de contexto (cachedContents/...) registrados no Gemini, por prefixo, modelo e credencial.
+
+    O cache do Gemini é ligado ao modelo e ao projeto da chave, então primário e hedge, e cada
+    credencial do pool (escopo), têm registros próprios; cada worker registra os seus. aplicar() roda nas threads do pool do cliente_gemini: o registro é uma chamada
+    bloqueante feita uma vez por prefixo e modelo, sob uma trava própria de cada par.
+    """
+
+    def __init__(self, ativo: bool = GEMINI_CACHE_CONTEXTO, ttl_segundos: int = GEMINI_CACHE_CONTEXTO_TTL_SEGUNDOS,
+                 min_tokens: int = GEMINI_CACHE_CONTEXTO_MIN_TOKENS):
+        self.ativo = ativo
+        self.ttl_segundos = ttl_segundos
+        self.min_tokens = min_tokens
+        self._trava = threading.Lock()
+        self._travas: Dict[Tuple[str, str, str], threading.Lock] = {}
+        # (versão do prefixo, modelo, escopo) -> (nome do cache, expira_em, cliente que o registrou)
+        self._nomes: Dict[Tuple[str, str, str], Tuple[str, float, Any]] = {}
+        self._indisponivel_ate: Dict[Tuple[str, str, str], float] = {}
+        self._prefixos: Dict[str, PrefixoPrompt] = {}
+        self._contagens: Dict[str, Dict[str, int]] = {}
+
+    def registrar_prefixo(self, prefixo: PrefixoPrompt) -> PrefixoPrompt:
+        self._prefixos[prefixo.nome] = prefixo
+        self._contagens.setdefault(prefixo.nome, {"registros": 0, "referencias": 0, "inline": 0, "falhas": 0,
+                                                  "tokens_reutilizados": 0})
+        return prefixo
+
+    def _contar(self, prefixo: PrefixoPrompt, campo: str, quantidade: int = 1):
+        contagens = self._contagens.setdefault(prefixo.nome, {})
+        contagens[campo] = contagens.get(campo, 0) + quantidade
+
+    def nome_cache(self, client, prefixo: PrefixoPrompt, modelo: str, escopo: str = "") -> Optional[str]:
+        """Nome do cache do prefixo no modelo, registrando-o se preciso; None se o prefixo deve ir inline"""
+        if not self.ativo or prefixo.tokens < self.min_tokens:
+            return None
+        chave = (prefixo.versao, modelo, escopo)
+        with self._trava:
+            trava = self._travas.setdefault(chave, threading.Lock())
+        with trava:
+            agora = time.time()
+            registrado = self._nomes.get(chave)
+            if registrado is not None and registrado[1] - MARGEM_RENOVACAO_SEGUNDOS > agora:
+                return registrado[0]
+            if self._indisponivel_ate.get(chave, 0.0) > agora:
+                return None
+            from cliente_gemini import tipos_gemini
+            try:
+                cache = client.caches.create(
+                    model=modelo,
+                    config=tipos_gemini().CreateCachedContentConfig(
+                        system_instruction=prefixo.texto,
+                        ttl=f"{self.ttl_segundos}s",
+                        display_name=f"skillbridge-{prefixo.nome}-{prefixo.versao}",
+                    ),
+                )
+            except Exception as e:
+                self._indisponivel_ate[chave] = agora + ESPERA_APOS_FALHA_SEGUNDOS
+                self._contar(prefixo, "falhas")
+                log.warning("Prefixo não registrado no cache de contexto; enviando inline",
+                            extra={"prefixo": prefixo.nome, "modelo": modelo, "detalhe": str(e)})
+                return None
+            self._nomes[chave] = (cache.name, agora + self.ttl_segundos, client)
+            self._contar(prefixo, "registros")
+            log.info("Prefixo registrado no cache de contexto",
+                     extra={"prefixo": prefixo.nome, "modelo": modelo, "escopo": escopo, "cache": cache.name,
+                            "tokens": prefixo.tokens})
+            return cache.name
+
+    def invalidar(self, prefixo: PrefixoPrompt, modelo: str, escopo: str = ""):
+        """Esquece o registro (ex.: o Gemini respondeu que o cache não existe mais); o próximo uso registra de novo"""
+        with self._trava:
+            self._nomes.pop((prefixo.versao, modelo, escopo), None)
+
+    def aplicar(self, client, modelo: str, config, prefixo: Optional[PrefixoPrompt], usar_cache: bool = True,
+                escopo: str = ""):
+        """
+        Configuração da chamada com o prefixo: referência ao cache (cached_content, sem
+        system_instruction, como a API exige) ou o texto inline como instrução de sistema.
+        """
+        if prefixo is None:
+            return config
+        from cliente_gemini import tipos_gemini
+        config = config if config is not None else tipos_gemini().GenerateContentConfig()
+        nome = self.nome_cache(client, prefixo, modelo, escopo) if usar_cache else None
+        if nome is None:
+            self._contar(prefixo, "inline")
+            return config.model_copy(update={"system_instruction": prefixo.texto, "cached_content": None})
+        self._contar(prefixo, "referencias")
+        return config.model_copy(update={"system_instruction": None, "cached_content": nome})
+
+    def registrar_uso(self, prefixo: Optional[PrefixoPrompt], tokens_cache: Optional[int]):
+        """Tokens do prompt atendidos pelo cache, informados pelo Gemini em usage_metadata"""
+        if prefixo is not None and tokens_cache:
+            self._contar(prefixo, "tokens_reutilizados", tokens_cache)
+
+    def liberar(self):
+        """Remove do Gemini os caches registrados pelo processo (o armazenamento é cobrado até expirarem)"""
+        with self._trava:
+            registros = [(nome, client) for nome, _, client in self._nomes.values()]
+            self._nomes.clear()
+        for nome, client in registros:
+            try:
+                client.caches.delete(name=nome)
+            except Exception as e:
+                log.warning("Cache de contexto não removido", extra={"cache": nome, "detalhe": str(e)})
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        with self._trava:
+            registrados = [versao for versao, _, _ in self._nomes]
+        return {
+            nome: {
+                "ativo": self.ativo and prefixo.tokens >= self.min_tokens,
+                "tokens_estimados": prefixo.tokens,
+                "modelos_registrados": registrados.count(prefixo.versao),
+                **self._contagens.get(nome, {}),
+            }
+            for nome, prefixo in self._prefixos.items()
+        }
+
+
+cache_contexto = CacheContexto()
+
+
+def prefixo_prompt(nome: str, texto: str) -> PrefixoPrompt:
+    """Prefixo pré-montado e registrado nas estatísticas do cache de contexto"""
+    return cache_contexto.registrar_prefixo(PrefixoPrompt(nome, texto))
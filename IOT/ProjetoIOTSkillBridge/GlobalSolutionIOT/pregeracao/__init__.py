@@ -0,0 +1,10 @@
+"""
+Pré-geração do cache aquecido
+Agrupa os perfis dos usuários exportados (dataset NoSQL ou exportação da tabela usuario) em perfis
+canônicos, gera planos e recomendações para os grupos mais populares dentro de um orçamento de quota e
+grava o arquivo que o serviço mapeia na inicialização (cache_aquecido.py)
+
+Uso (a partir de GlobalSolutionIOT/):
+    python -m pregeracao ../../../bancodedados/nosql/dataset.json --max-chamadas 200
+    python -m pregeracao usuarios.csv --saida cache_aquecido.bin --rpm 5 --max-tokens 500000
+"""
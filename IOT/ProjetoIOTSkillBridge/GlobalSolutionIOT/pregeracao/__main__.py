@@ -0,0 +1,70 @@
+"""
+Linha de comando da pré-geração: python -m pregeracao USUARIOS [opções]
+O progresso sai no stderr, um item por linha; o relatório JSON (itens gerados, pendentes, chamadas,
+tokens e custo estimado) sai no stdout
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+# Os módulos do serviço são importados pelo nome, a partir de GlobalSolutionIOT/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Avisos de fallback a cada item misturariam o log ao progresso (defina LOG_NIVEL para vê-los)
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+
+from cache_aquecido import CACHE_AQUECIDO_PATH  # noqa: E402
+from pregeracao.execucao import NIVEIS_PADRAO, executar_pregeracao  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pregeracao", description=__doc__)
+    parser.add_argument("usuarios", help="dataset.json, saída do exportar_dataset_json ou CSV da tabela usuario")
+    parser.add_argument("--saida", default=CACHE_AQUECIDO_PATH or "cache_aquecido.bin",
+                        help="arquivo do cache aquecido (padrão CACHE_AQUECIDO_PATH)")
+    parser.add_argument("--progresso", default=None, help="arquivo de progresso (padrão: SAIDA.progresso.jsonl)")
+    parser.add_argument("--reiniciar", action="store_true", help="descarta o progresso e gera todos os itens de novo")
+    parser.add_argument("--niveis", default=",".join(NIVEIS_PADRAO), help="níveis com plano pré-gerado, separados por vírgula")
+    parser.add_argument("--horas-semana", type=int, default=10)
+    parser.add_argument("--prazo-meses", type=int, default=6)
+    parser.add_argument("--idade", type=int, default=25, help="idade do perfil canônico das recomendações")
+    parser.add_argument("--formacao", default="Não informado", help="formação do perfil canônico das recomendações")
+    parser.add_argument("--max-grupos", type=int, default=None, help="só os N grupos com mais usuários")
+    parser.add_argument("--min-usuarios", type=int, default=1, help="ignora grupos com menos usuários que isso")
+    parser.add_argument("--concorrencia", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="chamadas por minuto por modelo (padrão: limite de GEMINI_LIMITES somado entre os projetos)")
+    parser.add_argument("--max-chamadas", type=int, default=None, help="orçamento de chamadas ao Gemini da execução")
+    parser.add_argument("--max-tokens", type=int, default=None, help="orçamento de tokens do Gemini da execução")
+    parser.add_argument("--preco-milhao-tokens", type=float, default=None, help="preço por milhão de tokens, para o custo estimado")
+    parser.add_argument("--orcamento-segundos", type=float, default=60.0, help="orçamento de latência de cada item")
+    args = parser.parse_args(argv)
+
+    relatorio = asyncio.run(executar_pregeracao(
+        usuarios=args.usuarios,
+        saida=args.saida,
+        progresso=args.progresso,
+        reiniciar=args.reiniciar,
+        niveis=[nivel.strip() for nivel in args.niveis.split(",") if nivel.strip()],
+        horas_semana=args.horas_semana,
+        prazo_meses=args.prazo_meses,
+        idade=args.idade,
+        formacao=args.formacao,
+        max_grupos=args.max_grupos,
+        min_usuarios=args.min_usuarios,
+        concorrencia=args.concorrencia,
+        rpm=args.rpm,
+        max_chamadas=args.max_chamadas,
+        max_tokens=args.max_tokens,
+        preco_milhao_tokens=args.preco_milhao_tokens,
+        orcamento=args.orcamento_segundos,
+    ))
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    return 0 if relatorio["resultado"]["pendentes"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Execução da pré-geração
+Gera os itens (plano por nível e recomendações de cada grupo) pelo mesmo caminho das requisições do
+serviço, em paralelo e no ritmo da quota configurada, e registra cada item concluído em um arquivo de
+progresso; uma nova execução retoma os pendentes. Ao final, os itens concluídos são mesclados ao
+arquivo do cache aquecido
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from pregeracao.perfis import agrupar_perfis, ler_usuarios, objetivo_do_catalogo
+
+
+# Camadas em que a resposta veio do Gemini (agora ou antes, por cache); as demais são fallbacks
+CAMADAS_GERADAS = ("primario", "hedge", "cache", "cache_semantico")
+# Modelo usado por cada tipo de item, para o ritmo de chamadas
+MODELOS = {"plano_estudos": "gemini-2.0-flash-exp", "recomendacoes": "gemini-2.5-flash"}
+NIVEIS_PADRAO = ("Iniciante", "Intermediário", "Avançado")
+
+
+class Progresso:
+    """Itens concluídos, um JSON por linha (uma linha incompleta no fim, de uma execução interrompida, é ignorada)"""
+
+    def __init__(self, caminho: str, reiniciar: bool = False):
+        self.caminho = caminho
+        self.itens: Dict[str, Dict[str, Any]] = {}
+        if reiniciar and os.path.exists(caminho):
+            os.remove(caminho)
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        continue
+                    self.itens[registro["id"]] = registro
+
+    def registrar(self, registro: Dict[str, Any]):
+        with open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.itens[registro["id"]] = registro
+
+
+class Ritmo:
+    """Espaça o início das chamadas de um modelo para no máximo `rpm` por minuto"""
+
+    def __init__(self, rpm: float):
+        self.intervalo = 60 / rpm if rpm > 0 else 0.0
+        self._proximo = 0.0
+        self._trava = asyncio.Lock()
+
+    async def aguardar(self):
+        async with self._trava:
+            loop = asyncio.get_running_loop()
+            espera = self._proximo - loop.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._proximo = max(self._proximo, loop.time()) + self.intervalo
+
+
+def rpm_configurado(modelo: str) -> int:
+    """Soma dos limites de rpm dos projetos do pool de credenciais para o modelo"""
+    from controle_quota import LIMITES_MODELOS, LIMITES_PADRAO
+    from credenciais_gemini import obter_pool
+
+    por_projeto: Dict[Optional[str], int] = {}
+    for credencial in obter_pool().credenciais:
+        if credencial.permite(modelo):
+            limites = credencial.limites.get(modelo) or LIMITES_MODELOS.get(modelo, LIMITES_PADRAO["gemini-2.5-flash"])
+            por_projeto[credencial.projeto] = limites["rpm"]
+    return sum(por_projeto.values())
+
+
+def _chave_entrada(entrada: Dict[str, Any]):
+    """Perfil de uma entrada do arquivo: duas entradas com a mesma chave respondem às mesmas consultas"""
+    return entrada["namespace"], entrada["particao"], tuple(sorted(entrada["termos"]))
+
+
+def _uso_gemini() -> Dict[str, int]:
+    from credenciais_gemini import obter_pool
+    estatisticas = obter_pool().estatisticas().values()
+    return {"chamadas": sum(dados["chamadas"] for dados in estatisticas),
+            "tokens": sum(dados["tokens"] for dados in estatisticas)}
+
+
+async def executar_pregeracao(*, usuarios: str, saida: str, progresso: Optional[str] = None, reiniciar: bool = False,
+                              niveis=NIVEIS_PADRAO, horas_semana: int = 10, prazo_meses: int = 6, idade: int = 25,
+                              formacao: str = "Não informado", max_grupos: Optional[int] = None, min_usuarios: int = 1,
+                              concorrencia: int = 4, rpm: Optional[float] = None, max_chamadas: Optional[int] = None,
+                              max_tokens: Optional[int] = None, preco_milhao_tokens: Optional[float] = None,
+                              orcamento: float = 60.0) -> Dict[str, Any]:
+    """Executa (ou retoma) a pré-geração e retorna o relatório (dict serializável em JSON)"""
+    os.environ.setdefault("GEMINI_AQUECER", "false")
+    import cache_aquecido
+    from cache_aquecido import NOME_CANONICO, ArmazemAquecido, gravar_armazem, ler_armazem, termos_aquecidos
+    # O serviço montado aqui não consulta o arquivo anterior (o caminho padrão já foi lido na importação
+    # do módulo): os itens pendentes são gerados de novo, não copiados dele
+    cache_aquecido._armazem = ArmazemAquecido("")
+    import gerar_plano_estudos as plano
+    import main
+    from cache_respostas import chave_cache, normalizar
+    from indice_catalogo import obter_indice
+
+    if not main.client.configurado:
+        raise SystemExit("GEMINI_API_KEY (ou GEMINI_CREDENCIAIS) não configurada: sem o Gemini, só haveria fallbacks")
+
+    inicio = time.perf_counter()
+    indice = obter_indice()
+    lidos = ler_usuarios(usuarios)
+    grupos = [grupo for grupo in agrupar_perfis(lidos) if grupo.usuarios >= min_usuarios][:max_grupos]
+
+    itens: List[Dict[str, Any]] = []
+    for grupo in grupos:
+        competencias = grupo.competencias()
+        objetivo = grupo.objetivo() or objetivo_do_catalogo(indice, competencias)
+        for nivel in niveis:
+            request = {"objetivo_carreira": objetivo, "nivel_atual": nivel, "competencias_atuais": competencias,
+                       "tempo_disponivel_semana": horas_semana, "prazo_meses": prazo_meses}
+            itens.append({"id": chave_cache("plano_estudos", request), "namespace": "plano_estudos",
+                          "usuarios": grupo.usuarios, "request": request})
+        perfil = {"nome": NOME_CANONICO, "idade": idade, "nivel_formacao": formacao, "objetivos": objetivo,
+                  "habilidades": competencias, "interesses": []}
+        itens.append({"id": chave_cache("recomendacoes", perfil, indice.versao), "namespace": "recomendacoes",
+                      "usuarios": grupo.usuarios, "request": perfil})
+
+    registro_progresso = Progresso(progresso or f"{saida}.progresso.jsonl", reiniciar)
+    concluidos_antes = sum(1 for item in itens if item["id"] in registro_progresso.itens)
+    pendentes = [item for item in itens if item["id"] not in registro_progresso.itens]
+    ritmos = {modelo: Ritmo(rpm if rpm is not None else rpm_configurado(modelo)) for modelo in set(MODELOS.values())}
+    uso_inicial = _uso_gemini()
+    semaforo = asyncio.Semaphore(concorrencia)
+    contagens = {"gerados": 0, "falhas": 0, "nao_iniciados": 0, "em_andamento": 0}
+    camadas: Dict[str, int] = {}
+    interrompido = False
+
+    def orcamento_esgotado() -> bool:
+        # Itens em andamento contam como uma chamada a mais, para a concorrência não estourar o orçamento
+        uso = _uso_gemini()
+        chamadas = uso["chamadas"] - uso_inicial["chamadas"] + contagens["em_andamento"]
+        return ((max_chamadas is not None and chamadas >= max_chamadas)
+                or (max_tokens is not None and uso["tokens"] - uso_inicial["tokens"] >= max_tokens))
+
+    async def gerar(item: Dict[str, Any]):
+        async with semaforo:
+            if orcamento_esgotado():
+                contagens["nao_iniciados"] += 1
+                return
+            contagens["em_andamento"] += 1
+            await ritmos[MODELOS[item["namespace"]]].aguardar()
+            inicio_item = time.perf_counter()
+            try:
+                if item["namespace"] == "plano_estudos":
+                    request = plano.PlanoEstudosRequest(**item["request"])
+                    gerado, camada = await plano.gerar_plano_estudos_com_camada(request, orcamento=orcamento)
+                    registro = {"particao": normalizar(request.nivel_atual), "valor": gerado.model_dump(),
+                                "meta": item["request"],
+                                "termos": sorted(termos_aquecidos(request.objetivo_carreira, request.competencias_atuais))}
+                else:
+                    perfil = main.PerfilUsuario(**item["request"])
+                    resposta, camada = await main.gerar_recomendacoes_com_camada(perfil, orcamento=orcamento)
+                    registro = {"particao": main.particao_recomendacoes(indice, resposta), "valor": resposta["recomendacoes"],
+                                "meta": NOME_CANONICO,
+                                "termos": sorted(termos_aquecidos(perfil.objetivos, perfil.habilidades))}
+            except Exception as e:
+                camada, registro = f"erro:{type(e).__name__}", None
+            finally:
+                contagens["em_andamento"] -= 1
+            camadas[camada] = camadas.get(camada, 0) + 1
+            if registro is not None and camada in CAMADAS_GERADAS:
+                registro_progresso.registrar({"id": item["id"], "namespace": item["namespace"], "camada": camada,
+                                              "usuarios": item["usuarios"], **registro})
+                contagens["gerados"] += 1
+            else:
+                contagens["falhas"] += 1
+            feitos = contagens["gerados"] + contagens["falhas"]
+            print(f"[{feitos}/{len(pendentes)}] {item['namespace']} {item['request'].get('objetivo_carreira') or item['request']['objetivos']}"
+                  f" {item['request'].get('nivel_atual', '')} -> {camada} ({time.perf_counter() - inicio_item:.1f}s)",
+                  file=sys.stderr)
+
+    try:
+        await asyncio.gather(*(gerar(item) for item in pendentes))
+    except asyncio.CancelledError:
+        # Ctrl+C: o que já foi concluído está no progresso e vai para o arquivo
+        interrompido = True
+
+    # O arquivo é mesclado, não substituído: entradas anteriores (de outras execuções ou de outra base)
+    # continuam, e as geradas agora substituem as do mesmo perfil
+    ids = {item["id"] for item in itens}
+    concluidos = [registro for identificador, registro in registro_progresso.itens.items() if identificador in ids]
+    anteriores = ler_armazem(saida)
+    mescladas = {_chave_entrada(entrada): entrada for entrada in anteriores}
+    novas = sum(1 for registro in concluidos if _chave_entrada(registro) not in mescladas)
+    for registro in concluidos:
+        mescladas[_chave_entrada(registro)] = registro
+    entradas = list(mescladas.values())
+    if contagens["gerados"] or novas or not os.path.exists(saida):
+        tamanho = gravar_armazem(saida, entradas, {
+            "usuarios": len(lidos), "grupos": len(grupos), "catalogo": indice.versao, "niveis": list(niveis),
+        })
+    else:
+        # Nada novo: o arquivo em uso pelo serviço fica como está
+        tamanho = os.path.getsize(saida)
+    uso = _uso_gemini()
+    tokens = uso["tokens"] - uso_inicial["tokens"]
+    cobertos = sum(grupo.usuarios for grupo in grupos)
+    return {
+        "tipo": "pregeracao",
+        "parametros": {
+            "usuarios": usuarios,
+            "saida": saida,
+            "niveis": list(niveis),
+            "max_grupos": max_grupos,
+            "min_usuarios": min_usuarios,
+            "concorrencia": concorrencia,
+            "rpm": {modelo: round(60 / ritmo.intervalo, 2) if ritmo.intervalo else None for modelo, ritmo in ritmos.items()},
+            "max_chamadas": max_chamadas,
+            "max_tokens": max_tokens,
+        },
+        "resultado": {
+            "usuarios": len(lidos),
+            "grupos": len(grupos),
+            "cobertura_usuarios": round(cobertos / len(lidos), 4) if lidos else 0.0,
+            "itens": len(itens),
+            "concluidos_antes": concluidos_antes,
+            "gerados": contagens["gerados"],
+            "falhas": contagens["falhas"],
+            "pendentes": len(itens) - len(concluidos),
+            "nao_iniciados_por_orcamento": contagens["nao_iniciados"],
+            "interrompido": interrompido,
+            "camadas": camadas,
+            "chamadas_gemini": uso["chamadas"] - uso_inicial["chamadas"],
+            "tokens_gemini": tokens,
+            "custo_estimado": round(tokens / 1_000_000 * preco_milhao_tokens, 4) if preco_milhao_tokens is not None else None,
+            "duracao_s": round(time.perf_counter() - inicio, 3),
+            "entradas_arquivo": len(entradas),
+            "entradas_anteriores": len(anteriores),
+            "bytes_arquivo": tamanho,
+        },
+    }
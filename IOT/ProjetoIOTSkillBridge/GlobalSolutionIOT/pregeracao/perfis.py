@@ -0,0 +1,105 @@
+"""
+Leitura e agrupamento dos perfis
+Usuários do dataset (bancodedados/nosql/dataset.json), da saída do exportar_dataset_json (DBMS_OUTPUT)
+ou de um CSV da tabela usuario, agrupados pela mesma similaridade que o cache aquecido usa na consulta
+"""
+
+import csv
+import io
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from cache_aquecido import CACHE_AQUECIDO_LIMIAR, termos_aquecidos
+from cache_respostas import normalizar
+from cache_semantico import jaccard
+from indice_catalogo import IndiceCatalogo
+
+
+def ler_usuarios(caminho: str) -> List[Dict[str, Any]]:
+    """Usuários com competências, como {"competencias": [...], "objetivo": str ou None}"""
+    with open(caminho, encoding="utf-8") as arquivo:
+        texto = arquivo.read()
+    if caminho.lower().endswith(".csv"):
+        registros = [
+            {chave.strip().lower(): valor for chave, valor in linha.items() if chave}
+            for linha in csv.DictReader(io.StringIO(texto))
+        ]
+    else:
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            # O DBMS_OUTPUT quebra o JSON em linhas de até 25000 caracteres
+            dados = json.loads("".join(texto.splitlines()))
+        registros = dados.get("usuarios", []) if isinstance(dados, dict) else dados
+
+    usuarios = []
+    for registro in registros:
+        competencias = [competencia.strip() for competencia in str(registro.get("competencias") or "").split(",")
+                        if competencia.strip()]
+        if not competencias:
+            continue
+        objetivo = str(registro.get("objetivo_carreira") or registro.get("objetivoCarreira") or "").strip()
+        usuarios.append({"competencias": competencias, "objetivo": objetivo or None})
+    return usuarios
+
+
+class GrupoPerfis:
+    """
+    Usuários com perfis parecidos. O primeiro (o perfil mais frequente) define os termos do grupo;
+    o perfil canônico tem as competências de pelo menos metade dos usuários e o objetivo mais comum.
+    """
+
+    def __init__(self, termos: Set[str]):
+        self.termos = termos
+        self.usuarios = 0
+        # competência normalizada -> grafias encontradas
+        self._competencias: Dict[str, Counter] = {}
+        self._objetivos: Counter = Counter()
+
+    def adicionar(self, usuario: Dict[str, Any]):
+        self.usuarios += 1
+        for competencia in dict.fromkeys(usuario["competencias"]):
+            self._competencias.setdefault(normalizar(competencia), Counter())[competencia] += 1
+        if usuario["objetivo"]:
+            self._objetivos[usuario["objetivo"]] += 1
+
+    def competencias(self) -> List[str]:
+        """Competências de pelo menos metade do grupo, das mais frequentes para as menos (grafia mais usada)"""
+        frequentes = [grafias for grafias in self._competencias.values() if sum(grafias.values()) * 2 >= self.usuarios]
+        frequentes.sort(key=lambda grafias: -sum(grafias.values()))
+        return [grafias.most_common(1)[0][0] for grafias in frequentes]
+
+    def objetivo(self) -> Optional[str]:
+        return self._objetivos.most_common(1)[0][0] if self._objetivos else None
+
+
+def agrupar_perfis(usuarios: List[Dict[str, Any]], limiar: float = CACHE_AQUECIDO_LIMIAR) -> List[GrupoPerfis]:
+    """
+    Agrupamento guloso pela similaridade de Jaccard entre os termos de objetivo e competências:
+    os perfis mais frequentes abrem os grupos, e cada usuário entra no grupo mais parecido acima do
+    limiar. Retorna os grupos do mais popular para o menos.
+    """
+    termos = [termos_aquecidos(usuario["objetivo"], usuario["competencias"]) for usuario in usuarios]
+    frequencias = Counter(frozenset(termos_usuario) for termos_usuario in termos)
+    ordem = sorted(range(len(usuarios)), key=lambda indice: -frequencias[frozenset(termos[indice])])
+
+    grupos: List[GrupoPerfis] = []
+    for indice in ordem:
+        melhor, similaridade_melhor = None, limiar
+        for grupo in grupos:
+            similaridade = jaccard(termos[indice], grupo.termos)
+            if similaridade >= similaridade_melhor:
+                melhor, similaridade_melhor = grupo, similaridade
+        if melhor is None:
+            melhor = GrupoPerfis(termos[indice])
+            grupos.append(melhor)
+        melhor.adicionar(usuarios[indice])
+    grupos.sort(key=lambda grupo: -grupo.usuarios)
+    return grupos
+
+
+def objetivo_do_catalogo(indice: IndiceCatalogo, competencias: List[str]) -> str:
+    """Objetivo para grupos sem objetivo_carreira (o dataset NoSQL não traz): a vaga do catálogo mais aderente"""
+    vagas = indice.recomendar(competencias, [], "", top_k=1)["vagas"]
+    return vagas[0]["titulo"] if vagas else f"Profissional de {competencias[0]}"
@@ -0,0 +1,191 @@
+"""
+Ranking de vagas para um perfil
+Compara uma lista de vagas com as habilidades e interesses do usuário em uma única passada local, sem
+chamar o Gemini: cada vaga vira uma linha da matriz vaga x habilidade (bits de um inteiro), e a
+cobertura e as lacunas saem de operações de bits entre a linha da vaga e a máscara do perfil
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from digest_vaga import LIMIAR_ADEQUADO, LIMIAR_PARCIAL
+from indice_catalogo import IndiceCatalogo, tokenizar
+from metricas import rastrear
+
+
+# Vagas aceitas por requisição e quantas das primeiras podem ser resumidas pelo Gemini
+RANKING_MAX_VAGAS = int(os.getenv("RANKING_MAX_VAGAS", "200"))
+RANKING_MAX_RESUMOS = int(os.getenv("RANKING_MAX_RESUMOS", "3"))
+# Lacunas mais frequentes no conjunto de vagas devolvidas na resposta
+RANKING_LACUNAS_TOP = 5
+# Peso da cobertura de habilidades e da afinidade com os interesses na pontuação da vaga
+PESOS_RANKING = {"habilidades": 0.7, "interesses": 0.3}
+
+# Habilidades reconhecidas nas descrições além dos requisitos do catálogo e das habilidades do perfil
+HABILIDADES_BASE = (
+    "Java", "Python", "JavaScript", "TypeScript", "C#", "C++", "Kotlin", "Swift", "PHP", "Ruby",
+    "SQL", "NoSQL", "MongoDB", "PostgreSQL", "MySQL", "Oracle", "Spring Boot", "Node.js", "React",
+    "Angular", "Vue", "HTML", "CSS", "REST", "APIs", "Git", "Docker", "Kubernetes", "Linux", "AWS",
+    "Azure", "GCP", "CI/CD", "Testes automatizados", "Excel", "Power BI", "Machine Learning", "Scrum",
+    "Inglês", "Espanhol", "Comunicação", "Liderança",
+)
+
+
+class LexicoHabilidades:
+    """
+    Habilidades reconhecíveis nas vagas, cada uma com seus termos normalizados. Uma habilidade aparece
+    na vaga quando todos os seus termos aparecem no texto; contidas[i] marca as habilidades cujos
+    termos são subconjunto estrito dos de i ("Cloud" em "Cloud Functions"), descartadas quando i aparece.
+    """
+
+    def __init__(self, nomes: Iterable[str] = ()):
+        self.nomes: List[str] = []
+        self.termos: List[frozenset] = []
+        self.contidas: List[int] = []
+        self._posicoes: Dict[frozenset, int] = {}
+        for nome in nomes:
+            self.adicionar(nome)
+
+    def adicionar(self, nome: str) -> Optional[int]:
+        """Inclui a habilidade (se tiver termos e ainda não existir) e devolve sua posição"""
+        termos = frozenset(tokenizar(nome))
+        if not termos:
+            return None
+        if termos in self._posicoes:
+            return self._posicoes[termos]
+        posicao = len(self.nomes)
+        contidas = 0
+        for indice, outros in enumerate(self.termos):
+            if outros < termos:
+                contidas |= 1 << indice
+            elif termos < outros:
+                self.contidas[indice] |= 1 << posicao
+        self.nomes.append(nome.strip())
+        self.termos.append(termos)
+        self.contidas.append(contidas)
+        self._posicoes[termos] = posicao
+        return posicao
+
+    def copiar(self) -> "LexicoHabilidades":
+        copia = LexicoHabilidades()
+        copia.nomes = list(self.nomes)
+        copia.termos = list(self.termos)
+        copia.contidas = list(self.contidas)
+        copia._posicoes = dict(self._posicoes)
+        return copia
+
+
+_lexico: Optional[Tuple[str, LexicoHabilidades]] = None
+
+
+def obter_lexico(indice: IndiceCatalogo) -> LexicoHabilidades:
+    """Léxico base (HABILIDADES_BASE + requisitos das vagas do catálogo), refeito quando o catálogo muda"""
+    global _lexico
+    if _lexico is None or _lexico[0] != indice.versao:
+        requisitos = [
+            requisito
+            for vaga in indice.tipos["vagas"].itens
+            for requisito in str(vaga.get("requisitos") or "").split(",")
+        ]
+        _lexico = (indice.versao, LexicoHabilidades([*HABILIDADES_BASE, *requisitos]))
+    return _lexico[1]
+
+
+def _bits(mascara: int) -> Iterable[int]:
+    """Posições dos bits ligados, do menor para o maior"""
+    while mascara:
+        menor = mascara & -mascara
+        yield menor.bit_length() - 1
+        mascara ^= menor
+
+
+def classificar_adequacao(cobertura: Optional[float]) -> str:
+    if cobertura is None:
+        return "nao_avaliada"
+    return "adequado" if cobertura >= LIMIAR_ADEQUADO else "parcial" if cobertura >= LIMIAR_PARCIAL else "inadequado"
+
+
+@rastrear("ranquear_vagas")
+def ranquear_vagas(vagas: Sequence[Tuple[str, str]], habilidades: List[str], interesses: List[str],
+                   lexico_base: LexicoHabilidades) -> Dict[str, Any]:
+    """
+    Ranqueia as vagas (título, descrição) para o perfil.
+
+    As habilidades do perfil entram no léxico, então o que o usuário declara sempre é reconhecido.
+    O perfil possui uma habilidade do léxico quando todos os termos de alguma das suas habilidades
+    estão nela (mesma regra de avaliar_perfil_local). Cobertura é a fração das habilidades da vaga que
+    o perfil possui; afinidade, a fração dos termos dos interesses que aparecem na vaga.
+    """
+    lexico = lexico_base.copiar()
+    termos_habilidades = [frozenset(tokenizar(habilidade)) for habilidade in habilidades]
+    termos_habilidades = [termos for termos in termos_habilidades if termos]
+    for habilidade in habilidades:
+        lexico.adicionar(habilidade)
+
+    # Índice invertido termo -> vagas (bits), montado em uma passada pelos textos
+    termos_vagas: List[set] = []
+    vagas_por_termo: Dict[str, int] = {}
+    for posicao, (titulo, descricao) in enumerate(vagas):
+        termos = set(tokenizar(titulo)) | set(tokenizar(descricao))
+        termos_vagas.append(termos)
+        for termo in termos:
+            vagas_por_termo[termo] = vagas_por_termo.get(termo, 0) | (1 << posicao)
+
+    # Colunas da matriz (vagas que contêm cada habilidade) transpostas em linhas (habilidades de cada vaga)
+    todas = (1 << len(vagas)) - 1
+    linhas = [0] * len(vagas)
+    for habilidade, termos in enumerate(lexico.termos):
+        coluna = todas
+        for termo in termos:
+            coluna &= vagas_por_termo.get(termo, 0)
+            if not coluna:
+                break
+        for posicao in _bits(coluna):
+            linhas[posicao] |= 1 << habilidade
+
+    perfil = 0
+    for habilidade, termos in enumerate(lexico.termos):
+        if any(possuida <= termos for possuida in termos_habilidades):
+            perfil |= 1 << habilidade
+    termos_interesses = {termo for interesse in interesses for termo in tokenizar(interesse)}
+
+    demanda: Dict[int, int] = {}
+    for posicao, linha in enumerate(linhas):
+        contidas = 0
+        for habilidade in _bits(linha):
+            contidas |= lexico.contidas[habilidade]
+        linhas[posicao] = linha = linha & ~contidas
+        for habilidade in _bits(linha):
+            demanda[habilidade] = demanda.get(habilidade, 0) + 1
+
+    def nomes(mascara: int) -> List[str]:
+        return [lexico.nomes[habilidade]
+                for habilidade in sorted(_bits(mascara), key=lambda h: (-demanda.get(h, 0), lexico.nomes[h]))]
+
+    ranking = []
+    lacunas_totais: Dict[int, int] = {}
+    for posicao, linha in enumerate(linhas):
+        atendidas, lacunas = linha & perfil, linha & ~perfil
+        total = linha.bit_count()
+        cobertura = atendidas.bit_count() / total if total else None
+        afinidade = len(termos_interesses & termos_vagas[posicao]) / len(termos_interesses) if termos_interesses else 0.0
+        pontuacao = PESOS_RANKING["habilidades"] * (cobertura or 0.0) + PESOS_RANKING["interesses"] * afinidade
+        for habilidade in _bits(lacunas):
+            lacunas_totais[habilidade] = lacunas_totais.get(habilidade, 0) + 1
+        ranking.append({
+            "indice": posicao,
+            "titulo": vagas[posicao][0],
+            "pontuacao": round(pontuacao, 4),
+            "adequacao": classificar_adequacao(cobertura),
+            "cobertura": round(cobertura, 2) if cobertura is not None else None,
+            "afinidade_interesses": round(afinidade, 2),
+            "habilidades_atendidas": nomes(atendidas),
+            "lacunas": nomes(lacunas),
+        })
+    ranking.sort(key=lambda item: (-item["pontuacao"], item["indice"]))
+
+    frequentes = sorted(lacunas_totais.items(), key=lambda par: (-par[1], lexico.nomes[par[0]]))[:RANKING_LACUNAS_TOP]
+    return {
+        "vagas": ranking,
+        "lacunas_frequentes": [{"habilidade": lexico.nomes[habilidade], "vagas": total} for habilidade, total in frequentes],
+    }
@@ -0,0 +1,83 @@
+"""
+Coalescência de requisições idênticas em andamento (single-flight)
+Chamadas simultâneas com a mesma chave aguardam uma única chamada ao Gemini
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Voo:
+    """Chamada em andamento e quantidade de requisições aguardando por ela"""
+
+    def __init__(self, tarefa: asyncio.Task):
+        self.tarefa = tarefa
+        self.aguardando = 0
+
+
+class TabelaEmVoo:
+    """
+    Tabela de chamadas em andamento indexada pela chave normalizada da requisição.
+
+    - Erros da chamada compartilhada são repassados a todos que aguardam
+    - Uma requisição cancelada (ex.: cliente desconectou) deixa de aguardar sem afetar as outras
+    - A chamada compartilhada só é cancelada quando ninguém mais aguarda por ela
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._em_voo: Dict[str, _Voo] = {}
+        self.chamadas = 0
+        self.coalescidas = 0
+        self.canceladas = 0
+
+    async def executar(self, chave: str, fabrica: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa fabrica() uma única vez para requisições simultâneas com a mesma chave"""
+        voo = self._em_voo.get(chave)
+        if voo is None:
+            voo = _Voo(asyncio.ensure_future(fabrica()))
+            self._em_voo[chave] = voo
+            voo.tarefa.add_done_callback(lambda tarefa: self._finalizar(chave, voo))
+            self.chamadas += 1
+        else:
+            self.coalescidas += 1
+
+        voo.aguardando += 1
+        try:
+            return await asyncio.shield(voo.tarefa)
+        finally:
+            voo.aguardando -= 1
+            if voo.aguardando == 0 and not voo.tarefa.done():
+                voo.tarefa.cancel()
+                self.canceladas += 1
+
+    def _finalizar(self, chave: str, voo: _Voo):
+        """Remove a chamada concluída da tabela"""
+        if self._em_voo.get(chave) is voo:
+            del self._em_voo[chave]
+        # Marca a exceção como recuperada caso todos tenham desistido de aguardar
+        if not voo.tarefa.cancelled():
+            voo.tarefa.exception()
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {
+            "em_andamento": len(self._em_voo),
+            "chamadas": self.chamadas,
+            "coalescidas": self.coalescidas,
+            "canceladas": self.canceladas,
+        }
+
+
+_tabelas: Dict[str, TabelaEmVoo] = {}
+
+
+def obter_tabela(namespace: str) -> TabelaEmVoo:
+    """Retorna a tabela de chamadas em andamento do namespace"""
+    if namespace not in _tabelas:
+        _tabelas[namespace] = TabelaEmVoo(namespace)
+    return _tabelas[namespace]
+
+
+def estatisticas_em_voo() -> Dict[str, Dict[str, int]]:
+    """Estatísticas de todas as tabelas criadas"""
+    return {namespace: tabela.estatisticas() for namespace, tabela in _tabelas.items()}
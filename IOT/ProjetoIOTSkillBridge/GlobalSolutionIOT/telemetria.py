@@ -0,0 +1,82 @@
+"""
+Telemetria do serviço de IA
+Registra qual camada atendeu cada requisição (cache, modelo primário, hedge ou fallback), sua latência
+e os tempos de inicialização do serviço
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+from metricas import registro_metricas
+
+
+# Quantidade de latências recentes mantidas por endpoint/camada para o cálculo de percentis
+TELEMETRIA_AMOSTRAS = 1000
+
+
+def percentil(valores_ordenados, p: float) -> float:
+    """Percentil p (0-100) de uma lista já ordenada, pelo método nearest-rank"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, int(round(p / 100 * len(valores_ordenados) + 0.5)) - 1))
+    return valores_ordenados[indice]
+
+
+class TelemetriaCamadas:
+    """Contadores e latências recentes por endpoint e camada de atendimento"""
+
+    def __init__(self, amostras: int = TELEMETRIA_AMOSTRAS):
+        self.amostras = amostras
+        self._contagens: Dict[Tuple[str, str], int] = {}
+        self._latencias: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def registrar(self, endpoint: str, camada: str, latencia_segundos: float):
+        chave = (endpoint, camada)
+        self._contagens[chave] = self._contagens.get(chave, 0) + 1
+        self._latencias.setdefault(chave, deque(maxlen=self.amostras)).append(latencia_segundos)
+        duracao_camadas.observar(latencia_segundos, endpoint, camada)
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        resultado: Dict[str, Dict[str, Any]] = {}
+        for (endpoint, camada), total in sorted(self._contagens.items()):
+            latencias = sorted(self._latencias[(endpoint, camada)])
+            resultado.setdefault(endpoint, {})[camada] = {
+                "requisicoes": total,
+                "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+                "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+                "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+            }
+        return resultado
+
+
+telemetria_camadas = TelemetriaCamadas()
+
+# Mesmos dados em histograma para o /metrics, e o motivo de cada resposta sem o Gemini
+duracao_camadas = registro_metricas.histograma(
+    "camada_duracao_segundos", "Latência das requisições por endpoint e camada que respondeu", ("endpoint", "camada")
+)
+fallbacks = registro_metricas.contador(
+    "fallback_total", "Respostas sem o Gemini por endpoint e motivo", ("endpoint", "motivo")
+)
+
+
+def registrar_fallback(endpoint: str, motivo: str):
+    """Conta uma resposta de fallback: sem_chave, sobrecarga, quota, timeout, erro, prazo_lote ou prazo_job"""
+    fallbacks.incrementar(endpoint, motivo)
+
+
+class TemposInicializacao:
+    """Duração de cada etapa da inicialização (importação, SDK, aquecimento, primeira chamada ao Gemini)"""
+
+    def __init__(self):
+        self._etapas: Dict[str, float] = {}
+
+    def registrar(self, etapa: str, segundos: float):
+        # Só a primeira ocorrência importa (ex.: a primeira chamada ao Gemini)
+        self._etapas.setdefault(etapa, segundos)
+
+    def estatisticas(self) -> Dict[str, float]:
+        return {f"{etapa}_ms": round(segundos * 1000, 1) for etapa, segundos in self._etapas.items()}
+
+
+tempos_inicializacao = TemposInicializacao()
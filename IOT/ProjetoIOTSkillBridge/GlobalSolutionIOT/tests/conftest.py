@@ -0,0 +1,13 @@
+"""
+Configuração dos testes: os módulos do serviço são importados pelo nome, a partir de GlobalSolutionIOT/,
+e o estado fica em memória (nenhum teste cria arquivos SQLite fora do tmp_path)
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ESTADO_BACKEND", "memoria")
+os.environ.setdefault("CACHE_BACKEND", "memoria")
+os.environ.setdefault("LOG_NIVEL", "ERROR")
@@ -0,0 +1,50 @@
+from cache_aquecido import ArmazemAquecido, gravar_armazem, ler_armazem, termos_aquecidos
+
+
+ENTRADAS = [
+    {
+        "namespace": "plano_estudos",
+        "particao": "iniciante",
+        "termos": termos_aquecidos("Desenvolvedor Backend", ["Java", "SQL", "Git"]),
+        "valor": {"etapas": [{"ordem": 1, "titulo": "Fundamentos de Java"}]},
+        "meta": {"usuarios": 12},
+    },
+    {
+        "namespace": "recomendacoes",
+        "particao": "",
+        "termos": termos_aquecidos("Cientista de Dados", ["Python", "Estatística"]),
+        "valor": {"recomendacoes": "1. Curso recomendado: **Python para Dados**."},
+        "meta": None,
+    },
+]
+
+
+def test_ler_armazem_devolve_o_que_foi_gravado(tmp_path):
+    caminho = str(tmp_path / "cache_aquecido.bin")
+    assert gravar_armazem(caminho, ENTRADAS, {"origem": "teste"}) > 0
+    lidas = ler_armazem(caminho)
+    assert [{**entrada, "termos": set(entrada["termos"])} for entrada in lidas] == ENTRADAS
+
+
+def test_carregar_e_obter(tmp_path):
+    caminho = str(tmp_path / "cache_aquecido.bin")
+    gravar_armazem(caminho, ENTRADAS)
+    armazem = ArmazemAquecido(caminho, limiar=0.8).carregar()
+
+    valor, meta, similaridade = armazem.obter("plano_estudos", "iniciante", ENTRADAS[0]["termos"])
+    assert (valor, meta, similaridade) == (ENTRADAS[0]["valor"], {"usuarios": 12}, 1.0)
+    assert armazem.obter("recomendacoes", "", ENTRADAS[1]["termos"])[0] == ENTRADAS[1]["valor"]
+    assert armazem.obter("plano_estudos", "avancado", ENTRADAS[0]["termos"]) is None
+    assert armazem.obter("resumo_vaga", "", ENTRADAS[0]["termos"]) is None
+    assert set(armazem.estatisticas()) == {"plano_estudos", "recomendacoes"}
+
+
+def test_arquivo_ausente_ou_invalido_deixa_o_cache_vazio(tmp_path):
+    assert ler_armazem(str(tmp_path / "ausente.bin")) == []
+    assert ArmazemAquecido(str(tmp_path / "ausente.bin")).carregar().obter("plano_estudos", "", set()) is None
+
+    invalido = tmp_path / "invalido.bin"
+    invalido.write_bytes(b"nao e um cache aquecido")
+    armazem = ArmazemAquecido(str(invalido)).carregar()
+    assert armazem.obter("plano_estudos", "iniciante", ENTRADAS[0]["termos"]) is None
+    assert armazem.estatisticas() == {}
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from cache_respostas import BackendSQLite, CacheRespostas, chave_cache
+
+
+def test_chave_cache_ignora_maiusculas_espacos_e_ordem():
+    assert chave_cache("plano", {"competencias": ["Java", "SQL"], "objetivo": "Backend  Dev"}) == \
+        chave_cache("plano", {"objetivo": "backend dev", "competencias": ["sql", "java"]})
+    assert chave_cache("plano", "a") != chave_cache("recomendacoes", "a")
+
+
+def test_leitura_nao_escreve_e_ordem_lru_considera_os_acessos(tmp_path):
+    backend = BackendSQLite(str(tmp_path / "cache.db"), max_itens=3)
+    expira_em = time.time() + 60
+    for chave in "abc":
+        backend.gravar("plano", chave, chave, expira_em)
+        time.sleep(0.01)
+
+    alteracoes = backend._conn.total_changes
+    assert backend.obter("plano", "a") == "a"
+    assert backend._conn.total_changes == alteracoes
+
+    backend.gravar("plano", "d", "d", expira_em)
+    assert backend.obter("plano", "b") is None
+    assert [backend.obter("plano", chave) for chave in "acd"] == ["a", "c", "d"]
+
+
+def test_item_expirado_nao_e_retornado(tmp_path):
+    backend = BackendSQLite(str(tmp_path / "cache.db"), max_itens=10)
+    backend.gravar("plano", "a", "a", time.time() - 1)
+    assert backend.obter("plano", "a") is None
+
+
+def test_cache_le_e_grava_o_disco_fora_do_loop(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    worker1 = CacheRespostas("plano", disco=BackendSQLite(caminho, max_itens=10))
+    worker2 = CacheRespostas("plano", disco=BackendSQLite(caminho, max_itens=10))
+
+    worker1.gravar("a", {"etapas": [1, 2]})
+    assert worker1.memoria.obter("plano", "a") == {"etapas": [1, 2]}
+    # a gravação em disco segue na thread do arquivo; espera ela terminar
+    worker1.disco.submeter(lambda: None).result()
+
+    assert asyncio.run(worker2.obter("a")) == {"etapas": [1, 2]}
+    assert asyncio.run(worker2.obter("b")) is None
+    assert (worker2.hits_disco, worker2.misses) == (1, 1)
@@ -0,0 +1,64 @@
+from cache_semantico import CacheSemantico, jaccard, termos_campos, trocar_nome
+
+
+def termos(quantidade, *extras):
+    return {f"competencias:termo{i}" for i in range(quantidade)} | set(extras)
+
+
+def test_termos_campos_prefixa_pelo_campo():
+    resultado = termos_campos(objetivo="Desenvolvedor Backend", competencias=["Java", "SQL"])
+    assert {"competencias:java", "competencias:sql"} <= resultado
+    assert all(termo.split(":", 1)[0] in ("objetivo", "competencias") for termo in resultado)
+
+
+def test_jaccard():
+    assert jaccard(set(), set()) == 1.0
+    assert jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+
+
+def test_mesmos_termos_acertam_com_similaridade_um():
+    cache = CacheSemantico("teste", limiar=0.8)
+    cache.gravar("iniciante", termos(20), "plano", meta={"nome": "Ana"})
+    assert cache.obter("iniciante", termos(20)) == ("plano", {"nome": "Ana"}, 1.0)
+
+
+def test_termos_parecidos_acertam_acima_do_limiar():
+    cache = CacheSemantico("teste", limiar=0.8)
+    cache.gravar("iniciante", termos(20), "plano")
+    valor, _, similaridade = cache.obter("iniciante", termos(19, "competencias:outro"))
+    assert valor == "plano"
+    assert similaridade == 19 / 21
+
+
+def test_abaixo_do_limiar_ou_em_outra_particao_nao_acerta():
+    cache = CacheSemantico("teste", limiar=0.8)
+    cache.gravar("iniciante", termos(20), "plano")
+    assert cache.obter("iniciante", termos(10)) is None
+    assert cache.obter("avancado", termos(20)) is None
+    assert cache.estatisticas()["misses"] == 2
+
+
+def test_remove_a_entrada_menos_usada_acima_do_maximo():
+    cache = CacheSemantico("teste", max_itens=2)
+    cache.gravar("p", {"a:1", "a:2"}, "primeiro")
+    cache.gravar("p", {"b:1", "b:2"}, "segundo")
+    cache.obter("p", {"a:1", "a:2"})
+    cache.gravar("p", {"c:1", "c:2"}, "terceiro")
+    assert cache.obter("p", {"b:1", "b:2"}) is None
+    assert cache.obter("p", {"a:1", "a:2"})[0] == "primeiro"
+    assert cache.estatisticas()["remocoes"] == 1
+
+
+def test_entrada_expirada_nao_acerta():
+    cache = CacheSemantico("teste", ttl_segundos=-1)
+    cache.gravar("p", termos(5), "plano")
+    assert cache.obter("p", termos(5)) is None
+    assert cache.estatisticas()["itens"] == 0
+
+
+def test_trocar_nome_so_troca_a_palavra_inteira():
+    texto = "Ana, recomendamos Análise de Dados e Anagramas em Python. Banana? Boa sorte, Ana!"
+    assert trocar_nome(texto, "Ana", "Bia") == \
+        "Bia, recomendamos Análise de Dados e Anagramas em Python. Banana? Boa sorte, Bia!"
+    assert trocar_nome("Olá, Estudante.", "Estudante", r"Jo\1 (Dev)") == r"Olá, Jo\1 (Dev)."
+    assert trocar_nome(texto, None, "Bia") == texto
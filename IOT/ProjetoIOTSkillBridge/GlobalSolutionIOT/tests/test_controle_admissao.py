@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import controle_admissao
+from controle_admissao import LimitadorAdaptativo, SobrecargaException
+from controle_quota import QuotaLocalException
+
+
+@pytest.fixture
+def limitador(monkeypatch):
+    monkeypatch.setattr(controle_admissao, "ADMISSAO_LIMITE_INICIAL", 2)
+    monkeypatch.setattr(controle_admissao, "ADMISSAO_FILA", 1)
+    monkeypatch.setattr(controle_admissao, "ADMISSAO_ESPERA_SEGUNDOS", 0.2)
+    monkeypatch.setattr(controle_admissao, "ADMISSAO_LATENCIA_ALVO_SEGUNDOS", 5.0)
+    return LimitadorAdaptativo("teste")
+
+
+async def ocupar(limitador, liberar: asyncio.Event, ordem: list, nome: str):
+    async with limitador.admitir():
+        ordem.append(nome)
+        await liberar.wait()
+
+
+def test_excedente_aguarda_na_fila_e_recebe_a_vaga_liberada(limitador):
+    async def cenario():
+        liberar, ordem = asyncio.Event(), []
+        tarefas = [asyncio.create_task(ocupar(limitador, liberar, ordem, nome)) for nome in "abc"]
+        await asyncio.sleep(0.01)
+        assert ordem == ["a", "b"]
+        assert limitador.estatisticas()["fila"] == 1
+        liberar.set()
+        await asyncio.gather(*tarefas)
+        return ordem
+
+    assert asyncio.run(cenario()) == ["a", "b", "c"]
+    assert limitador.em_execucao == 0
+    assert limitador.admitidas == 3
+
+
+def test_fila_cheia_descarta_na_hora(limitador):
+    async def cenario():
+        liberar = asyncio.Event()
+        tarefas = [asyncio.create_task(ocupar(limitador, liberar, [], nome)) for nome in "abc"]
+        await asyncio.sleep(0.01)
+        with pytest.raises(SobrecargaException):
+            async with limitador.admitir():
+                pass
+        liberar.set()
+        await asyncio.gather(*tarefas)
+
+    asyncio.run(cenario())
+    assert limitador.descartadas_fila_cheia == 1
+
+
+def test_espera_longa_descarta(limitador):
+    async def cenario():
+        liberar = asyncio.Event()
+        tarefas = [asyncio.create_task(ocupar(limitador, liberar, [], nome)) for nome in "ab"]
+        await asyncio.sleep(0.01)
+        with pytest.raises(SobrecargaException):
+            async with limitador.admitir():
+                pass
+        liberar.set()
+        await asyncio.gather(*tarefas)
+
+    asyncio.run(cenario())
+    assert limitador.descartadas_espera == 1
+    assert limitador.em_execucao == 0
+
+
+def test_aimd_cresce_com_sucesso_e_reduz_com_erro(limitador, monkeypatch):
+    monkeypatch.setattr(controle_admissao, "ADMISSAO_FATOR_REDUCAO", 0.5)
+
+    async def executar(erro=None):
+        async with limitador.admitir():
+            if erro is not None:
+                raise erro
+
+    asyncio.run(executar())
+    assert limitador.limite == 2.5
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(executar(RuntimeError("falha do Gemini")))
+    assert limitador.limite == 1.25
+    assert limitador.reducoes == 1
+
+
+def test_recusa_da_quota_local_nao_ajusta_o_limite(limitador):
+    async def executar():
+        async with limitador.admitir():
+            raise QuotaLocalException("sem orçamento")
+
+    with pytest.raises(QuotaLocalException):
+        asyncio.run(executar())
+    assert limitador.limite == 2.0
+    assert limitador.em_execucao == 0
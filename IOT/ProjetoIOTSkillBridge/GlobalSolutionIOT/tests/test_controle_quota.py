@@ -0,0 +1,50 @@
+from controle_quota import Disjuntor
+
+
+def test_abre_apos_falhas_consecutivas():
+    disjuntor = Disjuntor(limite_falhas=3, aberto_segundos=60)
+    for _ in range(2):
+        disjuntor.registrar_falha()
+    assert disjuntor.estado == "fechado"
+    assert disjuntor.permitir()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "aberto"
+    assert not disjuntor.permitir()
+    assert disjuntor.aberturas == 1
+
+
+def test_sucesso_zera_as_falhas():
+    disjuntor = Disjuntor(limite_falhas=2, aberto_segundos=60)
+    disjuntor.registrar_falha()
+    disjuntor.registrar_sucesso()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "fechado"
+
+
+def test_meio_aberto_permite_uma_unica_chamada_de_teste():
+    disjuntor = Disjuntor(limite_falhas=1, aberto_segundos=0)
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "meio_aberto"
+    assert disjuntor.permitir()
+    assert not disjuntor.permitir()
+    disjuntor.registrar_sucesso()
+    assert disjuntor.estado == "fechado"
+
+
+def test_falha_no_teste_reabre():
+    disjuntor = Disjuntor(limite_falhas=1, aberto_segundos=0)
+    disjuntor.registrar_falha()
+    assert disjuntor.permitir()
+    disjuntor.aberto_segundos = 60
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "aberto"
+    assert disjuntor.aberturas == 2
+
+
+def test_liberar_teste_devolve_a_chamada_de_teste():
+    disjuntor = Disjuntor(limite_falhas=1, aberto_segundos=0)
+    disjuntor.registrar_falha()
+    assert disjuntor.permitir()
+    disjuntor.liberar_teste()
+    assert disjuntor.permitir()
+    assert disjuntor.aberturas == 1
@@ -0,0 +1,40 @@
+import asyncio
+
+import fila_jobs
+from estado_compartilhado import EstadoCompartilhado
+from fila_jobs import FilaJobsCompartilhada, Job
+
+
+def test_workers_ociosos_nao_abrem_transacao_e_pegam_job_de_outro_processo(tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_jobs, "JOBS_INTERVALO_CONSULTA_SEGUNDOS", 0.01)
+    monkeypatch.setattr(fila_jobs, "JOBS_INTERVALO_CONSULTA_MAX_SEGUNDOS", 0.05)
+    caminho = str(tmp_path / "estado.db")
+    fila = FilaJobsCompartilhada(EstadoCompartilhado(caminho), workers=4)
+    outro_processo = FilaJobsCompartilhada(EstadoCompartilhado(caminho))
+
+    async def dobrar(dados, orcamento):
+        return {"dobro": dados["n"] * 2}
+
+    fila.registrar_tipo("dobrar", dobrar, lambda dados: None)
+    transacoes = []
+    transacao = fila.estado.transacao
+    monkeypatch.setattr(fila.estado, "transacao", lambda: transacoes.append(1) or transacao())
+
+    async def cenario():
+        fila.iniciar()
+        await asyncio.sleep(0.3)
+        transacoes_ociosa = len(transacoes)
+        job = Job("dobrar", {"n": 21}, "interativa", 60, None)
+        outro_processo._inserir(job)
+        for _ in range(100):
+            executado = await fila.obter(job.id)
+            if executado.status == "concluido":
+                break
+            await asyncio.sleep(0.02)
+        for tarefa in fila._workers:
+            tarefa.cancel()
+        return transacoes_ociosa, executado
+
+    transacoes_ociosa, executado = asyncio.run(cenario())
+    assert transacoes_ociosa == 0
+    assert executado.status == "concluido" and executado.resultado == {"dobro": 42}
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+
+import gerar_plano_estudos
+from cliente_gemini import GeminiTimeoutException
+from gerar_plano_estudos import PlanoEstudosRequest, gerar_plano_estudos_com_camada
+from telemetria import fallbacks
+
+
+def test_orcamento_esgotado_no_hedge_conta_fallback_por_timeout(monkeypatch):
+    async def hedge_sem_resposta(*args, **kwargs):
+        raise GeminiTimeoutException("Orçamento de latência de 0.1s esgotado")
+
+    monkeypatch.setattr(gerar_plano_estudos, "client", SimpleNamespace(configurado=True))
+    monkeypatch.setattr(gerar_plano_estudos, "gerar_conteudo_com_hedge", hedge_sem_resposta)
+    request = PlanoEstudosRequest(
+        objetivo_carreira="Engenheiro de Confiabilidade de Satélites",
+        nivel_atual="Iniciante",
+        competencias_atuais=["Telemetria orbital"],
+        tempo_disponivel_semana=7,
+    )
+    antes = dict(fallbacks._valores)
+
+    plano, camada = asyncio.run(gerar_plano_estudos_com_camada(request, None, orcamento=5))
+
+    assert camada == "fallback" and plano.etapas
+    assert fallbacks._valores.get(("plano_estudos", "timeout"), 0) == antes.get(("plano_estudos", "timeout"), 0) + 1
+    assert fallbacks._valores.get(("plano_estudos", "erro"), 0) == antes.get(("plano_estudos", "erro"), 0)
@@ -0,0 +1,57 @@
+import time
+
+from estado_compartilhado import EstadoCompartilhado
+from ingestao_iot import AgregadosUsuario, EventoIot, RepositorioIot, RepositorioIotCompartilhado
+
+
+def eventos(usuario_id="u1", quantidade=12):
+    lote = []
+    for i in range(quantidade):
+        ts = 1731355200 + i * 86400 + (i % 3) * 3600
+        lote.append(EventoIot(usuario_id=usuario_id, tipo="estudo", ts=ts, minutos=30 + i))
+        lote.append(EventoIot(usuario_id=usuario_id, tipo="foco", ts=ts, pontuacao=50 + i * 3))
+    return lote
+
+
+def test_serializar_preserva_buffers_e_resumo():
+    original = AgregadosUsuario(capacidade=4)
+    for evento in eventos(quantidade=6):
+        if evento.tipo == "estudo":
+            original.registrar_estudo(evento.ts.timestamp(), evento.minutos)
+        else:
+            original.registrar_foco(evento.ts.timestamp(), evento.pontuacao)
+    copia = AgregadosUsuario.desserializar(original.serializar())
+    assert copia.resumo() == original.resumo()
+    # os buffers já deram a volta: a cópia continua sobrescrevendo na mesma posição
+    for agregados in (original, copia):
+        agregados.registrar_estudo(1733000000, 90)
+        agregados.registrar_foco(1733000000, 10)
+    assert copia.resumo() == original.resumo()
+
+
+def test_compartilhado_resume_como_o_de_memoria_e_vale_para_outros_workers(tmp_path):
+    caminho = str(tmp_path / "estado.db")
+    worker1 = RepositorioIotCompartilhado(EstadoCompartilhado(caminho))
+    worker2 = RepositorioIotCompartilhado(EstadoCompartilhado(caminho))
+    memoria = RepositorioIot()
+
+    lote = eventos()
+    invalido = EventoIot(usuario_id="u1", tipo="foco", ts=1731355200, pontuacao=120)
+    assert worker1.ingerir(lote[:10] + [invalido]) == 10
+    assert worker2.ingerir(lote[10:]) == len(lote) - 10
+    memoria.ingerir(lote)
+
+    assert worker1.resumo("u1") == worker2.resumo("u1") == memoria.resumo("u1")
+    assert worker2.resumo("u2") is None
+    assert worker1.estatisticas()["eventos_rejeitados"] == 1
+
+
+def test_compartilhado_remove_usuarios_atualizados_ha_mais_tempo(tmp_path):
+    repositorio = RepositorioIotCompartilhado(EstadoCompartilhado(str(tmp_path / "estado.db")), max_usuarios=2)
+    for usuario_id in ("u1", "u2", "u3"):
+        repositorio.ingerir(eventos(usuario_id, 1))
+        time.sleep(0.01)
+    assert repositorio.resumo("u1") is None
+    assert repositorio.resumo("u3") is not None
+    assert repositorio.estatisticas()["usuarios"] == 2
+    assert repositorio.remocoes == 1
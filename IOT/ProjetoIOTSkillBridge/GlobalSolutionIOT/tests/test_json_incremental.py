@@ -0,0 +1,56 @@
+import json
+
+from json_incremental import ELEMENTO, INICIO_ARRAY, MEMBRO, ParserJsonIncremental
+
+
+PLANO = {
+    "objetivo": "Desenvolvedor {Backend}",
+    "etapas": [
+        {"ordem": 1, "titulo": "Java \"básico\"", "recursos": ["a", "b"]},
+        {"ordem": 2, "titulo": "Spring [web]", "recursos": []},
+    ],
+    "duracao_total_semanas": 12,
+    "observacoes": None,
+}
+
+
+def alimentar_em_partes(parser, texto, tamanho):
+    eventos = []
+    for i in range(0, len(texto), tamanho):
+        eventos.extend(parser.alimentar(texto[i:i + tamanho]))
+    return eventos
+
+
+def test_emite_membros_e_elementos_na_ordem():
+    texto = json.dumps(PLANO, ensure_ascii=False)
+    eventos = alimentar_em_partes(ParserJsonIncremental("etapas"), texto, 1)
+    assert eventos == [
+        (MEMBRO, "objetivo", "Desenvolvedor {Backend}"),
+        (INICIO_ARRAY, "etapas", None),
+        (ELEMENTO, "etapas", PLANO["etapas"][0]),
+        (ELEMENTO, "etapas", PLANO["etapas"][1]),
+        (MEMBRO, "duracao_total_semanas", 12),
+        (MEMBRO, "observacoes", None),
+    ]
+
+
+def test_resultado_independe_do_tamanho_das_partes():
+    texto = json.dumps(PLANO, ensure_ascii=False, indent=2)
+    esperado = ParserJsonIncremental("etapas").alimentar(texto)
+    for tamanho in (1, 2, 3, 7, 64):
+        assert alimentar_em_partes(ParserJsonIncremental("etapas"), texto, tamanho) == esperado
+
+
+def test_elemento_emitido_antes_do_fim_do_array():
+    parser = ParserJsonIncremental("etapas")
+    eventos = parser.alimentar('{"etapas": [{"ordem": 1}, {"ord')
+    assert eventos == [(INICIO_ARRAY, "etapas", None), (ELEMENTO, "etapas", {"ordem": 1})]
+    assert not parser.finalizado
+
+
+def test_ignora_texto_antes_do_objeto_e_depois_do_fim():
+    parser = ParserJsonIncremental("etapas")
+    eventos = parser.alimentar('```json\n{"nivel": "Iniciante"}\n```')
+    assert eventos == [(MEMBRO, "nivel", "Iniciante")]
+    assert parser.finalizado
+    assert parser.alimentar('{"outro": 1}') == []
@@ -0,0 +1,46 @@
+import pytest
+
+from gerar_plano_estudos import PlanoEstudosRequest, classificar_mudanca
+from planos_usuario import calcular_etag, etag_corresponde
+
+
+ETAG = calcular_etag('{"etapas": []}')
+
+
+@pytest.mark.parametrize("if_none_match, esperado", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"outra", {ETAG}', True),
+    ("*", True),
+    ('"outra"', False),
+])
+def test_etag_corresponde(if_none_match, esperado):
+    assert etag_corresponde(if_none_match, ETAG) is esperado
+
+
+def perfil(**campos):
+    dados = {
+        "objetivo_carreira": "Desenvolvedor Backend",
+        "nivel_atual": "Iniciante",
+        "competencias_atuais": ["Java", "Git"],
+        "tempo_disponivel_semana": 10,
+        "prazo_meses": 6,
+        "areas_interesse": ["APIs"],
+    }
+    return PlanoEstudosRequest(**{**dados, **campos})
+
+
+@pytest.mark.parametrize("novo, esperado", [
+    (perfil(objetivo_carreira="  desenvolvedor   BACKEND ", competencias_atuais=["git", "java"]), ("inalterado", set())),
+    (perfil(tempo_disponivel_semana=5, prazo_meses=12), ("ajuste", set())),
+    (perfil(competencias_atuais=["Java", "Git", "SQL"]), ("etapas", {"sql"})),
+    (perfil(competencias_atuais=["Java"]), ("completo", set())),
+    (perfil(competencias_atuais=["Java", "Git", "SQL", "Docker", "AWS", "Kotlin"]), ("completo", set())),
+    (perfil(objetivo_carreira="Cientista de Dados"), ("completo", set())),
+    (perfil(nivel_atual="Intermediário"), ("completo", set())),
+    (perfil(areas_interesse=["Dados"]), ("completo", set())),
+])
+def test_classificar_mudanca(novo, esperado):
+    assert classificar_mudanca(perfil(), novo) == esperado